@@ -0,0 +1,240 @@
+"""
+Serial round-trip benchmarks for utils/minicom.
+
+Runs every strategy against a pty loopback console served from a separate
+process, so the CPU time measured here is the serial layer's own. Results
+are written as JSON and can be compared against a saved baseline:
+
+    python -m benchmarks.serial_bench --output bench.json
+    python -m benchmarks.serial_bench --baseline bench.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import pty
+import statistics
+import sys
+import tempfile
+import time
+import tty
+
+import serial
+
+from utils import minicom
+from utils.pacing import PacingStore
+
+PROMPT = b"bench>"
+
+# Metric name suffix -> whether a higher value is better
+HIGHER_IS_BETTER = {"bytes_per_s": True}
+
+
+def _serve_loopback(master: int, answer: bool, timestamps):
+    """Loopback console: echoes input and answers ping/flood/delay commands."""
+    line = b""
+    while True:
+        try:
+            data = os.read(master, 1024)
+        except OSError:
+            return
+        if not data:
+            return
+        if not answer:
+            continue
+        for byte in data:
+            char = bytes([byte])
+            if char != b"\r":
+                line += char
+                os.write(master, char)
+                continue
+            words = line.decode().split()
+            line = b""
+            if not words:
+                os.write(master, b"\r\n" + PROMPT)
+            elif words[0] == "ping":
+                os.write(master, b"\r\npong\r\n" + PROMPT)
+            elif words[0] == "flood":
+                remaining = int(words[1])
+                chunk = (b"0123456789abcdef" * 4)[:63] + b"\n"
+                while remaining > 0:
+                    os.write(master, chunk[:remaining])
+                    remaining -= len(chunk)
+                os.write(master, b"\r\nEND\r\n" + PROMPT)
+            elif words[0] == "delay":
+                time.sleep(float(words[1]))
+                timestamps.send(time.monotonic())
+                os.write(master, b"\r\nREADY\r\n")
+
+
+class LoopbackConsole:
+    """A pty whose far end is served by a forked process."""
+
+    def __init__(self, answer: bool = True):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.timestamps, child_timestamps = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.get_context("fork").Process(
+            target=_serve_loopback, args=(self.master, answer, child_timestamps), daemon=True
+        )
+
+    def __enter__(self):
+        self.process.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def _summary(samples: list[float], prefix: str) -> dict:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    return {f"{prefix}.median": statistics.median(samples), f"{prefix}.p95": p95}
+
+
+def bench_strategy(name: str, strategy: minicom.SerialCommandStrategy, repeat: int, flood_bytes: int, logger) -> dict:
+    results = {}
+    executor = minicom.SerialCommandExecutor(strategy)
+    with LoopbackConsole() as console, serial.Serial(console.port, **minicom.SERIAL_CONFIG) as ser:
+        executor.execute(ser, b"", PROMPT, 2, logger)  # Warm up (and teach the echo pacing)
+
+        round_trips = []
+        for _ in range(repeat):
+            start = time.monotonic()
+            success, _ = executor.execute(ser, b"ping", PROMPT, 5, logger)
+            round_trips.append((time.monotonic() - start) * 1000)
+            assert success, f"{name}: no answer to ping"
+        results.update(_summary(round_trips, f"{name}.round_trip_ms"))
+
+        detections = []
+        for _ in range(repeat):
+            success, _ = executor.execute(ser, b"delay 0.05", b"READY", 5, logger)
+            detected = time.monotonic()
+            assert success, f"{name}: prompt not detected"
+            detections.append((detected - console.timestamps.recv()) * 1000)
+        results.update(_summary(detections, f"{name}.prompt_detect_ms"))
+
+        if flood_bytes:
+            command = f"flood {flood_bytes}".encode()
+            cpu_start, wall_start = time.process_time(), time.monotonic()
+            success, _ = executor.execute(ser, command, b"END\r\n" + PROMPT, 60, logger)
+            cpu, wall = time.process_time() - cpu_start, time.monotonic() - wall_start
+            assert success, f"{name}: flood did not complete"
+            results[f"{name}.throughput.bytes_per_s"] = flood_bytes / wall
+            results[f"{name}.cpu_s_per_mb"] = cpu / (flood_bytes / 1e6)
+    return results
+
+
+def bench_discovery(num_ports: int, timeout: float, logger) -> dict:
+    """Wall time to find the one answering port among num_ports."""
+    consoles = [LoopbackConsole(answer=(i == num_ports - 1)) for i in range(num_ports)]
+    directory = tempfile.mkdtemp(prefix="swen-bench-")
+    original_prefix = minicom.TTY_PORT_PREFIX
+    try:
+        for index, console in enumerate(consoles):
+            console.__enter__()
+            os.symlink(console.port, os.path.join(directory, f"ttyUSB{index}"))
+        minicom.TTY_PORT_PREFIX = os.path.join(directory, "ttyUSB")
+
+        start = time.monotonic()
+        found = minicom.discover_ttyUSB_ports(num_ports, PROMPT.decode(), timeout, logger, first_match=True)
+        first_match = time.monotonic() - start
+
+        start = time.monotonic()
+        minicom.discover_ttyUSB_ports(num_ports, PROMPT.decode(), timeout, logger)
+        full_map = time.monotonic() - start
+        assert len(found) == 1, "discovery did not find the answering port"
+    finally:
+        minicom.TTY_PORT_PREFIX = original_prefix
+        for index, console in enumerate(consoles):
+            console.__exit__(None, None, None)
+            link = os.path.join(directory, f"ttyUSB{index}")
+            if os.path.lexists(link):
+                os.remove(link)
+        os.rmdir(directory)
+    return {f"discovery.{num_ports}_ports.first_match_s": first_match, f"discovery.{num_ports}_ports.full_map_s": full_map}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return one line per metric with the change against the baseline, marking regressions."""
+    lines = []
+    for metric, value in results.items():
+        if metric not in baseline or not baseline[metric]:
+            lines.append(f"{metric:50} {value:12.4f}  (new)")
+            continue
+        change = (value - baseline[metric]) / baseline[metric]
+        higher_is_better = any(metric.endswith(suffix) for suffix in HIGHER_IS_BETTER)
+        regression = change < -threshold if higher_is_better else change > threshold
+        marker = "  REGRESSION" if regression else ""
+        lines.append(f"{metric:50} {value:12.4f}  {change:+7.1%}{marker}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the utils/minicom serial layer.")
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per latency metric (default: 20)")
+    parser.add_argument("--flood-bytes", type=int, default=1_000_000, help="Bytes for the throughput test (default: 1000000)")
+    parser.add_argument("--ports", type=int, default=8, help="Ports for the discovery test (default: 8)")
+    parser.add_argument("--discovery-timeout", type=float, default=0.5, help="Per-port discovery timeout (default: 0.5)")
+    parser.add_argument("--strategies", nargs="+", default=["basic", "echo_paced", "char_by_char"], choices=["basic", "echo_paced", "char_by_char"])
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", "-b", help="Compare against a previously saved JSON result")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as regression (default: 0.10)")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("SWEN-TOOLS-BENCH")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    logger.success = logger.info
+
+    results = {}
+    with tempfile.TemporaryDirectory() as pacing_dir:
+        # Every run learns its pacing from scratch, and the bench host's pacing.json is left alone
+        pacing_store = PacingStore(os.path.join(pacing_dir, "pacing.json"))
+        strategies = {
+            "basic": lambda: minicom.BasicSerialCommand(),
+            "echo_paced": lambda: minicom.EchoPacedSerialCommand(pacing_store),
+            # The fixed 200 ms per character makes this one slow, keep its samples few
+            "char_by_char": lambda: minicom.CharacterByCharacterSerialCommand(),
+        }
+
+        for name in args.strategies:
+            repeat = min(args.repeat, 3) if name == "char_by_char" else args.repeat
+            flood_bytes = args.flood_bytes if name != "char_by_char" else 0
+            print(f"Benchmarking {name}...", file=sys.stderr)
+            results.update(bench_strategy(name, strategies[name](), repeat, flood_bytes, logger))
+    if args.ports:
+        print(f"Benchmarking discovery over {args.ports} ports...", file=sys.stderr)
+        results.update(bench_discovery(args.ports, args.discovery_timeout, logger))
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "flood_bytes": args.flood_bytes,
+        },
+        "results": results,
+    }
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        print("\n".join(compare(results, baseline, args.threshold)))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+CLI startup benchmarks for main.py.
+
+Runs short commands that exit before any flashing starts, each in a fresh
+interpreter, and records the wall time from process start to exit. Banner
+rendering is warmed once first, so the numbers are the cached path users
+see on every run after the first one. Results are written as JSON and can
+be compared against a saved baseline:
+
+    python -m benchmarks.startup_bench --output startup.json
+    python -m benchmarks.startup_bench --baseline startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.serial_bench import compare
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+COMMANDS = {
+    "help": ["--help"],
+    "hpa_help": ["hpa", "--help"],
+    "stats_no_banner": ["--no-banner", "stats"],
+}
+
+
+def time_command(arguments: list[str], repeat: int, env: dict) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, *arguments], env=env, cwd=os.path.dirname(MAIN),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start_time)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark swen-tools CLI startup.")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per command (default: 20)")
+    parser.add_argument("--commands", nargs="+", default=list(COMMANDS), choices=list(COMMANDS))
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", "-b", help="Compare against a previously saved JSON result")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as regression (default: 0.10)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache:
+        # A private cache keeps the flash history and banners of the bench host out of the numbers
+        env = dict(os.environ, SWEN_TOOLS_CACHE_DIR=cache)
+        env.pop("SWEN_TOOLS_NO_BANNER", None)
+        subprocess.run([sys.executable, MAIN, "stats"], env=env, cwd=os.path.dirname(MAIN),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        results = {}
+        for name in args.commands:
+            print(f"Benchmarking {name}...", file=sys.stderr)
+            samples = time_command(COMMANDS[name], args.repeat, env)
+            results[f"{name}_median_s"] = statistics.median(samples)
+            results[f"{name}_p90_s"] = statistics.quantiles(samples, n=10)[-1] if len(samples) > 1 else samples[0]
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        print("\n".join(compare(results, baseline, args.threshold)))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,10 @@ class CommandFailedError(Exception):
     pass
 
 class FlashScriptError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class ArtifactIntegrityError(Exception):
+    pass
+
+class ConfigError(Exception):
+    pass
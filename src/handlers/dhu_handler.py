@@ -1,12 +1,25 @@
 import os
 import subprocess
+import uuid
 
+from contextlib import ExitStack
 from logging import Logger
 from logger.logger_config import super_message
+from utils.artifact_cache import cached_artifact, cached_sha256
+from utils.flash_history import phase, record_failure
+from utils.integrity import ArtifactVerifier
+from utils.process_runner import run_process
+from utils.progress import ProgressTracker, dhu_docker_parser
+from utils.progress_bar import ProgressBar
+from utils.tracing import traced
+from utils.warm_container import WarmContainer
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Progress estimate until the container log reports progress or a run has been recorded
+DHU_FLASH_TIME = 10 * 60
+
 #DHUH_ARGS = "dhuh_update --uds-transport serial --artifacts-path "
 #DHUM_ARGS = "moose_update --qdl --fw "
 #SCRIPT_PATH = os.getenv("SCRIPT_PATH")
@@ -16,55 +29,150 @@ load_dotenv()
 
 
 
-def start_docker_from_script(script_path: str, script_args: str, logger: Logger):
+@traced("start_docker_from_script", "flash")
+def start_docker_from_script(
+    script_path: str,
+    script_args: str,
+    logger: Logger,
+    progress_name: str | None = None,
+    verifier: ArtifactVerifier | None = None,
+    container: WarmContainer | None = None,
+):
     """
     Start a Docker container using a shell script with live output.
 
     Args:
         script_path (str): The path to the shell script.
         script_args (list, optional): List of arguments to pass to the script.
+        progress_name (str, optional): Show a progress bar fed by the container
+            log, durations are remembered under this name.
+        verifier (ArtifactVerifier, optional): Verifies the artifacts while
+            the container starts, a mismatch aborts the flash.
+        container (WarmContainer, optional): Run the tool inside this warm
+            container with docker exec instead of starting run.sh.
 
     Returns:
         str: The ID of the started container if successful.
     """
     
-    command = [script_path] + [script_args]
-    
-    logger.debug("Running command: " + " ".join(command))
-    
     try:
+        if verifier:
+            # Raises right here when the hashes were known and one does not match
+            verifier.start()
+        command, stop_in_container = _docker_command(script_path, script_args, container, logger)
+        logger.debug("Running command: " + " ".join(command))
         logger.debug("Starting Docker container...")
-        process = subprocess.Popen(
-            command, 
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        for line in process.stdout:
-            logger.info(line.strip())
+        tracker = None
+        if progress_name:
+            tracker = ProgressTracker(progress_name, dhu_docker_parser(), DHU_FLASH_TIME)
+            # One bar per flash, DHUH and DHUM run at the same time in flash-all
+            progress_bar = ProgressBar()
+            progress_bar.start_tracking(tracker)
+            on_line = lambda stream, line: tracker.feed(line)
+        else:
+            on_line = None
 
-        process.wait()  # Wait for the process to finish
-        if process.returncode != 0:
-            logger.error(f"Error while starting Docker: {process.stderr.read()}")
+        # Only a background verification can abort the flash. It then needs
+        # its own session so the abort also stops what run.sh started.
+        abortable = verifier is not None and verifier.pending
+        try:
+            with phase("container_flash"):
+                result = run_process(
+                    command,
+                    logger,
+                    on_line=on_line,
+                    on_start=(lambda runner: verifier.abort_on_mismatch(runner, stop_in_container)) if abortable else None,
+                    start_new_session=abortable,
+                )
+            if verifier:
+                # Raises ArtifactIntegrityError, also when the container failed because it was aborted
+                verifier.result()
+        except BaseException:
+            if stop_in_container:
+                # E.g. Ctrl+C, which only reaches the local docker exec
+                stop_in_container()
+            if tracker:
+                progress_bar.stop(done=False)
+            raise
+        if tracker:
+            progress_bar.stop(done=result.returncode == 0)
+            tracker.finish(success=result.returncode == 0)
+        if result.returncode != 0:
+            record_failure("FlashScriptError")
+            logger.error(f"Error while starting Docker: {result.stderr.tail_text()}")
             return None
-        
+
         super_message("Done!")
-        return process.returncode
+        return result.returncode
 
     except Exception as e:
+        record_failure(e)
         logger.error(f"An error occurred: {e}")
         return None
 
 
-def flash_dhuh(script_path: str, args: str, software_filepath: str, logger: Logger):
-    command = args + "--artifacts-path " + software_filepath.strip()
-    return_code = start_docker_from_script(script_path, command, logger)
+def _docker_command(script_path: str, script_args: str, container: WarmContainer | None, logger: Logger):
+    """
+    docker exec into the warm container when there is one, otherwise a cold run.sh.
+
+    Returns the command and, for docker exec, a function stopping the tool
+    inside the container, None for run.sh.
+    """
+    if container:
+        try:
+            with phase("container_start"):
+                container.ensure_running(logger)
+            exec_id = uuid.uuid4().hex
+            return container.exec_command(script_args, exec_id), lambda: container.kill_exec(exec_id)
+        except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+            logger.warning(f"Warm container unavailable, falling back to {script_path}: {e}")
+    return [script_path] + [script_args], None
+
+
+def _artifact_verifier(original_filepath: str, software_filepath: str, logger: Logger) -> ArtifactVerifier | None:
+    """Verify the archive against the checksum published next to the original."""
+    if not os.path.isfile(software_filepath):
+        return None
+    return ArtifactVerifier([(software_filepath, original_filepath, cached_sha256(software_filepath))], logger)
+
+
+def _usable_container(container: WarmContainer | None, software_filepath: str, logger: Logger) -> WarmContainer | None:
+    if container and not container.can_serve(software_filepath):
+        # Only the artifact cache is mounted, e.g. when caching is disabled
+        logger.info(f"{software_filepath} is not mounted in the warm container, using run.sh")
+        return None
+    return container
+
+
+def _flash_archive(script_path: str, software_filepath: str, command_for, progress_name: str, logger: Logger, container: WarmContainer | None):
+    """Flash from the cached copy of an archive, which stays in the cache until run.sh exits."""
+    original_filepath = software_filepath.strip()
+    with ExitStack() as stack:
+        with phase("artifact_cache"):
+            software_filepath = stack.enter_context(cached_artifact(original_filepath, logger))
+        verifier = _artifact_verifier(original_filepath, software_filepath, logger)
+        container = _usable_container(container, software_filepath, logger)
+        return start_docker_from_script(
+            script_path, command_for(software_filepath), logger, progress_name=progress_name, verifier=verifier, container=container
+        )
+
+
+def flash_dhuh(script_path: str, args: str, software_filepath: str, logger: Logger, container: WarmContainer | None = None):
+    return_code = _flash_archive(
+        script_path, software_filepath, lambda path: args + "--artifacts-path " + path, "dhuh_flash", logger, container
+    )
     print("Return code: ", return_code)
+    return return_code
+
+def flash_dhum(
+    script_path: str, args: str, software_filepath: str, commit: bool, logger: Logger, container: WarmContainer | None = None
+):
+    def command_for(path: str) -> str:
+        command = args + "--fw " + path
+        if commit:
+            command += " --edge-node-ip 169.254.4.10"
+        return command
 
-def flash_dhum(script_path: str, args: str, software_filepath: str, commit: bool, logger: Logger):
-    command = args + "--fw " + software_filepath.strip()
-    if commit:
-        command += " --edge-node-ip 169.254.4.10"
-    return_code = start_docker_from_script(script_path, command, logger)
+    return_code = _flash_archive(script_path, software_filepath, command_for, "dhum_flash", logger, container)
     print("Return code: ", return_code)
+    return return_code
@@ -1,6 +1,7 @@
 import argparse
 import sys
 import time
+from utils.tracing import tracer
 from utils.virtual_machine import VirtualMachine
 
 # Configuration
@@ -17,6 +18,9 @@ usb_vendor_id = "058B"  # Vendor ID for Miniwiggler
 usb_product_id = "0043"  # Product ID for Miniwiggler
 usb_filter_name = "Miniwiggler"  # Name for the USB filter
 
+# Seconds a running guest gets to answer before a retry prepares the session again
+SESSION_CHECK_TIMEOUT = 30
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -29,17 +33,22 @@ def main():
     parser.add_argument("-vm", "--vm-name", type=str, default=vm_name, help="Name of the VirtualBox VM.")
     parser.add_argument("-ip", "--ip", type=str, default=ip, help="IP address of the VirtualBox VM.")
 
-    parser.add_argument("-e", "--ecu", required=True, choices=["hia", "hib"], help="Specify the ECU to flash ('hia' or 'hib').")
+    parser.add_argument("-e", "--ecu", required=True, nargs="+", choices=["hia", "hib"], help="ECU(s) to flash, e.g. '-e hia hib' flashes both in one VM session.")
     parser.add_argument("--environment", "--env", type=str, help="Specify a filepath for a custom environment JSON file.")
     parser.add_argument("-r", "--retries", type=int, default=3, help="Number of retries if flashing fails (default: 3).")
     parser.add_argument("-rd", "--retry-delay", type=int, default=5, help="Delay between retries in seconds (default: 5).")
     parser.add_argument("-sv", "--skip-verification", action="store_true", help="Skips the verification process after flashing.")
     parser.add_argument("--ucb", action="store_true", help="Enable UCB mode.")
+    parser.add_argument("--snapshot", type=str, help="Resume the VM from this running snapshot, taken on first use if missing.")
+    parser.add_argument("--boot-timeout", type=int, default=180, help="Seconds to wait for the VM to accept commands (default: 180).")
+    parser.add_argument("--trace", metavar="OUT_JSON", help="Write a Chrome trace of the VM boot, login and flash steps to this file.")
     
     
     
 
     args = parser.parse_args()
+    if args.trace:
+        tracer.enable()
 
     # Initialize VM instance
     vm = VirtualMachine(
@@ -59,24 +68,65 @@ def main():
     elif args.environment:
         autoit_flags.append(args.environment)
 
-    # Retry logic
+    # One VM session for all ECUs: booted once, retried inside, powered off once
+    failed = []
+    try:
+        prepare_session(vm, args)
+        for ecu in args.ecu:
+            if not flash_with_retries(vm, ecu, args, autoit_flags):
+                failed.append(ecu)
+    except Exception as e:
+        print(f"Error during flashing process: {e}")
+        failed = list(args.ecu)
+    finally:
+        vm.poweroff()
+        print()
+        if tracer.enabled:
+            try:
+                tracer.write(args.trace)
+                print(f"Trace written to {args.trace}")
+            except OSError as e:
+                print(f"Could not write trace to {args.trace}: {e}")
+
+    if failed:
+        print(f"Flashing failed for: {', '.join(failed)}. Exiting.")
+        sys.exit(1)
+
+
+def prepare_session(vm: VirtualMachine, args):
+    """Make sure the VM runs and accepts commands, only boots it when it is not up yet."""
+    vm.add_usb_filter(usb_filter_name, usb_vendor_id, usb_product_id)
+
+    # Returns as soon as the guest accepts commands
+    if not vm.start(timeout=args.boot_timeout, snapshot=args.snapshot):
+        raise RuntimeError(f"VM '{vm.name}' did not become ready")
+    if args.snapshot and not vm.has_snapshot(args.snapshot):
+        vm.take_snapshot(args.snapshot)
+    vm.login()
+
+
+def session_alive(vm: VirtualMachine) -> bool:
+    """The VM still runs and its guest accepts commands, e.g. after a failed attempt."""
+    return vm.is_vm_running(refresh=True) and vm.wait_until_ready(timeout=SESSION_CHECK_TIMEOUT)
+
+
+def flash_with_retries(vm: VirtualMachine, ecu: str, args, autoit_flags) -> bool:
+    """Flash one ECU in the running VM session, retrying without rebooting the VM."""
     for attempt in range(1, args.retries + 1):
         try:
-            print(f"Starting ECU flashing process (attempt {attempt}/{args.retries})...")
-            
-            vm.add_usb_filter(usb_filter_name, usb_vendor_id, usb_product_id)
-
-            # Start the VM
-            vm.start()
-            vm.login()
+            print(f"Starting {ecu} flashing process (attempt {attempt}/{args.retries})...")
+            # A failed flash is reported as an exit code, so check the VM itself before retrying
+            if attempt > 1 and not session_alive(vm):
+                print(f"VM '{vm.name}' is gone or not responding, preparing the session again...")
+                prepare_session(vm, args)
 
             # Flash the ECU
-            result = vm.flash_hia_vbox(flags=autoit_flags) if args.ecu == "hia" else vm.flash_hib_vbox(flags=autoit_flags)
+            result = vm.flash_hia_vbox(flags=autoit_flags) if ecu == "hia" else vm.flash_hib_vbox(flags=autoit_flags)
             if result == 0:
-                print(f"{args.ecu} flashing successful.")
-                break
+                print(f"{ecu} flashing successful.")
+                return True
             elif result == 1:
-                print(f"Error during {args.ecu} flashing. AutoIt exit code: {result}. Check logs for specific error.")
+                print(f"Error during {ecu} flashing. AutoIt exit code: {result}. Check logs for specific error.")
             elif result == 2:
                 print(f"Initialization failed. AutoIt exit code: {result}. Check logs for specific error.")
             else:
@@ -84,16 +134,16 @@ def main():
 
         except Exception as e:
             print(f"Error during flashing process: {e}")
-            if attempt < args.retries:
-                print(f"Retrying in {args.retry_delay} seconds...")
-                time.sleep(args.retry_delay)
-            else:
-                print("All retries failed. Exiting.")
-                sys.exit(1)
         finally:
-            vm.poweroff()
             print()
 
+        if attempt < args.retries:
+            print(f"Retrying in {args.retry_delay} seconds...")
+            time.sleep(args.retry_delay)
+
+    print(f"All retries for {ecu} failed.")
+    return False
+
 
 if __name__ == "__main__":
     try:
@@ -1,21 +1,26 @@
 import os
 import sys
 import time
-import subprocess
+import logging
 
 import serial
 from logging import Logger
 from dotenv import load_dotenv
 
-from utils.minicom import CharacterByCharacterSerialCommand, SerialCommandExecutor, search_correct_ttyUSB_port
+from utils.console_broker import open_console
+from utils.flash_history import phase, record_failure
+from utils.minicom import EchoPacedSerialCommand, SerialCommandExecutor
+from utils.port_cache import find_ttyUSB_port
+from utils.process_runner import run_process
+from utils.progress import ProgressTracker, tegra_flash_parser
 from utils.progress_bar import ProgressBar
+from utils.tracing import traced
 from exceptions.exceptions import FlashScriptError, PortNotFoundError, CommandFailedError
 from logger.logger_config import super_message
 from swut.cli.cli_handler import CliHandler
 
 
 load_dotenv()
-progress_bar = ProgressBar()
 
 # Serial configuration
 SERIAL_CONFIG = {
@@ -34,10 +39,13 @@ FLASH_ARGS = "c-sample"
 ACTIVATE_RECOVERY_MODE_COMMANDS = ["tegrarecovery x1 on", "tegrareset x1"]
 DEACTIVATE_RECOVERY_MODE_COMMANDS = ["tegrarecovery x1 off", "tegrareset x1"]
 PROMT = "GoForHIA>"
+# Console candidates are ttyUSB0..NUM_OF_PORTS-1
+NUM_OF_PORTS = 7
 SUDO_PASSWORD = os.getenv("SUDO_PASSWORD")
 
 
-def run_flash_script(script_path, args, logger: Logger):
+@traced("run_flash_script", "flash")
+def run_flash_script(script_path, args, logger: Logger, sudo_password: str | None = None):
     """
     Runs the external flash script and streams output live.
 
@@ -47,86 +55,93 @@ def run_flash_script(script_path, args, logger: Logger):
     """
 
     logger.info("Running flash script...")
-    process = None
+    progress_bar = ProgressBar()
     try:
         command = ["sudo", "-S", script_path, args]
-        
-       
-        start_time = time.time()
-        process = subprocess.Popen(
-            command,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        
-        # Provide the password and stream output live
-        process.stdin.write(f"{SUDO_PASSWORD}\n")
-        process.stdin.flush()
 
         super_message("Flashing HPA")
-        flashing_time = 3 * 60 + 5
-        progress_bar.start(flashing_time)
-        for line in iter(process.stdout.readline, ""):
-            logger.debug(line.strip())
+        flashing_time = 3 * 60 + 5  # Estimate until the flash script reports its stages
+        tracker = ProgressTracker("hpa_flash", tegra_flash_parser(), flashing_time)
+        progress_bar.start_tracking(tracker)
 
-        for error_line in iter(process.stderr.readline, ""):
-            logger.error(error_line.strip())
-
-        process.wait()
-        if process.returncode != 0:
+        # Provide the password, both output streams are pumped concurrently
+        result = run_process(
+            command,
+            logger,
+            stdout_level=logging.DEBUG,
+            stderr_level=logging.ERROR,
+            stdin_data=f"{sudo_password or SUDO_PASSWORD}\n",
+            on_line=lambda stream, line: tracker.feed(line),
+        )
+        tracker.finish(success=result.returncode == 0)
+        if result.returncode != 0:
             raise FlashScriptError("Flash script execution failed.")
 
         logger.debug("Flash script completed successfully.")
-        end_time = time.time()
         progress_bar.stop()
-        return end_time - start_time
+        return result.duration
     except Exception as e:
         logger.error(f"Flash script failed with error: {e}")
         progress_bar.stop(done=False)
         raise FlashScriptError("Flash script execution failed.") from e
-    finally:
-        if process and process.stdin:
-            process.stdin.close()
-        if process and process.stdout:
-            process.stdout.close()
-        if process and process.stderr:
-            process.stderr.close()
-
-def flash_hpa(logger: Logger):
-    """Main procedure to automate the flashing process."""
+
+def flash_hpa(
+    logger: Logger,
+    executor: SerialCommandExecutor | None = None,
+    flash_filepath: str | None = None,
+    sudo_password: str | None = None,
+    port: str | None = None,
+):
+    """Main procedure to automate the flashing process.
+
+    Args:
+        executor: Serial command executor to use, defaults to an echo-paced
+            SerialCommandExecutor. Pass a BlockingAsyncSerialCommandExecutor
+            to drive the console from the shared event loop.
+        flash_filepath: Tegra flash script, defaults to HPA_FLASH_FILEPATH.
+        sudo_password: Password for sudo, defaults to SUDO_PASSWORD.
+        port: Console of the HPA, found by probing the ttyUSB ports when None.
+    """
     try:
         cli_handler = CliHandler(interactive_cli_mode=False)
         # exitcode, response = cli_handler.execute_cli_command(flash_local_files_try_1())
-        strategy = CharacterByCharacterSerialCommand()
-        executor = SerialCommandExecutor(strategy)
-        port = search_correct_ttyUSB_port(7, executor, "GoForHIA>", 0.5, logger)
-
-        with serial.Serial(port, **SERIAL_CONFIG) as ser:
-            executor.execute(ser, b"tegrarecovery x1 on", b"Command Executed", 5, logger)
-            executor.execute(ser, b"tegrareset x1", b"Command Executed", 5, logger)
-
-            total_time = run_flash_script(HPA_FLASH_FILEPATH, FLASH_ARGS, logger)
-            
-            executor.execute(ser, b"tegrarecovery x1 off", b"Command Executed", 2, logger)
-            executor.execute(ser, b"tegrareset x1", b"Command Executed", 2, logger)
+        if executor is None:
+            executor = SerialCommandExecutor(EchoPacedSerialCommand())
+        if port is None:
+            with phase("port_discovery"):
+                port = find_ttyUSB_port("HPA", NUM_OF_PORTS, PROMT, 0.5, logger)
+
+        with open_console(port, **SERIAL_CONFIG) as ser:
+            with phase("recovery_mode"):
+                executor.execute(ser, b"tegrarecovery x1 on", b"Command Executed", 5, logger)
+                executor.execute(ser, b"tegrareset x1", b"Command Executed", 5, logger)
+
+            with phase("flash_script"):
+                try:
+                    total_time = run_flash_script(flash_filepath or HPA_FLASH_FILEPATH, FLASH_ARGS, logger, sudo_password)
+                except FlashScriptError:
+                    # Leave recovery mode on the console that is still open
+                    executor.execute(ser, b"tegrarecovery x1 off", b"Command Executed", 2, logger)
+                    executor.execute(ser, b"tegrareset x1", b"Command Executed", 2, logger)
+                    raise
+
+            with phase("exit_recovery"):
+                executor.execute(ser, b"tegrarecovery x1 off", b"Command Executed", 2, logger)
+                executor.execute(ser, b"tegrareset x1", b"Command Executed", 2, logger)
  
 
         logger.debug("HPA bootburn completed successfully.")
         super_message("Done!")
         formatted_time = time.strftime("%H:%M:%S", time.gmtime(total_time))
         logger.info(f"Total time: {formatted_time}")
-
-    except PortNotFoundError:
-        pass
-    except CommandFailedError:
-        pass
-    except FlashScriptError:
-        with serial.Serial(port, **SERIAL_CONFIG) as ser:
-            executor.execute(ser, b"tegrarecovery x1 off", b"Command Executed", 2, logger)
-            executor.execute(ser, b"tegrareset x1", b"Command Executed", 2, logger)
+        return total_time
+
+    except PortNotFoundError as e:
+        record_failure(e)
+    except CommandFailedError as e:
+        record_failure(e)
+    except FlashScriptError as e:
+        record_failure(e)
     except KeyboardInterrupt:
         logger.info("Script interrupted by user. Exiting.")
         sys.exit(1)
@@ -4,11 +4,21 @@ from logging import Logger
 from logger.logger_config import super_message
 import serial
 import time
+from utils.console_broker import open_console, recent_output
+from utils.flash_history import phase, record_failure
 from utils.minicom import *
+from utils.port_cache import find_ttyUSB_port
+from utils.progress import ProgressTracker, swupdate_parser
 from utils.progress_bar import ProgressBar
+from utils.tracing import traced
 
 SUDO_PASSWORD = os.getenv("SUDO_PASSWORD")
-progress_bar = ProgressBar()
+# Linux login banner and U-Boot prompt
+PORT_PROMPTS = ["DoIP-VCC", "=>"]
+# Console candidates are ttyUSB0..NUM_OF_PORTS-1
+NUM_OF_PORTS = 6
+# A prompt older than this in the console history may predate a reset nobody saw, it is confirmed first
+HISTORY_TRUST_SECONDS = 5
 
 SERIAL_CONFIG = {
     "baudrate": 115200
@@ -47,10 +57,39 @@ def wait_sga_running(ser, quiet):
 
 
 
+def _prompt_state(output: str) -> str | None:
+    """State from the prompt the console printed last, None if it ended elsewhere."""
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if not lines:
+        return None
+    if lines[-1].lower().endswith("login:"):
+        return "login_required"
+    if lines[-1].endswith("$"):
+        return "logged_in"
+    if lines[-1].endswith("=>"):
+        return "uboot"
+    return None
+
+
 def check_sga_pre_state(ser: serial.Serial, serial_executor: SerialCommandStrategy, logger: Logger) -> str:
     logger.info(f"Checking SGA pre-state...")
-    
-    _, output = serial_executor.execute(ser, b"\x04", b"login", timeout=2, logger=logger)
+
+    # The console broker recorded what the SGA printed, a prompt from just now needs no probe
+    state = _prompt_state(recent_output(ser, seconds=HISTORY_TRUST_SECONDS))
+    if state is not None:
+        logger.debug(f"SGA state from console history: {state}")
+        return state
+
+    # An older login or shell prompt is confirmed with a bare CR, which only prints the prompt again.
+    # Not in U-Boot, where an empty line repeats the last command, e.g. source
+    if _prompt_state(recent_output(ser)) in ("login_required", "logged_in"):
+        _, output = serial_executor.execute(ser, b"", [b"login:", b"$"], timeout=2, logger=logger)
+        state = _prompt_state(output)
+        if state is not None:
+            logger.debug(f"SGA state from console history, confirmed: {state}")
+            return state
+
+    _, output = serial_executor.execute(ser, b"\x04", [b"login", b"$", b"=>"], timeout=2, logger=logger)
 
     if "login" in output.lower():
         logger.debug("Login prompt detected.")
@@ -76,6 +115,7 @@ def login_user(ser: serial.Serial, serial_executor: SerialCommandStrategy, user:
 
 
 
+@traced("enter_uboot", "flash")
 def enter_uboot(ser: serial.Serial, serial_executor: SerialCommandStrategy, timeout, logger: Logger):
     logger.info("Rebooting and entering U-Boot mode...")
 
@@ -124,6 +164,7 @@ def uboot_flash_old(ser, serial_executor: SerialCommandExecutor, logger: Logger)
         logger.error("Failed to flash SGA")
     return end_time - start_time
 
+@traced("uboot_flash", "flash")
 def uboot_flash(ser, serial_executor: SerialCommandExecutor, logger: Logger):
     """Flash SGA"""
     logger.info("Preparing to flash SGA")
@@ -135,21 +176,29 @@ def uboot_flash(ser, serial_executor: SerialCommandExecutor, logger: Logger):
     #time.sleep(20)  # ToDO
     logger.debug("Starting the SGA flashing process")
     super_message("Flashing SGA")
-    progress_bar.start(flashing_time)
+    tracker = ProgressTracker("sga_flash", swupdate_parser(), flashing_time)
+    progress_bar = ProgressBar()
+    progress_bar.start_tracking(tracker)
+    serial_executor.strategy.listeners.append(tracker.feed_bytes)
     start_time = time.time()
-    success, _ = serial_executor.execute(ser, b"source 0x90000000\r", b"login", flashing_time, logger)
+    try:
+        success, _ = serial_executor.execute(ser, b"source 0x90000000\r", b"login", flashing_time, logger)
+    finally:
+        serial_executor.strategy.listeners.remove(tracker.feed_bytes)
     end_time = time.time()
+    tracker.finish(success)
     if success:
         progress_bar.stop()
         super_message("Done!")
     else:
         progress_bar.stop()
         logger.error("Failed to flash SGA")
+        return None
     return end_time - start_time
     
 
-def _find_sga_port(serial_executor: SerialCommandExecutor, logger: Logger):
-    return search_correct_ttyUSB_port(6, serial_executor, ["DoIP-VCC", "=>"], 0.5, logger)
+def _find_sga_port(logger: Logger):
+    return find_ttyUSB_port("SGA", NUM_OF_PORTS, PORT_PROMPTS, 0.5, logger)
 
 def unblock_firewall_for_file_transerffering(password: str, logger: Logger):
     try:
@@ -164,49 +213,74 @@ def unblock_firewall_for_file_transerffering(password: str, logger: Logger):
         process.stdin.write(f"{password}\n")
         process.stdin.flush()
         logger.info("Successfully unblocked firewall for file transfer.")
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         logger.warning(f"Error executing command: {e}")
 
 
-def flash_sga(logger: Logger):
+def flash_sga(
+    logger: Logger,
+    serial_executor: SerialCommandExecutor | None = None,
+    sudo_password: str | None = None,
+    port: str | None = None,
+):
+    """Bootburn the SGA over its serial console.
+
+    serial_executor defaults to a BasicSerialCommand executor, a
+    BlockingAsyncSerialCommandExecutor runs the console on the shared event loop.
+    sudo_password defaults to SUDO_PASSWORD. port is found by probing the
+    ttyUSB ports when None.
+    """
     try:
-        unblock_firewall_for_file_transerffering(SUDO_PASSWORD, logger)
-        serial_strategy = BasicSerialCommand()
-        serial_executor = SerialCommandExecutor(serial_strategy)
+        unblock_firewall_for_file_transerffering(sudo_password or SUDO_PASSWORD, logger)
+        if serial_executor is None:
+            serial_executor = SerialCommandExecutor(BasicSerialCommand())
 
         user = "swupdate"
         password = "swupdate"
         reset_uboot_timeout = 15
         enter_uboot_timeout = 30
-        port = _find_sga_port(serial_executor, logger)
+        if port is None:
+            with phase("port_discovery"):
+                port = _find_sga_port(logger)
 
-        with serial.Serial(port, **SERIAL_CONFIG) as ser:
+        with open_console(port, **SERIAL_CONFIG) as ser:
 
-            prestate = check_sga_pre_state(ser, serial_executor, logger)
+            with phase("pre_state"):
+                prestate = check_sga_pre_state(ser, serial_executor, logger)
             logged_in = False
 
             if prestate == "uboot":
                 logger.warning("SGA stuck in uboot, resetting...")
-                serial_executor.execute(ser, b"reset\r", b"login", reset_uboot_timeout, logger)
-                login_user(ser, serial_executor, user, password, logger)
+                with phase("reboot_to_login"):
+                    serial_executor.execute(ser, b"reset\r", b"login", reset_uboot_timeout, logger)
+                with phase("login"):
+                    login_user(ser, serial_executor, user, password, logger)
                 logged_in = True
 
             if prestate == "login_required":
-                login_user(ser, serial_executor, user, password, logger)
+                with phase("login"):
+                    login_user(ser, serial_executor, user, password, logger)
                 logged_in = True
 
             if logged_in or prestate == "logged_in":
-                if enter_uboot(ser, serial_executor, enter_uboot_timeout, logger):
-                    total_time = uboot_flash(ser, serial_executor, logger)
-                    formatted_time = time.strftime("%H:%M:%S", time.gmtime(total_time))
-                    logger.info(f"Total time: {formatted_time}")
-                    
+                with phase("uboot_entry"):
+                    in_uboot = enter_uboot(ser, serial_executor, enter_uboot_timeout, logger)
+                if in_uboot:
+                    # Flashing ends with the SGA rebooting to its login prompt
+                    with phase("uboot_flash"):
+                        total_time = uboot_flash(ser, serial_executor, logger)
+                    if total_time is not None:
+                        formatted_time = time.strftime("%H:%M:%S", time.gmtime(total_time))
+                        logger.info(f"Total time: {formatted_time}")
+                        return total_time
+
             else:
                 logger.warning("Failed to check SGA prestate")
 
     except serial.SerialException as e:
+        record_failure(e)
         logger.error(f"Error communicating with port {port}: {e}")
-    except PortNotFoundError:
-        pass
+    except PortNotFoundError as e:
+        record_failure(e)
 
         
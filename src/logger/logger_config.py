@@ -1,5 +1,6 @@
 import logging
-import subprocess
+
+from utils.banner import show
 # Define a new log level for success
 SUCCESS_LEVEL = 25  # You can use any number between 1-50
 logging.addLevelName(SUCCESS_LEVEL, "SUCCESS")
@@ -56,5 +57,5 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
 def super_message(message):
-    command = f"figlet -f slant {message} | lolcat -d 2"
-    subprocess.run(command, shell=True)
\ No newline at end of file
+    # Rendered once and cached, printing it costs no process spawns
+    show(message)
\ No newline at end of file
@@ -1,27 +1,218 @@
 import argparse
-import subprocess
+import importlib
 import os
-import yaml
-from handlers import dhu_handler, hix_handler, hpa_handler, sga_handler
+import sys
+import time
 from logger.logger_config import logger
+from exceptions.exceptions import ConfigError, PortNotFoundError
+from utils import banner
+from utils.config import Configuration, load_configuration
+from utils.flash_history import FlashHistory, format_stats
+from utils.metrics import export_run
+from utils.tracing import tracer
+from utils.warm_container import warm_container_from_env
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 config_path = os.path.join(ROOT_DIR, "swen_tools_config.yaml")
+FLASH_ALL_ECUS = ["HPA", "SGA", "DHUH", "DHUM"]
+# Subcommands that use bench hardware, they run through the bench daemon when one is up
+FLASH_COMMANDS = ("DHUH", "DHUM", "HIX", "HPA", "SGA", "FLASH-ALL")
 
 def print_stylized_text():
     """Print the SWEN-TOOLS header."""
-    command = "figlet -f slant SWEN-TOOLS | boxes -d unicornsay | lolcat -d 2"
-    subprocess.run(command, shell=True)
+    banner.show("SWEN-TOOLS", boxed=True)
 
 
-def main():
+def load_handler(name: str):
+    """
+    Import a handler on first use. Handlers pull in serial, dotenv and the
+    swut CLI, so only the one for the chosen ECU is loaded.
+    """
+    return importlib.import_module(f"handlers.{name}")
+
+
+def recorded(ecu: str, software_path: str | None, func):
+    """
+    Run a handler, store the run with its phase timings in the flash history
+    and export the bench metrics.
+    """
+    history = FlashHistory()
+    run = None
     try:
-        print_stylized_text()
+        with history.record(ecu, software_path) as run:
+            result = func()
+            # Handlers return None when the bootburn failed
+            if result is not None:
+                run.succeed()
+    finally:
+        if run is not None:
+            export_run(run, logger)
+    return result
+
+
+def _require_success(ecu: str, result):
+    """Handlers swallow their own errors and return None, turn that into a failure."""
+    if result is None:
+        raise RuntimeError(f"{ecu} bootburn did not complete, see log above")
+    return result
+
+
+def serial_executors(args):
+    """Return the (HPA, SGA) serial executors, None selects the handler defaults."""
+    if not args.async_serial:
+        return None, None
+    from utils.async_minicom import AsyncBasicSerialCommand, AsyncEchoPacedSerialCommand, BlockingAsyncSerialCommandExecutor
+
+    # Both consoles share one event loop thread instead of blocking a thread each
+    return (
+        BlockingAsyncSerialCommandExecutor(AsyncEchoPacedSerialCommand()),
+        BlockingAsyncSerialCommandExecutor(AsyncBasicSerialCommand()),
+    )
+
+
+def warm_container(args):
+    """The warm DHU container when --warm-container is set, None selects run.sh."""
+    if not args.warm_container:
+        return None
+    container = warm_container_from_env()
+    if container is None:
+        logger.warning("--warm-container needs DOCKER_IMAGE and SWEN_TOOLS_DHU_DOCKER_ARGS (the docker run options of run.sh), using run.sh")
+    return container
+
+
+def bench_resources(args) -> list[str]:
+    """Bench resources the chosen subcommand holds while it runs."""
+    from utils.bench_daemon import job_resources
+
+    if args.ecu == "FLASH-ALL":
+        ecus = [ecu.upper() for ecu in args.only] if args.only else FLASH_ALL_ECUS
+        return job_resources(ecus, commit=not args.no_commit)
+    return job_resources([args.ecu])
+
+
+def run_on_daemon(args) -> int | None:
+    """
+    Hand the command to the bench daemon if one is running and wait for it.
+
+    Returns the job's exit code, None when there is no daemon and the
+    command should run in this process.
+    """
+    from utils import bench_daemon
+
+    if args.local or not bench_daemon.daemon_available():
+        return None
+    return bench_daemon.submit(sys.argv[1:], bench_resources(args), priority=args.priority)
+
+
+def attach_console(port: str, history_seconds: float | None):
+    """Print a console's history and live output, forwarding typed lines to it."""
+    import threading
+
+    from utils import console_broker
+
+    console = console_broker.attach(port)
+    if console is None:
+        logger.error(f"No console broker holds {port}")
+        return
+    with console:
+        if history_seconds != 0:
+            sys.stdout.write(console.history(history_seconds).decode("utf-8", errors="replace"))
+            sys.stdout.flush()
+
+        def forward_input():
+            for line in sys.stdin:
+                console.write(line.rstrip("\n").encode() + b"\r")
+
+        threading.Thread(target=forward_input, daemon=True).start()
+        console.timeout = None
+        while True:
+            sys.stdout.write(console.read(console.in_waiting or 1).decode("utf-8", errors="replace"))
+            sys.stdout.flush()
+
+
+def _console_port(ports: dict[str, str], ecu: str) -> str:
+    if ecu not in ports:
+        raise PortNotFoundError(f"No console answered with the {ecu} prompt")
+    return ports[ecu]
+
+
+def flash_all(configuration: Configuration, args):
+    """Bootburn several ECUs concurrently, only serializing real dependencies."""
+    from utils import progress_bar
+    from utils.port_cache import find_ecu_ports
+    from utils.scheduler import FlashTask, format_result_table, run_flash_dag
+
+    dhu_script_filepath = configuration.dhu_script_filepath
+    ecus = [ecu.upper() for ecu in args.only] if args.only else FLASH_ALL_ECUS
+    # Imported here, in the main thread, rather than by the worker threads
+    hpa_handler = load_handler("hpa_handler") if "HPA" in ecus else None
+    sga_handler = load_handler("sga_handler") if "SGA" in ecus else None
+    dhu_handler = load_handler("dhu_handler") if {"DHUH", "DHUM"} & set(ecus) else None
+    commit = not args.no_commit
+    hpa_executor, sga_executor = serial_executors(args)
+    # One container serves DHUH and DHUM, the second flash skips container startup
+    container = warm_container(args)
+
+    dhuh_sw_filepath = configuration.dhu_software_filepath(args.type, "dhuh")
+    dhum_sw_filepath = configuration.dhu_software_filepath(args.type, "dhum")
+    hpa_flash_filepath = configuration.hpa_flash_filepath
+    sudo_password = configuration.sudo_password
+
+    # Probing writes to every ttyUSB port, so all consoles are found here,
+    # before any ECU is flashed, instead of by the concurrent handlers
+    console_handlers = {"HPA": hpa_handler, "SGA": sga_handler}
+    console_prompts = {
+        "HPA": [hpa_handler.PROMT] if hpa_handler else None,
+        "SGA": sga_handler.PORT_PROMPTS if sga_handler else None,
+    }
+    console_ecus = {ecu: prompts for ecu, prompts in console_prompts.items() if prompts}
+    ports = {}
+    if console_ecus:
+        num_of_ports = max(console_handlers[ecu].NUM_OF_PORTS for ecu in console_ecus)
+        ports = find_ecu_ports(console_ecus, num_of_ports, 0.5, logger)
+
+    # Concurrent bars would overwrite each other on the same terminal line
+    if len(ecus) > 1:
+        progress_bar.set_enabled(False)
 
-        with open(config_path, "r") as file:
-            configuration = yaml.safe_load(file)
+    task_funcs = {
+        "HPA": lambda: _require_success("HPA", recorded("HPA", hpa_flash_filepath, lambda: hpa_handler.flash_hpa(
+            logger, hpa_executor, flash_filepath=hpa_flash_filepath, sudo_password=sudo_password,
+            port=_console_port(ports, "HPA")
+        ))),
+        "SGA": lambda: _require_success("SGA", recorded("SGA", None, lambda: sga_handler.flash_sga(
+            logger, sga_executor, sudo_password=sudo_password, port=_console_port(ports, "SGA")
+        ))),
+        "DHUH": lambda: _require_success("DHUH", recorded("DHUH", dhuh_sw_filepath, lambda: dhu_handler.flash_dhuh(
+            script_path=dhu_script_filepath,
+            args=configuration.dhu_arguments("dhuh"),
+            software_filepath=dhuh_sw_filepath,
+            logger=logger,
+            container=container
+        ))),
+        "DHUM": lambda: _require_success("DHUM", recorded("DHUM", dhum_sw_filepath, lambda: dhu_handler.flash_dhum(
+            script_path=dhu_script_filepath,
+            args=configuration.dhu_arguments("dhum"),
+            software_filepath=dhum_sw_filepath,
+            commit=commit,
+            logger=logger,
+            container=container
+        ))),
+    }
 
+    # Committing DHUM talks to the SGA edge node (169.254.4.10), so the SGA
+    # must be flashed and back up before DHUM can start.
+    dependencies = {"DHUM": ["SGA"] if commit and "SGA" in ecus else []}
 
+    tasks = [FlashTask(ecu, task_funcs[ecu], dependencies.get(ecu)) for ecu in ecus]
+    start_time = time.time()
+    results = run_flash_dag(tasks, logger, max_workers=args.jobs)
+    logger.info("Bootburn results:\n" + format_result_table(results, time.time() - start_time))
+    return all(result.ok for result in results.values())
+
+
+def main():
+    try:
         parser = argparse.ArgumentParser(description="SWEN-TOOLS")
 
         parser.add_argument(
@@ -31,6 +222,37 @@ def main():
             choices=["INFO", "DEBUG", "WARNING", "ERROR", "CRITICAL"],
             help="Set the logging level (default: INFO)",
         )
+        parser.add_argument(
+            "--no-banner",
+            action="store_true",
+            help="Do not print the banner and phase messages",
+        )
+        parser.add_argument(
+            "--trace",
+            metavar="OUT_JSON",
+            help="Write a Chrome trace of all phases to this file",
+        )
+        parser.add_argument(
+            "--warm-container",
+            action="store_true",
+            help="Flash DHUH/DHUM with docker exec in a long-lived container of DOCKER_IMAGE",
+        )
+        parser.add_argument(
+            "--async-serial",
+            action="store_true",
+            help="Drive the serial consoles from one asyncio event loop",
+        )
+        parser.add_argument(
+            "--local",
+            action="store_true",
+            help="Run in this process even when a bench daemon is running",
+        )
+        parser.add_argument(
+            "--priority",
+            type=int,
+            default=0,
+            help="Queue priority on the bench daemon, higher runs first (default: 0)",
+        )
 
         # Add a subparser for task-specific options
         subparsers = parser.add_subparsers(
@@ -57,64 +279,176 @@ def main():
             choices=["a", "b"],
         )
 
-        subparsers.add_parser("HPA", help="Bootburn HPA")
+        subparsers.add_parser("HPA", aliases=["hpa"], help="Bootburn HPA")
 
         sga_parser = subparsers.add_parser("SGA", aliases=["sga"], help="Bootburn SGA")
 
+        flash_all_parser = subparsers.add_parser("flash-all", aliases=["FLASH-ALL"], help="Bootburn several ECUs concurrently")
+        flash_all_parser.add_argument("--type", "-t", required=True, type=str, help="Choose type designation", choices=["polestar", "p", "volvo", "v"],)
+        flash_all_parser.add_argument("--only", nargs="+", type=str.upper, choices=FLASH_ALL_ECUS, help="Only bootburn these ECUs (default: all)")
+        flash_all_parser.add_argument("--no-commit", action="store_true", help="Do not commit DHUM, removes its dependency on SGA")
+        flash_all_parser.add_argument("--jobs", "-j", type=int, help="Maximum number of ECUs flashed at the same time")
+
+        stats_parser = subparsers.add_parser("stats", aliases=["STATS"], help="Show flash duration statistics")
+        stats_parser.add_argument("--ecu", dest="stats_ecu", type=str, help="Only show this ECU")
+        stats_parser.add_argument("--days", type=int, help="Only include runs from the last N days")
+        stats_parser.add_argument("--by", default="ecu", choices=["ecu", "software_path", "host", "bench"], help="Group runs by (default: ecu)")
+
+        daemon_parser = subparsers.add_parser("daemon", aliases=["DAEMON"], help="Run the bench daemon that queues flash jobs")
+        daemon_parser.add_argument("--workers", type=int, default=4, help="Jobs running at the same time at most (default: 4)")
+
+        subparsers.add_parser("queue", aliases=["QUEUE"], help="Show the jobs of the bench daemon")
+
+        cancel_parser = subparsers.add_parser("cancel", aliases=["CANCEL"], help="Cancel a job of the bench daemon")
+        cancel_parser.add_argument("job", type=int, help="Job ID as shown by queue")
+
+        consoles_parser = subparsers.add_parser("consoles", aliases=["CONSOLES"], help="Run the console broker that captures all serial consoles")
+        consoles_parser.add_argument("--ports", nargs="+", help="Console devices (default: SWEN_TOOLS_CONSOLE_PORTS)")
+
+        console_parser = subparsers.add_parser("console", aliases=["CONSOLE"], help="Attach to a console held by the console broker")
+        console_parser.add_argument("port", help="Console device, e.g. /dev/ttyUSB6")
+        console_parser.add_argument("--history", type=float, metavar="SECONDS", help="Only show output of the last SECONDS, 0 for none (default: all)")
 
         args = parser.parse_args()
         logger.setLevel(level= args.log_level)
-
         if args.ecu:
             args.ecu = args.ecu.upper()
 
         ecu: str = args.ecu
 
-        dhu_script_filepath = configuration["handlers"]["dhu_handler"]["script_filepath"]
-        type_designation = args.type
+        # Configuration mistakes fail here, before the banner and any hardware
+        configuration = None
+        if ecu in FLASH_COMMANDS and ecu != "HIX":
+            try:
+                configuration = load_configuration(config_path)
+                if getattr(args, "type", None):
+                    args.type = configuration.resolve_type(args.type)
+            except ConfigError as e:
+                logger.error(str(e))
+                raise SystemExit(2)
+
+        if ecu in FLASH_COMMANDS:
+            returncode = run_on_daemon(args)
+            if returncode is not None:
+                raise SystemExit(returncode)
 
-        if ecu == "DHUH":
-            config_args = ""
-            for arg in configuration["handlers"]["dhu_handler"]["arguments"]["dhuh"]:
-                config_args += arg + " "
+        # After parsing, so --help and argument errors return right away
+        if args.no_banner:
+            banner.set_enabled(False)
+        print_stylized_text()
+        if args.trace:
+            tracer.enable()
+
+        if ecu == "STATS":
+            print(format_stats(FlashHistory(), group_by=args.by, ecu=args.stats_ecu, days=args.days))
+            return
+        if ecu == "CONSOLES":
+            from dotenv import load_dotenv
+
+            from utils import console_broker
+            from utils.minicom import SERIAL_CONFIG
+
+            load_dotenv()
+            # Never every ttyUSB: the broker would hold e.g. the DHU UDS tty and break dhuh_update
+            ports = args.ports or console_broker.configured_ports()
+            if not ports:
+                logger.error("No consoles to capture, pass --ports or set SWEN_TOOLS_CONSOLE_PORTS")
+                raise SystemExit(2)
+            console_broker.ConsoleBroker(ports, SERIAL_CONFIG, logger).serve_forever()
+            return
+        if ecu == "CONSOLE":
+            attach_console(args.port, args.history)
+            return
+        if ecu in ("DAEMON", "QUEUE", "CANCEL"):
+            from utils import bench_daemon
 
-            yaml_data = configuration["handlers"]["dhu_handler"]["software"]["type_designation"]
-            sw_filepath = yaml_data[type_designation]["dhuh_sw_filepath"]
+            if ecu != "DAEMON" and not bench_daemon.daemon_available():
+                logger.error(f"No bench daemon is listening on {bench_daemon.socket_path()}")
+                return
+            if ecu == "DAEMON":
+                from dotenv import load_dotenv
+
+                # Flash scripts and docker come from the daemon's settings, never from a client
+                load_dotenv()
+                extra_args = ["--warm-container"] if args.warm_container else None
+                bench_daemon.BenchDaemon(bench_daemon.socket_path(), logger, args.workers, extra_args).serve_forever()
+            elif ecu == "QUEUE":
+                print(bench_daemon.format_jobs(bench_daemon.request({"op": "status"})["jobs"]))
+            else:
+                response = bench_daemon.request({"op": "cancel", "job": args.job})
+                if "error" in response:
+                    logger.error(response["error"])
+                    raise SystemExit(1)
+                if not response["ok"]:
+                    logger.warning(f"Job {args.job} is not queued or running")
+            return
+
+        type_designation = getattr(args, "type", None)
+        dhu_script_filepath = configuration.dhu_script_filepath if configuration else None
+
+        if ecu == "FLASH-ALL":
+            # Failed and skipped ECUs both fail the run, scripts check the exit status
+            if not flash_all(configuration, args):
+                raise SystemExit(1)
+        elif ecu == "DHUH":
+            dhu_handler = load_handler("dhu_handler")
+            config_args = configuration.dhu_arguments("dhuh")
+            sw_filepath = configuration.dhu_software_filepath(type_designation, "dhuh")
             custom_sw_filepath = args.sw_path
-            dhu_handler.flash_dhuh(
+            software_filepath = custom_sw_filepath if custom_sw_filepath else sw_filepath
+            _require_success("DHUH", recorded("DHUH", software_filepath, lambda: dhu_handler.flash_dhuh(
                 script_path=dhu_script_filepath,
                 args=config_args,
-                software_filepath=custom_sw_filepath if custom_sw_filepath else sw_filepath,
-                logger=logger
-            )
+                software_filepath=software_filepath,
+                logger=logger,
+                container=warm_container(args)
+            )))
         elif ecu == "DHUM":
-            config_args = ""
-            for arg in configuration["handlers"]["dhu_handler"]["arguments"]["dhum"]:
-                config_args += arg + " "
-
-            yaml_data = configuration["handlers"]["dhu_handler"]["software"]["type_designation"]
-            sw_filepath = yaml_data[type_designation]["dhum_sw_filepath"]
+            dhu_handler = load_handler("dhu_handler")
+            config_args = configuration.dhu_arguments("dhum")
+            sw_filepath = configuration.dhu_software_filepath(type_designation, "dhum")
             custom_sw_filepath = args.sw_path
+            software_filepath = custom_sw_filepath if custom_sw_filepath else sw_filepath
             commit = args.commit
-            print("COMMIT", commit)
-            dhu_handler.flash_dhum(
+            logger.debug(f"DHUM commit: {commit}")
+            _require_success("DHUM", recorded("DHUM", software_filepath, lambda: dhu_handler.flash_dhum(
                 script_path=dhu_script_filepath,
                 args=config_args,
-                software_filepath=custom_sw_filepath if custom_sw_filepath else sw_filepath, 
+                software_filepath=software_filepath,
                 commit=commit if commit else True,
-                logger=logger
-            )        
+                logger=logger,
+                container=warm_container(args)
+            )))
         elif ecu == "HIX":
             pass
         elif ecu == "HPA":
-            hpa_handler.flash_hpa(logger)
+            hpa_handler = load_handler("hpa_handler")
+            _require_success("HPA", recorded("HPA", configuration.hpa_flash_filepath, lambda: hpa_handler.flash_hpa(
+                logger,
+                serial_executors(args)[0],
+                flash_filepath=configuration.hpa_flash_filepath,
+                sudo_password=configuration.sudo_password
+            )))
         elif ecu == "SGA":
-            sga_handler.flash_sga(logger)
+            sga_handler = load_handler("sga_handler")
+            _require_success("SGA", recorded(
+                "SGA", None, lambda: sga_handler.flash_sga(logger, serial_executors(args)[1], sudo_password=configuration.sudo_password)
+            ))
 
     except KeyboardInterrupt:
         logger.info("swen-tools interrupted by user.")
     except Exception as e:
-        logger.error(f"Failed to bootburn {ecu}: ", e)
+        logger.error(f"Failed to bootburn {ecu}: {e}")
+        # Scripts and the bench daemon go by the exit status
+        raise SystemExit(1)
+    finally:
+        if tracer.enabled:
+            # A bad path must not hide how the flash itself ended
+            try:
+                tracer.write(args.trace)
+                logger.info(f"Trace written to {args.trace}")
+            except OSError as e:
+                logger.warning(f"Could not write trace to {args.trace}: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+from simulators.console import PtyConsole, SimulatorBench
+from simulators.hpa import HpaSimulator
+from simulators.sga import SgaSimulator
+
+__all__ = ["PtyConsole", "SimulatorBench", "HpaSimulator", "SgaSimulator"]
@@ -0,0 +1,44 @@
+import argparse
+import signal
+import tempfile
+
+from simulators.console import SimulatorBench
+from simulators.hpa import HpaSimulator
+from simulators.sga import SgaSimulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated HPA/SGA consoles on pseudo-terminals.")
+    parser.add_argument("consoles", nargs="+", choices=["hpa", "sga", "none"], help="Consoles in ttyUSB order, 'none' leaves a gap")
+    parser.add_argument("--dir", default=None, help="Directory for the ttyUSB<n> symlinks (default: a temporary directory)")
+    parser.add_argument("--bytes-per-second", type=int, default=11520, help="Console output rate, 0 for unlimited (default: 11520)")
+    parser.add_argument("--response-delay", type=float, default=0.0, help="Delay before answering a line in seconds")
+    parser.add_argument("--flash-time", type=float, default=10.0, help="SGA flash duration in seconds")
+    parser.add_argument("--boot-time", type=float, default=2.0, help="SGA kernel boot duration in seconds")
+    parser.add_argument("--sga-state", default="login", choices=["login", "shell", "uboot"], help="Initial SGA state")
+    args = parser.parse_args()
+
+    common = {"bytes_per_second": args.bytes_per_second or None, "response_delay": args.response_delay}
+    consoles = []
+    for name in args.consoles:
+        if name == "hpa":
+            consoles.append(HpaSimulator(**common))
+        elif name == "sga":
+            consoles.append(SgaSimulator(state=args.sga_state, flash_time=args.flash_time, boot_time=args.boot_time, **common))
+        else:
+            consoles.append(None)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="swen-sim-")
+    with SimulatorBench(directory, consoles) as bench:
+        for link, console in zip(bench.links, [c for c in consoles if c is not None]):
+            print(f"{link} -> {console.port} ({type(console).__name__})")
+        print(f"\nexport SWEN_TOOLS_TTY_PREFIX={bench.prefix}")
+        print("Press Ctrl+C to stop.")
+        try:
+            signal.pause()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
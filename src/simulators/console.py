@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import os
+import pty
+import selectors
+import threading
+import time
+import tty
+from abc import ABC, abstractmethod
+
+# 115200 baud 8N1 moves at most 11520 bytes per second
+DEFAULT_BYTES_PER_SECOND = 11520
+
+
+class PtyConsole(ABC):
+    """
+    A serial console simulated on a pseudo-terminal.
+
+    Clients open `port` like a /dev/ttyUSB* device. Input is handled byte by
+    byte on a background thread, output is paced to bytes_per_second and
+    delayed work is scheduled with `schedule` so the console keeps reading
+    input (e.g. an ESC during autoboot) while "busy".
+
+    Args:
+        bytes_per_second (int | None): Output rate, None for unlimited.
+        response_delay (float): Delay before answering a completed line.
+        echo (bool): Echo typed characters back.
+    """
+
+    def __init__(self, bytes_per_second: int | None = DEFAULT_BYTES_PER_SECOND, response_delay: float = 0.0, echo: bool = True):
+        self.bytes_per_second = bytes_per_second
+        self.response_delay = response_delay
+        self.echo = echo
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self.line = bytearray()
+        self.received = bytearray()  # Everything the client sent, for assertions
+        self._events = []
+        self._event_ids = itertools.count()
+        self._lock = threading.RLock()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        os.write(self._wakeup_write, b"x")
+        if self._thread:
+            self._thread.join()
+        for fd in (self.master, self.slave, self._wakeup_read, self._wakeup_write):
+            os.close(fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def write(self, data: bytes | str):
+        """Send output to the client at the configured byte rate."""
+        if isinstance(data, str):
+            data = data.encode()
+        if not self.bytes_per_second:
+            os.write(self.master, data)
+            return
+        chunk_size = max(1, self.bytes_per_second // 100)  # ~10 ms per chunk
+        for i in range(0, len(data), chunk_size):
+            chunk = data[i:i + chunk_size]
+            os.write(self.master, chunk)
+            time.sleep(len(chunk) / self.bytes_per_second)
+
+    def schedule(self, delay: float, func, *args):
+        """Run func on the console thread after delay seconds, returns an id for cancel."""
+        event_id = next(self._event_ids)
+        with self._lock:
+            heapq.heappush(self._events, (time.monotonic() + delay, event_id, func, args))
+        os.write(self._wakeup_write, b"x")
+        return event_id
+
+    def cancel_all(self):
+        with self._lock:
+            self._events.clear()
+
+    def _next_event_timeout(self):
+        with self._lock:
+            if not self._events:
+                return None
+            return max(0.0, self._events[0][0] - time.monotonic())
+
+    def _run_due_events(self):
+        while True:
+            with self._lock:
+                if not self._events or self._events[0][0] > time.monotonic():
+                    return
+                _, _, func, args = heapq.heappop(self._events)
+            func(*args)
+
+    def _run(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.master, selectors.EVENT_READ, "master")
+            selector.register(self._wakeup_read, selectors.EVENT_READ, "wakeup")
+            while self._running:
+                for key, _ in selector.select(self._next_event_timeout()):
+                    if key.data == "wakeup":
+                        os.read(self._wakeup_read, 1024)
+                        continue
+                    try:
+                        data = os.read(self.master, 1024)
+                    except OSError:
+                        continue
+                    self.received += data
+                    for byte in data:
+                        self.on_byte(bytes([byte]))
+                self._run_due_events()
+
+    def on_byte(self, byte: bytes):
+        """Default line discipline: echo, collect a line and hand it to on_line on CR."""
+        if byte in (b"\r", b"\n"):
+            line = self.line.decode("utf-8", errors="replace")
+            self.line.clear()
+            if self.response_delay:
+                self.schedule(self.response_delay, self.on_line, line)
+            else:
+                self.on_line(line)
+            return
+        if byte in (b"\x7f", b"\x08"):
+            if self.line:
+                self.line.pop()
+                if self.echo:
+                    self.write(b"\x08 \x08")
+            return
+        self.line += byte
+        if self.echo:
+            self.write(byte)
+
+    @abstractmethod
+    def on_line(self, line: str):
+        """Answer a line the client completed with CR or LF."""
+        pass
+
+
+class SimulatorBench:
+    """
+    Exposes simulated consoles as <directory>/ttyUSB<n> symlinks.
+
+    Point SWEN_TOOLS_TTY_PREFIX at <directory>/ttyUSB and port discovery,
+    flash_hpa and flash_sga talk to the simulators instead of hardware.
+    """
+
+    def __init__(self, directory: str, consoles: list[PtyConsole | None]):
+        self.directory = directory
+        self.consoles = consoles
+        self.links = []
+
+    @property
+    def prefix(self) -> str:
+        return os.path.join(self.directory, "ttyUSB")
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for index, console in enumerate(self.consoles):
+            if console is None:
+                continue  # Leave a gap, like an unplugged adapter
+            link = f"{self.prefix}{index}"
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(console.port, link)
+            self.links.append(link)
+            console.start()
+        return self
+
+    def stop(self):
+        for console in self.consoles:
+            if console is not None:
+                console.stop()
+        for link in self.links:
+            if os.path.lexists(link):
+                os.remove(link)
+        self.links = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
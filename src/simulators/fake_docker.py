@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the docker CLI, enough for the warm DHU container.
+
+Supports `run -d`, `container inspect`, `image inspect`, `exec` and `rm -f`.
+Containers are files in FAKE_DOCKER_STATE (default /tmp/fake-docker). The
+container's main process and every exec run on the host; a container whose
+main process exited is gone, like with `run --rm`. `container inspect`
+runs the --health-cmd on the host unless FAKE_DOCKER_HEALTH forces a
+status. FAKE_DOCKER_STARTUP delays `run` to make container startup cost
+visible, FAKE_DOCKER_ENTRYPOINT is the JSON image entrypoint (default:
+echo).
+
+    export SWEN_TOOLS_DOCKER=$PWD/simulators/fake_docker.py DOCKER_IMAGE=fake
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+STATE_DIR = os.getenv("FAKE_DOCKER_STATE", "/tmp/fake-docker")
+# docker run options that take a value, the image follows the last option
+RUN_OPTIONS_WITH_VALUE = {
+    "--name", "--entrypoint", "--health-cmd", "--health-interval", "--health-start-period",
+    "--network", "-v", "--volume", "-e", "--env", "--device", "--user", "-u", "-w", "--workdir",
+}
+
+
+def _state_path(name: str) -> str:
+    return os.path.join(STATE_DIR, name)
+
+
+def _option_value(args: list[str], option: str) -> str | None:
+    return args[args.index(option) + 1] if option in args else None
+
+
+def _main_command(args: list[str]) -> list[str]:
+    """The main process of `run [options] image [command...]`."""
+    index = 1
+    while index < len(args) and args[index].startswith("-"):
+        index += 2 if args[index] in RUN_OPTIONS_WITH_VALUE else 1
+    command = args[index + 1:]
+    entrypoint = _option_value(args, "--entrypoint")
+    return ([entrypoint] if entrypoint else json.loads(os.getenv("FAKE_DOCKER_ENTRYPOINT", '["echo"]'))) + command
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as file:
+            # Zombies have exited, they are only waiting to be reaped
+            return file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+def _load(name: str) -> dict | None:
+    """State of a running container, None when there is none."""
+    try:
+        with open(_state_path(name), "r") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not _is_running(state["pid"]):
+        _remove(name)
+        return None
+    return state
+
+
+def _remove(name: str):
+    try:
+        os.remove(_state_path(name))
+    except OSError:
+        pass
+
+
+def _health(state: dict) -> str:
+    forced = os.getenv("FAKE_DOCKER_HEALTH")
+    if forced is not None:
+        return forced
+    health_cmd = state.get("health_cmd")
+    if not health_cmd:
+        return ""
+    result = subprocess.run(["sh", "-c", health_cmd], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return "healthy" if result.returncode == 0 else "unhealthy"
+
+
+def main(args: list[str]) -> int:
+    os.makedirs(STATE_DIR, exist_ok=True)
+    command = args[0] if args else ""
+
+    if command == "run":
+        name = _option_value(args, "--name")
+        time.sleep(float(os.getenv("FAKE_DOCKER_STARTUP", "3")))
+        process = subprocess.Popen(
+            _main_command(args), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        with open(_state_path(name), "w") as file:
+            json.dump({"args": args, "pid": process.pid, "started": time.time(), "health_cmd": _option_value(args, "--health-cmd")}, file)
+        print(f"fake-{name}")
+        return 0
+
+    if args[:2] == ["container", "inspect"]:
+        state = _load(args[-1])
+        if state is None:
+            print(f"Error: No such container: {args[-1]}", file=sys.stderr)
+            return 1
+        print(f"running {_health(state)}".strip())
+        return 0
+
+    if args[:2] == ["image", "inspect"]:
+        print(os.getenv("FAKE_DOCKER_ENTRYPOINT", '["echo"]'))
+        return 0
+
+    if command == "exec":
+        if _load(args[1]) is None:
+            print(f"Error: No such container: {args[1]}", file=sys.stderr)
+            return 1
+        return subprocess.call(args[2:])
+
+    if command == "rm":
+        state = _load(args[-1])
+        if state is not None:
+            try:
+                os.killpg(state["pid"], signal.SIGKILL)
+            except OSError:
+                pass
+        _remove(args[-1])
+        return 0
+
+    print(f"fake docker: unsupported command {' '.join(args)}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,20 @@
+#!/bin/sh
+# Stand-in for the HPA tegra flash.sh, prints the usual stages.
+# FAKE_FLASH_TIME sets the total duration in seconds (default 10),
+# FAKE_FLASH_EXIT the exit code.
+total=${FAKE_FLASH_TIME:-10}
+step=$(awk "BEGIN { print $total / 8 }")
+for stage in \
+    "Generating RCM messages" \
+    "Sending BCTs" \
+    "Sending bootloader and pre-requisite binaries" \
+    "Writing partition secondary_gpt" \
+    "Writing partition APP" \
+    "Writing partition kernel" \
+    "Writing partition recovery" \
+    "Flashing completed"; do
+    echo "[   $(date +%s) ] $stage"
+    sleep "$step"
+done
+echo "Warning: fake flash script, nothing was written" >&2
+exit "${FAKE_FLASH_EXIT:-0}"
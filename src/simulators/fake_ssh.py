@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the ssh client: runs the remote command locally with sh.
+
+Options (-o ...) are accepted and ignored, `-O <command>` control requests
+succeed. Together with a LogFollower whose commands are POSIX shell this
+exercises the SSH session layer without a guest VM or sshd.
+
+    export SWEN_TOOLS_SSH=$PWD/simulators/fake_ssh.py
+"""
+import subprocess
+import sys
+
+
+def main(args: list[str]) -> int:
+    remaining = []
+    index = 0
+    while index < len(args):
+        if args[index] in ("-o", "-p", "-l", "-i"):
+            index += 2
+            continue
+        if args[index] == "-O":
+            return 0
+        remaining.append(args[index])
+        index += 1
+
+    # remaining is [user@host, command...]
+    if len(remaining) < 2:
+        print("fake ssh: no remote command", file=sys.stderr)
+        return 255
+    return subprocess.call(["sh", "-c", " ".join(remaining[1:])])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,27 @@
+from simulators.console import PtyConsole
+
+PROMPT = "GoForHIA>"
+
+
+class HpaSimulator(PtyConsole):
+    """The HPA `GoForHIA>` debug shell."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.recovery = {}
+        self.resets = 0
+
+    def on_line(self, line: str):
+        words = line.split()
+        if not words:
+            self.write(f"\r\n{PROMPT}")
+            return
+
+        if words[0] == "tegrarecovery" and len(words) == 3 and words[2] in ("on", "off"):
+            self.recovery[words[1]] = words[2] == "on"
+            self.write(f"\r\nCommand Executed\r\n{PROMPT}")
+        elif words[0] == "tegrareset" and len(words) == 2:
+            self.resets += 1
+            self.write(f"\r\nCommand Executed\r\n{PROMPT}")
+        else:
+            self.write(f"\r\nUnknown command: {words[0]}\r\n{PROMPT}")
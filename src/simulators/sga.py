@@ -0,0 +1,165 @@
+from simulators.console import PtyConsole
+
+LOGIN_PROMPT = "DoIP-VCC login: "
+PASSWORD_PROMPT = "Password: "
+SHELL_PROMPT = "swupdate@DoIP-VCC:~$ "
+UBOOT_PROMPT = "=> "
+ESC = b"\x1b"
+CTRL_D = b"\x04"
+
+
+class SgaSimulator(PtyConsole):
+    """
+    The SGA console: Linux login and shell, and U-Boot reached by ESC during autoboot.
+
+    Args:
+        state (str): Initial state, "login", "shell" or "uboot".
+        user, password (str): Accepted credentials.
+        reboot_time (float): Time from `sudo reboot`/`reset` until the autoboot countdown.
+        autoboot_window (float): Time the countdown waits for a key.
+        boot_time (float): Time from kernel start to the login prompt.
+        flash_time (float): Duration of `source 0x90000000`.
+    """
+
+    def __init__(
+        self,
+        state: str = "login",
+        user: str = "swupdate",
+        password: str = "swupdate",
+        reboot_time: float = 1.0,
+        autoboot_window: float = 2.0,
+        boot_time: float = 2.0,
+        flash_time: float = 10.0,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.state = state
+        self.user = user
+        self.password = password
+        self.reboot_time = reboot_time
+        self.autoboot_window = autoboot_window
+        self.boot_time = boot_time
+        self.flash_time = flash_time
+
+        self.pending_user = None
+        self.init_script_loaded = False
+        self.flash_count = 0
+
+    def on_byte(self, byte: bytes):
+        if self.state in ("booting", "flashing"):
+            return  # Nobody is reading the console
+        if self.state == "autoboot":
+            self._stop_autoboot()
+            return
+        if byte == CTRL_D:
+            self._on_ctrl_d()
+            return
+        if byte == ESC:
+            return
+        if self.state == "password" and byte not in (b"\r", b"\n"):
+            self.line += byte  # Passwords are not echoed
+            return
+        super().on_byte(byte)
+
+    def _on_ctrl_d(self):
+        self.line.clear()
+        if self.state == "uboot":
+            self.write(f"\r\n{UBOOT_PROMPT}")
+        elif self.state == "shell":
+            self.write(f"logout\r\n\r\n{LOGIN_PROMPT}")
+            self.state = "login"
+        else:
+            self.write(f"\r\n{LOGIN_PROMPT}")
+            self.state = "login"
+
+    def on_line(self, line: str):
+        handler = getattr(self, f"_on_{self.state}_line", None)
+        if handler:
+            handler(line.strip())
+
+    def _on_login_line(self, line: str):
+        if not line:
+            self.write(f"\r\n{LOGIN_PROMPT}")
+            return
+        self.pending_user = line
+        self.write(f"\r\n{PASSWORD_PROMPT}")
+        self.state = "password"
+
+    def _on_password_line(self, line: str):
+        if self.pending_user == self.user and line == self.password:
+            self.write(f"\r\nLast login: today on ttyS0\r\n{SHELL_PROMPT}")
+            self.state = "shell"
+        else:
+            self.write(f"\r\n\r\nLogin incorrect\r\n{LOGIN_PROMPT}")
+            self.state = "login"
+
+    def _on_shell_line(self, line: str):
+        if line in ("sudo reboot", "reboot"):
+            self.write("\r\n[  OK  ] Stopped target Multi-User System.\r\nreboot: Restarting system\r\n")
+            self._reboot()
+        elif line in ("exit", "logout"):
+            self.write(f"\r\nlogout\r\n\r\n{LOGIN_PROMPT}")
+            self.state = "login"
+        elif line:
+            self.write(f"\r\n-sh: {line.split()[0]}: command not found\r\n{SHELL_PROMPT}")
+        else:
+            self.write(f"\r\n{SHELL_PROMPT}")
+
+    def _on_uboot_line(self, line: str):
+        if line == "run init_script":
+            self.init_script_loaded = True
+            self.write(f"\r\nLoading init script ...\r\n{UBOOT_PROMPT}")
+        elif line.startswith("source"):
+            if not self.init_script_loaded:
+                self.write(f"\r\n## Executing script at 90000000\r\nWrong image format for \"source\" command\r\n{UBOOT_PROMPT}")
+                return
+            self._flash()
+        elif line == "reset":
+            self.write("\r\nresetting ...\r\n")
+            self._reboot()
+        elif line.startswith("tftpboot"):
+            self.write(f"\r\nLoading: #################################\r\ndone\r\n{UBOOT_PROMPT}")
+        else:
+            self.write(f"\r\n{UBOOT_PROMPT}")
+
+    def _reboot(self):
+        self.state = "booting"
+        self.init_script_loaded = False
+        self.schedule(self.reboot_time, self._autoboot)
+
+    def _autoboot(self):
+        self.write("\r\nU-Boot 2020.04 (SGA)\r\n\r\nDRAM:  4 GiB\r\nHit any key to stop autoboot:  2 ")
+        self.state = "autoboot"
+        self.schedule(self.autoboot_window, self._boot_linux_after_countdown)
+
+    def _stop_autoboot(self):
+        self.cancel_all()
+        self.state = "uboot"
+        self.write(f"\b\b\b 0 \r\n{UBOOT_PROMPT}")
+
+    def _boot_linux_after_countdown(self):
+        if self.state == "autoboot":
+            self._boot_linux()
+
+    def _boot_linux(self):
+        self.state = "booting"
+        self.write("\r\nStarting kernel ...\r\n\r\n")
+        self.schedule(self.boot_time, self._login_prompt)
+
+    def _login_prompt(self):
+        self.state = "login"
+        self.write(f"\r\nPoky (Yocto Project Reference Distro) DoIP-VCC ttyS0\r\n\r\n{LOGIN_PROMPT}")
+
+    def _flash(self):
+        self.state = "flashing"
+        self.flash_count += 1
+        self.write("\r\n## Executing script at 90000000\r\nSoftware Update started !\r\n")
+        steps = 20
+        for step in range(1, steps + 1):
+            percent = step * 100 // steps
+            self.schedule(self.flash_time * step / steps, self.write, f"[SWUPDATE] progress: {percent}%\r\n")
+        self.schedule(self.flash_time, self._finish_flash)
+
+    def _finish_flash(self):
+        self.write("SWUPDATE successful !\r\nresetting ...\r\n")
+        self._boot_linux()
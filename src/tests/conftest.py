@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulators.console import SimulatorBench  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_host(tmp_path, monkeypatch):
+    """Keep caches, history, metrics and the console broker of the host out of the tests."""
+    from utils import progress_bar
+
+    monkeypatch.setenv("SWEN_TOOLS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("SWEN_TOOLS_HISTORY_DB", str(tmp_path / "history.sqlite"))
+    monkeypatch.setenv("SWEN_TOOLS_TEXTFILE_DIR", str(tmp_path / "textfile"))
+    monkeypatch.setenv("SWEN_TOOLS_CONSOLE_SOCKET", str(tmp_path / "console.sock"))
+    monkeypatch.setattr(progress_bar, "_enabled", False)
+
+
+@pytest.fixture
+def logger():
+    from logger.logger_config import logger
+
+    return logger
+
+
+@pytest.fixture
+def bench(tmp_path, monkeypatch):
+    """Start simulated consoles as ttyUSB<n> in order, None leaves a gap."""
+    from utils import minicom
+
+    benches = []
+
+    def start(*consoles):
+        simulator_bench = SimulatorBench(str(tmp_path / "dev"), list(consoles)).start()
+        benches.append(simulator_bench)
+        monkeypatch.setattr(minicom, "TTY_PORT_PREFIX", simulator_bench.prefix)
+        return simulator_bench
+
+    yield start
+    for simulator_bench in benches:
+        simulator_bench.stop()
+
@@ -0,0 +1,114 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from utils.artifact_cache import ArtifactCache, cached_artifact, cached_sha256
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def drops(tmp_path):
+    """Archives on the 'share', written on first use."""
+    directory = tmp_path / "share"
+    directory.mkdir()
+
+    def write(name: str, content: bytes) -> str:
+        path = directory / name
+        path.write_bytes(content)
+        return str(path)
+
+    return write
+
+
+def test_second_get_is_served_from_the_index(drops, logger, tmp_path):
+    cache = ArtifactCache(str(tmp_path / "store"), max_bytes=10 * MB)
+    source = drops("artifacts.zip", b"dhuh drop 1")
+    cached, lease = cache.get(source, logger)
+    lease.close()
+    index_mtime = os.stat(cache.index_path).st_mtime_ns
+
+    again, lease = cache.get(source, logger)
+    lease.close()
+
+    assert again == cached
+    assert Path(cached).read_bytes() == b"dhuh drop 1"
+    # Lookups only read the index
+    assert os.stat(cache.index_path).st_mtime_ns == index_mtime
+
+
+def test_changed_source_is_imported_again(drops, logger, tmp_path):
+    cache = ArtifactCache(str(tmp_path / "store"), max_bytes=10 * MB)
+    source = drops("artifacts.zip", b"dhuh drop 1")
+    cache.get(source, logger)[1].close()
+
+    drops("artifacts.zip", b"dhuh drop 2, rebuilt")
+
+    assert cache.lookup(source) is None
+    cached, lease = cache.get(source, logger)
+    lease.close()
+    assert Path(cached).read_bytes() == b"dhuh drop 2, rebuilt"
+
+
+def test_same_content_is_stored_once(drops, logger, tmp_path):
+    cache = ArtifactCache(str(tmp_path / "store"), max_bytes=10 * MB)
+    first, lease_1 = cache.get(drops("artifacts.zip", b"same bytes"), logger)
+    second, lease_2 = cache.get(drops("FW.zip", b"same bytes"), logger)
+    lease_1.close()
+    lease_2.close()
+
+    assert os.path.dirname(first) == os.path.dirname(second)
+    assert os.path.samefile(first, second)
+    assert len(cache._load()["blobs"]) == 1
+
+
+def test_least_recently_used_is_evicted(drops, logger, tmp_path):
+    cache = ArtifactCache(str(tmp_path / "store"), max_bytes=2 * MB)
+    old = drops("old.zip", b"o" * MB)
+    recent = drops("recent.zip", b"r" * MB)
+    cache.get(old, logger)[1].close()
+    cache.get(recent, logger)[1].close()
+    # Use the older drop again, the other one is now least recently used
+    os.utime(cache._lease_path(cache._load()["sources"][os.path.realpath(recent)]["digest"]), (1, 1))
+    cache.get(old, logger)[1].close()
+
+    cache.get(drops("new.zip", b"n" * MB), logger)[1].close()
+
+    assert cache.lookup(recent) is None
+    assert cache.lookup(old) is not None
+
+
+def test_blob_in_use_is_not_evicted(drops, logger, tmp_path):
+    cache = ArtifactCache(str(tmp_path / "store"), max_bytes=MB)
+    dhuh = drops("artifacts.zip", b"h" * MB)
+    dhuh_cached, dhuh_lease = cache.get(dhuh, logger)
+
+    # DHUM imported while DHUH is still flashing
+    dhum_cached, dhum_lease = cache.get(drops("FW.zip", b"m" * MB), logger)
+
+    assert os.path.isfile(dhuh_cached)
+    assert os.path.isfile(dhum_cached)
+    dhuh_lease.close()
+    dhum_lease.close()
+
+    # Once DHUH is done, the next import evicts it
+    cache.get(drops("next.zip", b"x" * MB), logger)[1].close()
+    assert not os.path.exists(dhuh_cached)
+
+
+def test_cached_artifact_pins_and_knows_the_hash(drops, logger):
+    source = drops("artifacts.zip", b"dhuh drop")
+
+    with cached_artifact(source, logger) as cached:
+        assert cached != source
+        assert cached_sha256(cached) == os.path.basename(os.path.dirname(cached))
+        assert cached_sha256(source) is None
+
+
+def test_cached_artifact_falls_back_to_the_source(drops, logger, monkeypatch):
+    source = drops("artifacts.zip", b"dhuh drop")
+    monkeypatch.setenv("SWEN_TOOLS_ARTIFACT_CACHE_SIZE", "0")
+
+    with cached_artifact(source, logger) as cached:
+        assert cached == source
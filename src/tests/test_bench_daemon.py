@@ -0,0 +1,105 @@
+"""BenchDaemon jobs, with main.py replaced by a script that prints its environment."""
+import logging
+import os
+import pwd
+import threading
+import time
+
+import pytest
+
+from utils import bench_daemon
+
+MAIN_PATH = bench_daemon.MAIN_PATH
+
+PRINT_ENV = """import os
+for name in ("HPA_FLASH_FILEPATH", "SUDO_PASSWORD", "SWEN_TOOLS_BENCH"):
+    print(f"{name}={os.environ.get(name)}")
+"""
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    script = tmp_path / "print_env.py"
+    script.write_text(PRINT_ENV)
+    monkeypatch.setattr(bench_daemon, "MAIN_PATH", str(script))
+    path = str(tmp_path / "bench.sock")
+    bench = bench_daemon.BenchDaemon(path, logging.getLogger("test-bench-daemon"), workers=1)
+    thread = threading.Thread(target=bench.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not bench_daemon.daemon_available(path):
+        assert time.monotonic() < deadline, "bench daemon did not start"
+        time.sleep(0.05)
+    yield bench
+    bench._server.shutdown()
+    thread.join()
+
+
+def run_job(path: str) -> list[str]:
+    lines = []
+    returncode = bench_daemon.submit(["hpa"], ["HPA"], write=lines.append, path=path)
+    assert returncode == 0
+    return [line for line in lines if "=" in line]
+
+
+def test_job_gets_client_settings(daemon, monkeypatch):
+    monkeypatch.setenv("SUDO_PASSWORD", "client-secret")
+    monkeypatch.setenv("SWEN_TOOLS_BENCH", "hil-7")
+
+    assert run_job(daemon.path)[1:] == ["SUDO_PASSWORD=client-secret", "SWEN_TOOLS_BENCH=hil-7"]
+
+
+def test_flash_script_is_the_daemons(daemon, monkeypatch):
+    # The daemon's environment is the test process's, what the client sends is ignored
+    monkeypatch.setenv("HPA_FLASH_FILEPATH", "/daemon/flash.sh")
+    client_env = bench_daemon.client_environment({"HPA_FLASH_FILEPATH": "/client/flash.sh"})
+
+    assert client_env == {}
+    assert run_job(daemon.path)[0] == "HPA_FLASH_FILEPATH=/daemon/flash.sh"
+
+
+def test_client_settings_replace_the_daemons():
+    daemon_env = {"PATH": "/usr/bin", "HPA_FLASH_FILEPATH": "/daemon/flash.sh", "SUDO_PASSWORD": "daemon-secret"}
+
+    env = bench_daemon.job_environment({"HPA_FLASH_FILEPATH": "/client/flash.sh", "SWEN_TOOLS_BENCH": "hil-7"}, daemon_env)
+
+    assert env == {
+        "PATH": "/usr/bin", "HPA_FLASH_FILEPATH": "/daemon/flash.sh", "SWEN_TOOLS_BENCH": "hil-7", "PYTHONUNBUFFERED": "1"
+    }
+
+
+def test_status_does_not_expose_the_password(daemon, monkeypatch):
+    monkeypatch.setenv("SUDO_PASSWORD", "client-secret")
+    run_job(daemon.path)
+
+    assert "client-secret" not in str(bench_daemon.request({"op": "status"}, daemon.path))
+
+
+def test_job_user_is_the_peer(daemon):
+    run_job(daemon.path)
+
+    job = bench_daemon.request({"op": "status"}, daemon.path)["jobs"][0]
+    assert job["user"] == pwd.getpwuid(os.getuid()).pw_name
+
+
+def test_unprivileged_daemon_rejects_other_users(daemon):
+    daemon.uid = os.getuid() + 1000
+    lines = []
+
+    assert bench_daemon.submit(["hpa"], ["HPA"], write=lines.append, path=daemon.path) == 1
+    assert "only accepts their jobs" in lines[0]
+    assert bench_daemon.request({"op": "status"}, daemon.path)["jobs"] == []
+
+
+def test_failed_flash_fails_the_job(daemon, tmp_path, monkeypatch):
+    # The real main.py, with no consoles the SGA handler fails to find its port
+    monkeypatch.setattr(bench_daemon, "MAIN_PATH", MAIN_PATH)
+    monkeypatch.setenv("SWEN_TOOLS_TTY_PREFIX", str(tmp_path / "ttyUSB"))
+    monkeypatch.setenv("SWEN_TOOLS_NO_BANNER", "1")
+    lines = []
+
+    returncode = bench_daemon.submit(["sga"], ["SGA"], write=lines.append, path=daemon.path)
+
+    assert returncode == 1
+    assert lines[-1] == "Job 1 failed"
+    assert any("Failed to bootburn SGA" in line for line in lines)
@@ -0,0 +1,118 @@
+import copy
+import os
+
+import pytest
+import yaml
+
+from exceptions.exceptions import ConfigError
+from utils import config
+from utils.config import Configuration, load_configuration
+
+REPO_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "swen_tools_config.yaml")
+
+
+@pytest.fixture
+def raw():
+    with open(REPO_CONFIG, "r") as file:
+        return yaml.safe_load(file)
+
+
+def errors_of(raw: dict) -> list[str]:
+    with pytest.raises(ConfigError) as error:
+        Configuration.compile(raw)
+    return str(error.value).splitlines()[1:]
+
+
+def test_repo_config_compiles(raw):
+    configuration = Configuration.compile(raw)
+
+    assert configuration.type_designations == ["polestar", "volvo"]
+    assert configuration.dhu_arguments("dhuh") == "--multiuser dhuh_update --uds-transport serial "
+    assert configuration.dhu_software_filepath("volvo", "dhum").endswith("/volvo/DHU_ORT_110_VCUv1_RC_INT/FW.zip")
+    assert configuration.hpa_flash_filepath == "/home/itahil/vcc_patched/tools/flash.sh"
+
+
+def test_every_error_is_reported_with_its_path(raw):
+    broken = copy.deepcopy(raw)
+    del broken["handlers"]["hpa_handler"]["script_filepath"]
+    broken["handlers"]["dhu_handler"]["arguments"]["dhum"] = ["--qdl", 3]
+    broken["handlers"]["dhu_handler"]["software"]["type_designation"]["volvo"] = "FW.zip"
+    broken["handlers"]["hix_handler"]["virtual_machine"]["ip_address"] = None
+
+    assert errors_of(broken) == [
+        "  handlers.dhu_handler.arguments.dhum[1]: expected str, got int",
+        "  handlers.dhu_handler.software.type_designation.volvo: expected a mapping, got str",
+        "  handlers.hix_handler.virtual_machine.ip_address: expected str, got NoneType",
+        "  handlers.hpa_handler.script_filepath: missing",
+    ]
+
+
+@pytest.mark.parametrize("raw_config, expected", [
+    (None, "  top level: expected a mapping, got NoneType"),
+    ({}, "  handlers: missing"),
+])
+def test_empty_files(raw_config, expected):
+    assert errors_of(raw_config) == [expected]
+
+
+def test_type_designations_must_not_be_empty(raw):
+    raw["handlers"]["dhu_handler"]["software"]["type_designation"] = {}
+
+    assert errors_of(raw) == ["  handlers.dhu_handler.software.type_designation: must not be empty"]
+
+
+@pytest.mark.parametrize("given, expected", [("p", "polestar"), ("V", "volvo"), ("Polestar", "polestar")])
+def test_type_aliases(raw, given, expected):
+    assert Configuration.compile(raw).resolve_type(given) == expected
+
+
+def test_unknown_type_lists_the_configured_ones(raw):
+    with pytest.raises(ConfigError, match="Unknown type designation 'xc90', configured: polestar, volvo"):
+        Configuration.compile(raw).resolve_type("xc90")
+
+
+def test_environment_overrides(raw, monkeypatch):
+    monkeypatch.setenv("HPA_FLASH_FILEPATH", "/opt/flash.sh")
+    monkeypatch.setenv("SUDO_PASSWORD", "secret")
+
+    configuration = Configuration.compile(raw).apply_environment()
+
+    assert configuration.hpa_flash_filepath == "/opt/flash.sh"
+    assert configuration.sudo_password == "secret"
+
+
+def test_load_caches_the_compiled_configuration(raw, tmp_path, monkeypatch):
+    path = tmp_path / "swen_tools_config.yaml"
+    path.write_text(yaml.safe_dump(raw))
+    monkeypatch.setenv("SUDO_PASSWORD", "secret")
+    first = load_configuration(str(path))
+
+    # A cache hit never parses yaml, and the password is not cached
+    monkeypatch.setattr(yaml, "safe_load", None)
+    cached = load_configuration(str(path))
+
+    assert cached.data == first.data
+    assert cached.sudo_password == "secret"
+    with open(config._cache_path(str(path)), "r") as file:
+        assert "secret" not in file.read()
+
+
+def test_changed_file_is_validated_again(raw, tmp_path):
+    path = tmp_path / "swen_tools_config.yaml"
+    path.write_text(yaml.safe_dump(raw))
+    load_configuration(str(path))
+
+    path.write_text("handlers: {}\n")
+
+    with pytest.raises(ConfigError, match="dhu_handler: missing"):
+        load_configuration(str(path))
+
+
+def test_missing_and_unparsable_files(tmp_path):
+    with pytest.raises(ConfigError, match="Cannot read"):
+        load_configuration(str(tmp_path / "missing.yaml"))
+
+    path = tmp_path / "broken.yaml"
+    path.write_text("handlers: [unclosed\n")
+    with pytest.raises(ConfigError, match="Cannot parse"):
+        load_configuration(str(path))
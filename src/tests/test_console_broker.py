@@ -0,0 +1,109 @@
+"""The console broker over a simulated SGA, and the SGA pre-state check through it."""
+import logging
+import threading
+import time
+
+import pytest
+
+from handlers import sga_handler
+from simulators.sga import LOGIN_PROMPT, SHELL_PROMPT, UBOOT_PROMPT, SgaSimulator
+from utils import console_broker
+from utils.console_broker import ConsoleBuffer
+from utils.minicom import BasicSerialCommand, SerialCommandExecutor
+
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+@pytest.fixture
+def broker(bench, tmp_path):
+    """Start a broker holding one simulated SGA console, returns (simulator, port)."""
+    brokers = []
+
+    def start(**simulator_args):
+        sga = SgaSimulator(bytes_per_second=None, **simulator_args)
+        port = f"{bench(sga).prefix}0"
+        server = console_broker.ConsoleBroker([port], {"baudrate": 115200}, logging.getLogger("test-broker"))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        brokers.append(server)
+        assert wait_for(lambda: console_broker.broker_available() and console_broker.ports()[0]["open"], 5)
+        return sga, port
+
+    yield start
+    for server in brokers:
+        server._server.shutdown()
+
+
+def test_buffer_keeps_the_newest_bytes():
+    buffer = ConsoleBuffer()
+    for data in (b"first\n", b"second\n", b"third\n"):
+        buffer.append(data)
+
+    assert b"".join(data for _, data in buffer.since(max_bytes=9)) == b"nd\nthird\n"
+    assert b"".join(data for _, data in buffer.since(max_bytes=6)) == b"third\n"
+    assert buffer.since(max_bytes=0) == []
+
+
+def test_history_sends_only_the_tail(broker):
+    sga, port = broker()
+    sga.write("x" * 10000 + LOGIN_PROMPT)
+    assert wait_for(lambda: console_broker.ports()[0]["buffered"] >= 10000, 5)
+
+    assert b"".join(data for _, data in console_broker.history(port, max_bytes=16)) == LOGIN_PROMPT.encode()[-16:]
+
+
+def test_attach_keeps_output_after_the_reply(broker):
+    sga, port = broker()
+    with console_broker.attach(port, timeout=2) as console:
+        sga.write(LOGIN_PROMPT)
+        assert console.read(len(LOGIN_PROMPT)) == LOGIN_PROMPT.encode()
+
+
+def check_pre_state(port: str) -> str:
+    with console_broker.open_console(port, timeout=1) as ser:
+        return sga_handler.check_sga_pre_state(ser, SerialCommandExecutor(BasicSerialCommand()), logging.getLogger("test"))
+
+
+def test_fresh_prompt_needs_no_probe(broker):
+    sga, port = broker(state="shell")
+    sga.write(SHELL_PROMPT)
+    time.sleep(0.2)
+
+    assert check_pre_state(port) == "logged_in"
+    assert sga.received == b""
+
+
+def test_old_prompt_is_confirmed_with_cr(broker, monkeypatch):
+    monkeypatch.setattr(sga_handler, "HISTORY_TRUST_SECONDS", 0.1)
+    sga, port = broker(state="shell")
+    sga.write(SHELL_PROMPT)
+    time.sleep(0.3)
+
+    assert check_pre_state(port) == "logged_in"
+    assert sga.received == b"\r"
+
+
+def test_old_prompt_out_of_date(broker, monkeypatch):
+    monkeypatch.setattr(sga_handler, "HISTORY_TRUST_SECONDS", 0.1)
+    # The history ends in a shell prompt, but the SGA was reset to its login prompt since
+    sga, port = broker(state="login")
+    sga.write(SHELL_PROMPT)
+    time.sleep(0.3)
+
+    assert check_pre_state(port) == "login_required"
+
+
+def test_old_uboot_prompt_is_probed_with_ctrl_d(broker, monkeypatch):
+    monkeypatch.setattr(sga_handler, "HISTORY_TRUST_SECONDS", 0.1)
+    sga, port = broker(state="uboot")
+    sga.write(UBOOT_PROMPT)
+    time.sleep(0.3)
+
+    assert check_pre_state(port) == "uboot"
+    assert sga.received == b"\x04\r"
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from utils.flash_history import FlashHistory, FlashRun, _format_seconds, format_stats, phase
+
+
+@pytest.fixture
+def history(tmp_path):
+    return FlashHistory(str(tmp_path / "history.sqlite"))
+
+
+def add_run(history: FlashHistory, ecu: str, duration: float, outcome: str = "success", started_at: float | None = None, phases=()):
+    run = FlashRun(ecu, f"/sw/{ecu.lower()}")
+    run.outcome = outcome
+    run.duration = duration
+    run.started_at = started_at or time.time()
+    run.phases = [(name, run.started_at, phase_duration) for name, phase_duration in phases]
+    history.save(run)
+
+
+def test_run_percentiles_use_nearest_rank(history):
+    for duration in range(1, 11):
+        add_run(history, "HPA", duration)
+    add_run(history, "SGA", 30)
+
+    assert history.run_percentiles() == [("HPA", 10, 5, 9, 10, 10), ("SGA", 1, 30, 30, 30, 30)]
+
+
+def test_failed_runs_are_counted_but_not_timed(history):
+    add_run(history, "HPA", 100)
+    add_run(history, "HPA", 5, outcome="failed")
+    add_run(history, "HPA", 7, outcome="interrupted")
+
+    assert history.run_percentiles() == [("HPA", 1, 100, 100, 100, 100)]
+    assert history.outcomes() == [("HPA", "failed", 1), ("HPA", "interrupted", 1), ("HPA", "success", 1)]
+
+
+def test_phase_percentiles(history):
+    add_run(history, "SGA", 60, phases=[("login", 2), ("flashing", 50)])
+    add_run(history, "SGA", 70, phases=[("login", 4), ("flashing", 60)])
+
+    assert history.phase_percentiles() == [("SGA flashing", 2, 50, 60, 60, 60), ("SGA login", 2, 2, 4, 4, 4)]
+
+
+def test_filters_by_ecu_and_age(history):
+    add_run(history, "HPA", 10, started_at=time.time() - 30 * 24 * 3600)
+    add_run(history, "HPA", 20)
+    add_run(history, "SGA", 30)
+
+    assert history.run_percentiles(ecu="hpa") == [("HPA", 2, 10, 20, 20, 20)]
+    assert history.run_percentiles(since=time.time() - 24 * 3600) == [("HPA", 1, 20, 20, 20, 20), ("SGA", 1, 30, 30, 30, 30)]
+
+
+def test_group_by_is_checked(history):
+    with pytest.raises(ValueError):
+        history.run_percentiles(group_by="outcome; DROP TABLE runs")
+
+
+def test_record_stores_outcome_failure_and_phases(history):
+    with history.record("SGA") as run:
+        with phase("login"):
+            pass
+        run.succeed()
+
+    with pytest.raises(TimeoutError):
+        with history.record("HPA") as failed_run:
+            raise TimeoutError()
+
+    with pytest.raises(KeyboardInterrupt):
+        with history.record("DHUH"):
+            raise KeyboardInterrupt()
+
+    assert failed_run.failure_class == "timeout"
+    assert history.outcomes() == [("DHUH", "interrupted", 1), ("HPA", "failed", 1), ("SGA", "success", 1)]
+    assert [row[0] for row in history.phase_percentiles()] == ["SGA login"]
+
+
+def test_phase_outside_a_recorded_run_is_ignored(history):
+    with phase("login"):
+        pass
+
+    assert history.phase_percentiles() == []
+
+
+@pytest.mark.parametrize("seconds, expected", [(None, "-"), (12.34, "12.3s"), (3725, "01:02:05")])
+def test_format_seconds(seconds, expected):
+    assert _format_seconds(seconds) == expected
+
+
+def test_format_stats(history):
+    add_run(history, "HPA", 90, phases=[("flash_script", 80)])
+    add_run(history, "HPA", 3, outcome="failed")
+
+    report = format_stats(history)
+
+    assert report.split("\n\n")[0].splitlines() == [
+        "Successful runs by ecu",
+        "ECU  RUNS  P50       P90       P95       MAX",
+        "-" * 49,
+        "HPA  1     00:01:30  00:01:30  00:01:30  00:01:30",
+    ]
+    assert "HPA flash_script  1     00:01:20" in report
+    assert "HPA  failed   1" in report
+    assert "Weekly median" in report
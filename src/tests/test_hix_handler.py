@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+from handlers import hix_handler
+
+
+class FakeVm:
+    """Records the session calls, flashes return the queued exit codes."""
+
+    def __init__(self, exit_codes, running=True, ready=True, dies_on_failure=False):
+        self.name = "windows10"
+        self.dies_on_failure = dies_on_failure
+        self.exit_codes = list(exit_codes)
+        self.running = running
+        self.ready = ready
+        self.calls = []
+
+    def is_vm_running(self, refresh=False):
+        self.calls.append(("is_vm_running", refresh))
+        return self.running
+
+    def wait_until_ready(self, timeout=180):
+        self.calls.append(("wait_until_ready", timeout))
+        return self.ready
+
+    def add_usb_filter(self, *args):
+        pass
+
+    def start(self, timeout=180, snapshot=None):
+        self.calls.append(("start",))
+        self.running = self.ready = True
+        return True
+
+    def has_snapshot(self, snapshot):
+        return True
+
+    def login(self):
+        self.calls.append(("login",))
+
+    def flash_hia_vbox(self, flags=None):
+        self.calls.append(("flash",))
+        exit_code = self.exit_codes.pop(0)
+        if exit_code != 0 and self.dies_on_failure:
+            self.running = False
+        return exit_code
+
+
+ARGS = SimpleNamespace(retries=3, retry_delay=0, boot_timeout=180, snapshot=None)
+
+
+def test_first_attempt_uses_the_prepared_session():
+    vm = FakeVm([0])
+
+    assert hix_handler.flash_with_retries(vm, "hia", ARGS, [])
+    assert vm.calls == [("flash",)]
+
+
+def test_retry_keeps_a_live_session():
+    vm = FakeVm([1, 0])
+
+    assert hix_handler.flash_with_retries(vm, "hia", ARGS, [])
+    assert ("start",) not in vm.calls
+    assert vm.calls[1] == ("is_vm_running", True)
+
+
+def test_retry_prepares_the_session_when_the_vm_is_gone():
+    # _flash_ecu_vbox swallows the error and returns -1 when the VM died meanwhile
+    vm = FakeVm([-1, 0], dies_on_failure=True)
+
+    assert hix_handler.flash_with_retries(vm, "hia", ARGS, [])
+    assert ("start",) in vm.calls
+    assert ("login",) in vm.calls
+
+
+def test_retry_prepares_the_session_when_the_guest_does_not_answer():
+    vm = FakeVm([2, 0])
+    vm.ready = False
+
+    assert hix_handler.flash_with_retries(vm, "hia", ARGS, [])
+    assert ("wait_until_ready", hix_handler.SESSION_CHECK_TIMEOUT) in vm.calls
+    assert ("start",) in vm.calls
+
+
+def test_all_retries_fail():
+    vm = FakeVm([1, 1, 1])
+
+    assert not hix_handler.flash_with_retries(vm, "hia", ARGS, [])
+    assert vm.calls.count(("flash",)) == 3
@@ -0,0 +1,102 @@
+import hashlib
+import time
+import zipfile
+
+import pytest
+
+from exceptions.exceptions import ArtifactIntegrityError
+from utils import integrity
+from utils.integrity import ArtifactVerifier, expected_sha256, verify_artifact
+from utils.process_runner import run_process
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "artifacts.zip"
+    with zipfile.ZipFile(path, "w") as archive_file:
+        archive_file.writestr("image.bin", b"\0" * 1024)
+    return path
+
+
+def sha256(path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_expected_sha256_from_sidecar_or_manifest(archive, tmp_path):
+    assert expected_sha256(str(archive)) is None
+
+    (tmp_path / "SHA256SUMS").write_text(f"{'a' * 64}  other.zip\n{'B' * 64} *artifacts.zip\n")
+    assert expected_sha256(str(archive)) == "b" * 64
+
+    (tmp_path / "artifacts.zip.sha256").write_text(f"{'c' * 64}\n")
+    assert expected_sha256(str(archive)) == "c" * 64
+
+
+def test_verify_against_the_original_checksum(archive, tmp_path):
+    (tmp_path / "artifacts.zip.sha256").write_text(sha256(archive))
+    cached = tmp_path / "cached.zip"
+    cached.write_bytes(archive.read_bytes())
+
+    assert verify_artifact(str(cached), str(archive)).endswith("sha256 ok")
+
+
+def test_mismatch_raises(archive, tmp_path):
+    (tmp_path / "artifacts.zip.sha256").write_text("0" * 64)
+
+    with pytest.raises(ArtifactIntegrityError, match="does not match"):
+        verify_artifact(str(archive))
+
+
+def test_truncated_zip_without_checksum_raises(archive):
+    archive.write_bytes(archive.read_bytes()[:-30])
+
+    with pytest.raises(ArtifactIntegrityError, match="truncated"):
+        verify_artifact(str(archive))
+
+
+def test_known_mismatch_raises_before_launch(archive, tmp_path, logger):
+    (tmp_path / "artifacts.zip.sha256").write_text(sha256(archive))
+    verifier = ArtifactVerifier([(str(archive), None, "f" * 64)], logger)
+
+    with pytest.raises(ArtifactIntegrityError):
+        verifier.start()
+    assert not verifier.pending
+
+
+def test_background_mismatch_aborts_the_process(archive, tmp_path, logger, monkeypatch):
+    (tmp_path / "artifacts.zip.sha256").write_text("0" * 64)
+    hash_file = integrity.sha256_file
+    # Keep verifying until the process runs, like hashing a large archive
+    monkeypatch.setattr(integrity, "sha256_file", lambda path: time.sleep(0.5) or hash_file(path))
+    stopped = []
+    verifier = ArtifactVerifier([(str(archive), None, None)], logger).start()
+    assert verifier.pending
+
+    start_time = time.monotonic()
+    result = run_process(
+        ["sh", "-c", "sleep 30 & wait"], logger,
+        on_start=lambda runner: verifier.abort_on_mismatch(runner, lambda: stopped.append(True)),
+        start_new_session=True,
+    )
+
+    assert time.monotonic() - start_time < 10
+    assert result.returncode != 0
+    assert stopped == [True]
+    with pytest.raises(ArtifactIntegrityError):
+        verifier.result()
+
+
+def test_ctrl_c_is_forwarded_to_a_new_session(tmp_path, logger):
+    marker = tmp_path / "interrupted"
+
+    def interrupt(runner):
+        time.sleep(0.5)
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        run_process(
+            ["sh", "-c", f"trap 'touch {marker}; exit 130' INT; sleep 30 & wait"], logger,
+            on_start=interrupt, start_new_session=True,
+        )
+
+    assert marker.exists()
@@ -0,0 +1,73 @@
+"""LogFollower over simulators/fake_ssh.py, with POSIX commands instead of PowerShell."""
+import os
+import time
+
+import pytest
+
+from utils.ssh_session import LogFollower, SshSession
+
+FAKE_SSH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulators", "fake_ssh.py")
+
+
+class PosixLogFollower(LogFollower):
+    LATEST_COMMAND = "ls -t {directory} 2>/dev/null | head -n 1"
+    FOLLOW_COMMAND = "tail -n 0 -f {path}"
+    FOLLOW_FROM_START_COMMAND = "tail -n +1 -f {path}"
+    PATH_SEPARATOR = "/"
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWEN_TOOLS_SSH", FAKE_SSH)
+    return SshSession("user", "guest", control_dir=str(tmp_path))
+
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_follows_new_lines(session, tmp_path):
+    log = tmp_path / "logs" / "flash.txt"
+    log.parent.mkdir()
+    log.write_text("before start\n")
+    lines = []
+    follower = PosixLogFollower(session, str(log.parent), lines.append, poll_interval=0.1).start()
+    assert wait_for(lambda: follower._runner is not None, 5)
+    time.sleep(0.3)
+
+    with open(log, "a") as file:
+        file.write("flashing\n")
+    assert wait_for(lambda: lines == ["flashing"], 5)
+    follower.stop(flush_time=0.5)
+
+
+def test_stop_without_log_returns_at_once(session, tmp_path):
+    follower = PosixLogFollower(session, str(tmp_path / "missing"), print, poll_interval=0.1).start()
+    time.sleep(0.2)
+
+    start = time.monotonic()
+    follower.stop()
+
+    assert time.monotonic() - start < 0.5
+
+
+def test_stop_returns_when_tail_ends(session, tmp_path):
+    class EndingFollower(PosixLogFollower):
+        FOLLOW_COMMAND = "cat {path}"
+
+    log = tmp_path / "flash.txt"
+    log.write_text("done\n")
+    lines = []
+    follower = EndingFollower(session, str(tmp_path), lines.append, poll_interval=0.1).start()
+    assert wait_for(lambda: follower._runner is not None, 5)
+
+    start = time.monotonic()
+    follower.stop(flush_time=5)
+
+    assert time.monotonic() - start < 2
+    assert lines == ["done"]
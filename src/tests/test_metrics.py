@@ -0,0 +1,84 @@
+from utils.flash_history import FlashRun
+from utils.metrics import MetricsStore, export_run
+
+
+def make_run(ecu: str, outcome: str = "success", duration: float = 200, failure: str | None = None, serial_bytes: int = 0):
+    run = FlashRun(ecu)
+    run.outcome = outcome
+    run.duration = duration
+    run.failure = failure
+    run.serial_bytes = serial_bytes
+    run.phases = [("port_discovery", run.started_at, 0.3)]
+    return run
+
+
+def samples(text: str) -> dict[str, str]:
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_render_counter_and_labels(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.json"))
+    series = {}
+    store.inc(series, "swen_tools_flash_failures_total", {"ecu": "SGA", "class": 'bad "quote"\n'})
+
+    assert store.render(series, {"user": "alice"}).splitlines() == [
+        "# HELP swen_tools_flash_failures_total Failed bootburns by failure class.",
+        "# TYPE swen_tools_flash_failures_total counter",
+        'swen_tools_flash_failures_total{user="alice",ecu="SGA",class="bad \\"quote\\"\\n"} 1',
+    ]
+
+
+def test_render_cumulative_histogram(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.json"))
+    series = {}
+    for value in (0.2, 0.4, 3):
+        store.observe(series, "swen_tools_port_discovery_seconds", {"ecu": "HPA"}, value, (0.25, 0.5, 5))
+
+    lines = store.render(series).splitlines()
+
+    assert lines[1] == "# TYPE swen_tools_port_discovery_seconds histogram"
+    assert lines[2:] == [
+        'swen_tools_port_discovery_seconds_bucket{ecu="HPA",le="0.25"} 1',
+        'swen_tools_port_discovery_seconds_bucket{ecu="HPA",le="0.5"} 2',
+        'swen_tools_port_discovery_seconds_bucket{ecu="HPA",le="5"} 3',
+        'swen_tools_port_discovery_seconds_bucket{ecu="HPA",le="+Inf"} 3',
+        'swen_tools_port_discovery_seconds_sum{ecu="HPA"} 3.6',
+        'swen_tools_port_discovery_seconds_count{ecu="HPA"} 3',
+    ]
+
+
+def test_export_accumulates_counters_between_runs(tmp_path, logger):
+    store = MetricsStore(str(tmp_path / "metrics.json"))
+    directory = tmp_path / "textfile"
+
+    export_run(make_run("HPA", serial_bytes=100), logger, store, str(directory), user="alice")
+    export_run(make_run("HPA", "failed", failure="PortNotFoundError", serial_bytes=50), logger, store, str(directory), user="alice")
+
+    exported = samples((directory / "swen_tools_alice.prom").read_text())
+    assert exported['swen_tools_flash_runs_total{user="alice",ecu="HPA",outcome="success"}'] == "1"
+    assert exported['swen_tools_flash_runs_total{user="alice",ecu="HPA",outcome="failed"}'] == "1"
+    assert exported['swen_tools_flash_failures_total{user="alice",ecu="HPA",class="PortNotFoundError"}'] == "1"
+    assert exported['swen_tools_flash_duration_seconds_count{user="alice",ecu="HPA"}'] == "1"
+    assert exported['swen_tools_port_discovery_seconds_count{user="alice",ecu="HPA"}'] == "2"
+    assert exported['swen_tools_serial_bytes_read_total{user="alice",ecu="HPA"}'] == "150"
+
+
+def test_users_do_not_overwrite_each_other(tmp_path, logger):
+    directory = tmp_path / "textfile"
+
+    export_run(make_run("HPA"), logger, MetricsStore(str(tmp_path / "alice.json")), str(directory), user="alice")
+    export_run(make_run("SGA"), logger, MetricsStore(str(tmp_path / "bob.json")), str(directory), user="bob")
+
+    assert sorted(path.name for path in directory.iterdir()) == ["swen_tools_alice.prom", "swen_tools_bob.prom"]
+    assert 'ecu="HPA"' in (directory / "swen_tools_alice.prom").read_text()
+    assert 'ecu="HPA"' not in (directory / "swen_tools_bob.prom").read_text()
+
+
+def test_export_is_skipped_without_a_directory(tmp_path, logger, monkeypatch):
+    monkeypatch.delenv("SWEN_TOOLS_TEXTFILE_DIR")
+    monkeypatch.setattr("utils.metrics.DEFAULT_TEXTFILE_DIR", str(tmp_path / "missing"))
+    store = MetricsStore(str(tmp_path / "metrics.json"))
+
+    export_run(make_run("HPA"), logger, store)
+
+    assert store.render() == "\n"
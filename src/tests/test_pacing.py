@@ -0,0 +1,93 @@
+import json
+
+import serial
+
+from simulators.hpa import HpaSimulator
+from utils.minicom import EchoPacedSerialCommand, SerialCommandExecutor
+from utils.pacing import ECHO_WAIT_FACTOR, FALLBACK_DELAY, MAX_MISSES, MIN_ECHO_WAIT, PacingProfile, PacingStore
+
+
+def test_new_profile_uses_the_fallback_delay():
+    assert PacingProfile().echo_wait == FALLBACK_DELAY
+
+
+def test_echo_wait_follows_the_learned_latency():
+    profile = PacingProfile()
+
+    profile.record_echo(0.01)
+    assert profile.echo_wait == 0.01 * ECHO_WAIT_FACTOR
+
+    for _ in range(50):
+        profile.record_echo(0.02)
+    assert abs(profile.echo_wait - 0.02 * ECHO_WAIT_FACTOR) < 0.001
+    assert profile.samples == 51
+
+
+def test_echo_wait_is_clamped():
+    assert PacingProfile(echo_latency=0.0).echo_wait == MIN_ECHO_WAIT
+    assert PacingProfile(echo_latency=1.0).echo_wait == FALLBACK_DELAY
+
+
+def test_missing_echoes_fall_back_and_an_echo_recovers():
+    profile = PacingProfile(echo_latency=0.01)
+
+    for _ in range(MAX_MISSES - 1):
+        profile.record_miss()
+    assert profile.echoes
+
+    profile.record_miss()
+    assert not profile.echoes
+    assert profile.echo_wait == FALLBACK_DELAY
+
+    profile.record_echo(0.01)
+    assert profile.echoes
+    assert profile.echo_wait < FALLBACK_DELAY
+
+
+def test_store_persists_profiles(tmp_path):
+    path = str(tmp_path / "pacing.json")
+    store = PacingStore(path)
+    store.get("/dev/ttyUSB0").record_echo(0.005)
+    store.save()
+
+    profile = PacingStore(path).get("/dev/ttyUSB0")
+
+    assert profile.echo_latency == 0.005
+    assert profile.samples == 1
+
+
+def test_store_ignores_a_corrupt_file(tmp_path):
+    path = tmp_path / "pacing.json"
+    path.write_text("{not json")
+
+    assert PacingStore(str(path)).get("/dev/ttyUSB0").echo_wait == FALLBACK_DELAY
+
+
+def test_typing_learns_the_echo_latency(bench, logger, tmp_path):
+    simulator_bench = bench(HpaSimulator(bytes_per_second=None))
+    path = str(tmp_path / "pacing.json")
+    executor = SerialCommandExecutor(EchoPacedSerialCommand(PacingStore(path)))
+    port = f"{simulator_bench.prefix}0"
+
+    with serial.Serial(port, timeout=1) as ser:
+        assert executor.execute(ser, b"tegrareset x1", b"Command Executed", 5, logger)[0]
+
+    saved = json.loads((tmp_path / "pacing.json").read_text())[port]
+    assert saved["echoes"]
+    assert saved["samples"] == len(b"tegrareset x1")
+    assert PacingProfile(**saved).echo_wait < FALLBACK_DELAY
+
+
+def test_typing_without_echo_falls_back(bench, logger, tmp_path):
+    hpa = HpaSimulator(bytes_per_second=None, echo=False)
+    simulator_bench = bench(hpa)
+    store = PacingStore(str(tmp_path / "pacing.json"))
+    executor = SerialCommandExecutor(EchoPacedSerialCommand(store))
+    port = f"{simulator_bench.prefix}0"
+
+    with serial.Serial(port, timeout=1) as ser:
+        assert executor.execute(ser, b"tegrareset x1", b"Command Executed", 5, logger)[0]
+
+    assert not store.get(port).echoes
+    assert store.get(port).echo_wait == FALLBACK_DELAY
+    assert hpa.resets == 1
@@ -0,0 +1,119 @@
+import pytest
+
+from utils.progress import (
+    MAX_ESTIMATED_PERCENT,
+    MAX_RUNNING_PERCENT,
+    DurationHistory,
+    PercentParser,
+    ProgressTracker,
+    StepParser,
+    dhu_docker_parser,
+    swupdate_parser,
+    tegra_flash_parser,
+)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("Writing image 42%", 42.0),
+    ("progress: 12.5 %", 12.5),
+    ("overflow 250%", 100.0),
+    ("no percentage here", None),
+])
+def test_percent_parser(line, expected):
+    assert PercentParser().parse(line) == expected
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("[3/4] Flashing boot partition", 75.0),
+    ("(1 / 2) copying", 50.0),
+    ("step 2 of 8", 25.0),
+    ("built 2024/05/01 in /opt/1/2", None),
+    ("[5/4] bogus", None),
+])
+def test_step_parser(line, expected):
+    assert StepParser().parse(line) == expected
+
+
+def test_tegra_flash_stages():
+    parser = tegra_flash_parser()
+
+    assert parser.parse("[   0.0123 ] Generating RCM messages") == 5
+    assert parser.parse("[  12.3456 ] Writing partition kernel with kernel.img") == 85
+    assert parser.parse("*** The target t186ref has been flashed successfully. ***") == 100
+    assert parser.parse("[   1.0000 ] tegrarcm_v2 --listrcm") is None
+
+
+def test_swupdate_parser_prefers_percentages():
+    parser = swupdate_parser()
+
+    assert parser.parse("## Executing script at 80000000") == 1
+    assert parser.parse("swupdate: [Update] progress 37 %") == 37
+    assert parser.parse("SWUPDATE successful !") == 100
+
+
+def test_dhu_docker_parser():
+    parser = dhu_docker_parser()
+
+    assert parser.parse("Flashing 60%") == 60
+    assert parser.parse("[2/8] system") == 25
+
+
+def test_tracker_keeps_the_highest_parsed_progress(tmp_path):
+    tracker = ProgressTracker("DHUH", dhu_docker_parser(), 100, DurationHistory(str(tmp_path / "durations.json")))
+
+    tracker.feed("[3/4] vendor")
+    tracker.feed("[1/4] retrying a chunk")
+
+    assert tracker.parsed_percent == 75
+
+
+def test_tracker_caps_parsed_progress_until_the_tool_exits(tmp_path):
+    tracker = ProgressTracker("DHUH", dhu_docker_parser(), 100, DurationHistory(str(tmp_path / "durations.json")))
+
+    tracker.feed("100%")
+
+    assert tracker.percent() == MAX_RUNNING_PERCENT
+
+
+def test_tracker_splits_console_bytes_into_lines(tmp_path):
+    tracker = ProgressTracker("SGA", swupdate_parser(), 100, DurationHistory(str(tmp_path / "durations.json")))
+
+    tracker.feed_bytes(b"swupdate progre")
+    assert tracker.parsed_percent is None
+    tracker.feed_bytes(b"ss 40 %\r\nSoftware Upd")
+
+    assert tracker.parsed_percent == 40
+
+
+def test_tracker_estimates_from_history_without_parsed_output(tmp_path):
+    history = DurationHistory(str(tmp_path / "durations.json"))
+    for duration in (10, 30, 20):
+        history.record("HPA", duration)
+    tracker = ProgressTracker("HPA", tegra_flash_parser(), 600, history)
+    tracker.start_time -= 10
+
+    assert tracker.expected_duration == 20
+    assert 49 < tracker.percent() < 51
+    assert 9 < tracker.eta() < 11
+
+    tracker.start_time -= 100
+    assert tracker.percent() == MAX_ESTIMATED_PERCENT
+    assert tracker.eta() is None
+
+
+def test_tracker_eta_extrapolates_parsed_progress(tmp_path):
+    tracker = ProgressTracker("DHUM", dhu_docker_parser(), 600, DurationHistory(str(tmp_path / "durations.json")))
+    tracker.start_time -= 30
+    tracker.feed("25%")
+
+    assert 89 < tracker.eta() < 91
+
+
+def test_only_successful_runs_are_recorded(tmp_path):
+    history = DurationHistory(str(tmp_path / "durations.json"))
+
+    ProgressTracker("SGA", swupdate_parser(), 100, history).finish(success=False)
+    assert history.median("SGA") is None
+
+    ProgressTracker("SGA", swupdate_parser(), 100, history).finish()
+    assert history.median("SGA") is not None
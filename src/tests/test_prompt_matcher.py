@@ -0,0 +1,58 @@
+import re
+
+from utils.prompt_matcher import PromptMatcher
+
+
+def feed_all(matcher: PromptMatcher, *chunks: bytes):
+    return [matcher.feed(chunk) for chunk in chunks]
+
+
+def test_literal_split_across_chunks():
+    matcher = PromptMatcher(b"GoForHIA>")
+
+    assert feed_all(matcher, b"boot done\r\nGoFo", b"rHI", b"A>") == [None, None, b"GoForHIA>"]
+    assert matcher.buffer[:matcher.match_end].endswith(b"GoForHIA>")
+
+
+def test_literal_one_byte_at_a_time():
+    matcher = PromptMatcher(b"login:")
+
+    results = feed_all(matcher, *[bytes([byte]) for byte in b"sga login:"])
+
+    assert results[-1] == b"login:"
+    assert all(result is None for result in results[:-1])
+
+
+def test_overlapping_prefix_is_not_lost():
+    # The first "aa" is a false start, the match starts one byte later
+    matcher = PromptMatcher(b"aab")
+
+    assert feed_all(matcher, b"xa", b"a", b"ab") == [None, None, b"aab"]
+
+
+def test_regex_split_across_chunks():
+    pattern = re.compile(rb"Updating (\d+)%")
+    matcher = PromptMatcher([pattern])
+
+    assert feed_all(matcher, b"Updat", b"ing 4", b"2%") == [None, None, pattern]
+
+
+def test_first_pattern_wins():
+    matcher = PromptMatcher([b"=>", b"login:"])
+
+    assert matcher.feed(b"sga login: \r\n=> ") == b"=>"
+
+
+def test_buffer_is_bounded_and_still_matches():
+    matcher = PromptMatcher(b"GoForHIA>", max_buffer=32)
+
+    matcher.feed(b"x" * 1000)
+    assert len(matcher.buffer) == 32
+    assert matcher.feed(b"GoFor") is None
+    assert matcher.feed(b"HIA>") == b"GoForHIA>"
+    assert matcher.total_bytes == 1009
+    assert matcher.buffer[:matcher.match_end].endswith(b"GoForHIA>")
+
+
+def test_describe():
+    assert PromptMatcher([b"=>", re.compile(rb"login:\s*$")]).describe() == "=> | /login:\\s*$/"
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from utils.scheduler import FlashTask, run_flash_dag
+
+
+def fail():
+    raise RuntimeError("bootburn did not complete")
+
+
+def test_dependents_of_a_failed_task_are_skipped(logger):
+    ran = []
+    tasks = [
+        FlashTask("SGA", fail),
+        FlashTask("DHUM", lambda: ran.append("DHUM"), ["SGA"]),
+        FlashTask("AFTER-DHUM", lambda: ran.append("AFTER-DHUM"), ["DHUM"]),
+        FlashTask("HPA", lambda: ran.append("HPA")),
+    ]
+
+    results = run_flash_dag(tasks, logger)
+
+    assert [result.status for result in results.values()] == ["failed", "skipped", "skipped", "ok"]
+    assert results["SGA"].error == "bootburn did not complete"
+    assert results["DHUM"].error == "dependency failed: SGA"
+    assert results["AFTER-DHUM"].error == "dependency failed: DHUM"
+    assert ran == ["HPA"]
+
+
+def test_independent_tasks_run_concurrently(logger):
+    # Both tasks only finish once the other one has started
+    barrier = threading.Barrier(2, timeout=5)
+    tasks = [FlashTask("DHUH", barrier.wait), FlashTask("HPA", barrier.wait)]
+
+    results = run_flash_dag(tasks, logger)
+
+    assert all(result.ok for result in results.values())
+
+
+def test_dependency_starts_after_its_dependency(logger):
+    order = []
+    tasks = [
+        FlashTask("DHUM", lambda: order.append("DHUM"), ["SGA"]),
+        FlashTask("SGA", lambda: order.append("SGA")),
+    ]
+
+    results = run_flash_dag(tasks, logger)
+
+    assert order == ["SGA", "DHUM"]
+    assert list(results) == ["DHUM", "SGA"]
+
+
+def test_cycle_is_rejected_before_anything_runs(logger):
+    ran = []
+    tasks = [
+        FlashTask("A", lambda: ran.append("A"), ["C"]),
+        FlashTask("B", lambda: ran.append("B"), ["A"]),
+        FlashTask("C", lambda: ran.append("C"), ["B"]),
+        FlashTask("D", lambda: ran.append("D")),
+    ]
+
+    with pytest.raises(ValueError, match="cycle"):
+        run_flash_dag(tasks, logger)
+    assert ran == []
+
+
+@pytest.mark.parametrize("tasks, message", [
+    ([FlashTask("DHUM", lambda: None, ["SGA"])], "unknown task 'SGA'"),
+    ([FlashTask("HPA", lambda: None), FlashTask("HPA", lambda: None)], "unique"),
+])
+def test_invalid_graphs(logger, tasks, message):
+    with pytest.raises(ValueError, match=message):
+        run_flash_dag(tasks, logger)
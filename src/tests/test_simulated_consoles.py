@@ -0,0 +1,100 @@
+"""The handlers' console procedures against simulators/, no hardware needed."""
+import os
+
+import pytest
+import serial
+
+from handlers import sga_handler
+from simulators.hpa import HpaSimulator
+from simulators.sga import SgaSimulator
+from utils.minicom import BasicSerialCommand, EchoPacedSerialCommand, SerialCommandExecutor, search_correct_ttyUSB_port
+from utils.pacing import PacingStore
+from utils.port_cache import PortCache, find_ttyUSB_port
+
+# Short SGA boot times keep a full reboot and flash under a few seconds
+FAST_SGA = {"bytes_per_second": None, "reboot_time": 0.1, "autoboot_window": 2.0, "boot_time": 0.2, "flash_time": 0.5}
+
+
+def test_console_requires_on_line():
+    from simulators.console import PtyConsole
+
+    with pytest.raises(TypeError):
+        PtyConsole()
+
+
+def test_find_port_scans_then_uses_cache(bench, logger):
+    hpa = HpaSimulator(bytes_per_second=None)
+    simulator_bench = bench(None, SgaSimulator(bytes_per_second=None), hpa)
+
+    port = find_ttyUSB_port("HPA", 4, "GoForHIA>", 0.5, logger)
+
+    assert port == f"{simulator_bench.prefix}2"
+    assert PortCache().lookup("HPA")["port"] == port
+    assert find_ttyUSB_port("HPA", 4, "GoForHIA>", 0.5, logger) == port
+
+
+def test_search_returns_the_lowest_matching_port(bench, logger):
+    # ttyUSB1 answers first, ttyUSB0 still wins like in a port-by-port search
+    simulator_bench = bench(HpaSimulator(bytes_per_second=100), HpaSimulator(bytes_per_second=None))
+
+    assert search_correct_ttyUSB_port(3, "GoForHIA>", 1, logger) == f"{simulator_bench.prefix}0"
+
+
+def test_hpa_recovery_commands(bench, logger, tmp_path):
+    hpa = HpaSimulator()
+    simulator_bench = bench(hpa)
+    executor = SerialCommandExecutor(EchoPacedSerialCommand(PacingStore(str(tmp_path / "pacing.json"))))
+
+    with serial.Serial(f"{simulator_bench.prefix}0", timeout=1) as ser:
+        assert executor.execute(ser, b"tegrarecovery x1 on", b"Command Executed", 5, logger)[0]
+        assert executor.execute(ser, b"tegrareset x1", b"Command Executed", 5, logger)[0]
+
+    assert hpa.recovery == {"x1": True}
+    assert hpa.resets == 1
+
+
+def test_flash_hpa(bench, logger, tmp_path, monkeypatch):
+    hpa_handler = pytest.importorskip("handlers.hpa_handler", reason="needs the swut package")
+    hpa = HpaSimulator(bytes_per_second=None)
+    bench(hpa)
+    monkeypatch.setenv("FAKE_FLASH_TIME", "0.5")
+    # run_flash_script runs the script through sudo -S, which reads and ignores the password
+    flash_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulators", "fake_flash.sh")
+
+    total_time = hpa_handler.flash_hpa(logger, flash_filepath=flash_script, sudo_password="")
+
+    assert total_time is not None
+    assert hpa.recovery == {"x1": False}
+    assert hpa.resets == 2
+
+
+# The Ctrl+D probe logs a shell out, so the handler logs in again either way
+@pytest.mark.parametrize("state, expected", [("login", "login_required"), ("shell", "login_required"), ("uboot", "uboot")])
+def test_sga_pre_state(bench, logger, state, expected):
+    simulator_bench = bench(SgaSimulator(state=state, bytes_per_second=None))
+    executor = SerialCommandExecutor(BasicSerialCommand())
+
+    with serial.Serial(f"{simulator_bench.prefix}0", timeout=1) as ser:
+        assert sga_handler.check_sga_pre_state(ser, executor, logger) == expected
+
+
+def test_flash_sga_from_login(bench, logger, monkeypatch):
+    sga = SgaSimulator(**FAST_SGA)
+    simulator_bench = bench(sga)
+    # Never touch the firewall of the machine running the tests
+    monkeypatch.setattr(sga_handler, "unblock_firewall_for_file_transerffering", lambda password, logger: None)
+
+    total_time = sga_handler.flash_sga(logger, port=f"{simulator_bench.prefix}0")
+
+    assert total_time is not None
+    assert sga.flash_count == 1
+    assert sga.state == "login"
+
+
+def test_flash_sga_resets_out_of_uboot(bench, logger, monkeypatch):
+    sga = SgaSimulator(state="uboot", **FAST_SGA)
+    bench(sga)
+    monkeypatch.setattr(sga_handler, "unblock_firewall_for_file_transerffering", lambda password, logger: None)
+
+    assert sga_handler.flash_sga(logger) is not None
+    assert sga.flash_count == 1
@@ -0,0 +1,88 @@
+import json
+import threading
+
+import pytest
+
+from utils import tracing
+from utils.tracing import Tracer, traced
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """A fresh enabled global tracer, so spans of other tests do not leak in."""
+    fresh = Tracer()
+    fresh.enable()
+    monkeypatch.setattr(tracing, "tracer", fresh)
+    return fresh
+
+
+def test_disabled_tracer_records_nothing():
+    disabled = Tracer()
+
+    with disabled.span("flash"):
+        pass
+    disabled.instant("mark")
+
+    assert disabled.events == []
+
+
+def test_span_is_a_complete_event(tracer):
+    with tracer.span("serial.execute", "serial", command=b"reset", port="/dev/ttyUSB0"):
+        pass
+
+    [event] = tracer.events
+    assert event["name"] == "serial.execute"
+    assert event["cat"] == "serial"
+    assert event["ph"] == "X"
+    assert event["dur"] >= 0
+    assert event["args"] == {"command": "b'reset'", "port": "/dev/ttyUSB0"}
+    assert event["tid"] == threading.get_ident()
+
+
+def test_span_is_recorded_when_the_block_raises(tracer):
+    with pytest.raises(RuntimeError):
+        with tracer.span("flash"):
+            raise RuntimeError()
+
+    assert [event["name"] for event in tracer.events] == ["flash"]
+
+
+def test_nested_spans_lie_within_their_parent(tracer):
+    with tracer.span("outer"):
+        with tracer.span("inner"):
+            pass
+
+    inner, outer = tracer.events
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_traced_uses_the_global_tracer(tracer):
+    @traced("probe", "serial")
+    def probe():
+        return 42
+
+    assert probe() == 42
+    assert [(event["name"], event["cat"]) for event in tracer.events] == [("probe", "serial")]
+
+
+def test_write_names_threads(tracer, tmp_path):
+    def worker():
+        tracer.instant("port found", port="/dev/ttyUSB2")
+
+    thread = threading.Thread(target=worker, name="probe-2")
+    thread.start()
+    thread.join()
+    with tracer.span("main"):
+        pass
+    path = tmp_path / "trace.json"
+
+    tracer.write(str(path))
+
+    trace = json.loads(path.read_text())
+    assert trace["displayTimeUnit"] == "ms"
+    metadata = [event for event in trace["traceEvents"] if event["ph"] == "M"]
+    assert {event["args"]["name"] for event in metadata} == {"probe-2", threading.current_thread().name}
+    instant = next(event for event in trace["traceEvents"] if event["ph"] == "i")
+    assert instant["args"] == {"port": "/dev/ttyUSB2"}
+    assert instant["tid"] != threading.get_ident()
@@ -0,0 +1,66 @@
+from utils.virtual_machine import VMInfo
+
+SHOWVMINFO = '''name="windows10"
+groups="/"
+ostype="Windows 10 (64-bit)"
+UUID="5b0d7a9e-1f3c-4c1e-9a52-0d0c2f7c1e11"
+VMState="running"
+VMStateChangeTime="2024-05-01T08:15:02.000000000"
+nic1="hostonly"
+hostonlyadapter1="vboxnet0"
+macaddress1="080027A1B2C3"
+cableconnected1="on"
+nic2="nat"
+macaddress2="080027D4E5F6"
+cableconnected2="off"
+nic3="none"
+nic4="none"
+USBFilterActive1="on"
+USBFilterName1="Miniwiggler"
+USBFilterVendorId1="058B"
+USBFilterProductId1="0043"
+USBFilterActive2="off"
+USBFilterName2="Spare"
+"GuestAdditionsVersion"="6.1.50 r161033"
+description="HIL flash VM
+second line without a separator"
+'''
+
+
+def test_state_and_quoted_keys():
+    info = VMInfo.parse(SHOWVMINFO)
+
+    assert info.state == "running"
+    assert info.values["GuestAdditionsVersion"] == "6.1.50 r161033"
+    assert info.values["ostype"] == "Windows 10 (64-bit)"
+
+
+def test_usb_filters_are_indexed_from_zero():
+    info = VMInfo.parse(SHOWVMINFO)
+
+    miniwiggler = info.usb_filter("Miniwiggler")
+    assert (miniwiggler.index, miniwiggler.vendor_id, miniwiggler.product_id, miniwiggler.active) == (0, "058B", "0043", True)
+    spare = info.usb_filter("Spare")
+    assert (spare.index, spare.vendor_id, spare.active) == (1, None, False)
+    assert info.usb_filter("missing") is None
+
+
+def test_unused_nics_are_skipped():
+    info = VMInfo.parse(SHOWVMINFO)
+
+    assert info.nics == {
+        1: {"type": "hostonly", "mac": "080027A1B2C3", "cable_connected": True, "hostonly_adapter": "vboxnet0"},
+        2: {"type": "nat", "mac": "080027D4E5F6", "cable_connected": False, "hostonly_adapter": None},
+    }
+
+
+def test_powered_off_vm_without_filters():
+    info = VMInfo.parse('name="windows10"\nVMState="poweroff"\n')
+
+    assert info.state == "poweroff"
+    assert info.usb_filters == []
+    assert info.nics == {}
+
+
+def test_empty_output():
+    assert VMInfo.parse("").state is None
@@ -0,0 +1,141 @@
+"""WarmContainer against simulators/fake_docker.py, which runs the container's processes on the host."""
+import os
+import subprocess
+import time
+
+import pytest
+
+from utils.warm_container import WarmContainer
+
+FAKE_DOCKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulators", "fake_docker.py")
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    monkeypatch.setenv("SWEN_TOOLS_DOCKER", FAKE_DOCKER)
+    monkeypatch.setenv("FAKE_DOCKER_STATE", str(tmp_path / "docker"))
+    monkeypatch.setenv("FAKE_DOCKER_STARTUP", "0")
+    monkeypatch.setenv("FAKE_DOCKER_ENTRYPOINT", '["echo"]')
+    monkeypatch.delenv("FAKE_DOCKER_HEALTH", raising=False)
+    (tmp_path / "usb").mkdir()
+    containers = []
+
+    def create(idle_timeout: int = 60):
+        container = WarmContainer(
+            "fake", "--privileged", name=f"test-{len(containers)}", idle_timeout=idle_timeout, mounts=[str(tmp_path)],
+            marker_dir=str(tmp_path / "markers"), device_dir=str(tmp_path / "usb"), poll_interval=0.1,
+        )
+        containers.append(container)
+        return container
+
+    yield create
+    for container in containers:
+        container.stop()
+
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return condition()
+
+
+def test_run_exec_and_stop(fake_docker, logger):
+    container = fake_docker()
+    container.ensure_running(logger)
+    assert container.state() == ("running", "healthy")
+
+    result = subprocess.run(container.exec_command("--multiuser hello", "one"), capture_output=True, text=True)
+
+    assert result.returncode == 0
+    assert result.stdout.strip() == "hello"
+    container.stop()
+    assert container.state() == (None, None)
+
+
+def test_health_checks_the_devices(fake_docker, logger, tmp_path):
+    container = fake_docker()
+    container.ensure_running(logger)
+
+    os.rmdir(tmp_path / "usb")
+
+    assert container.state() == ("running", "unhealthy")
+
+
+def test_health_checks_the_tool(fake_docker, logger, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_ENTRYPOINT", '["no-such-dhu-tool"]')
+    container = fake_docker()
+    container.ensure_running(logger)
+
+    assert container.state() == ("running", "unhealthy")
+
+
+def test_idle_container_expires(fake_docker, logger):
+    container = fake_docker(idle_timeout=1)
+    container.ensure_running(logger)
+
+    assert wait_for(lambda: container.state()[0] is None, 5)
+
+
+def test_running_exec_keeps_container_alive(fake_docker, logger, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_ENTRYPOINT", '["sleep"]')
+    container = fake_docker(idle_timeout=1)
+    container.ensure_running(logger)
+
+    assert subprocess.run(container.exec_command("3", "long")).returncode == 0
+
+    assert container.state()[0] == "running"
+
+
+def test_expiry_between_inspect_and_exec(fake_docker, logger):
+    container = fake_docker()
+    container.ensure_running(logger)
+    # The idle loop exits right after inspect reported the container as running
+    inspected = container.state()
+    container.stop()
+    container.state = lambda: inspected
+
+    container.ensure_running(logger)
+
+    del container.state
+    assert container.state()[0] == "running"
+    assert subprocess.run(container.exec_command("hello", "after"), capture_output=True).returncode == 0
+
+
+def test_reuse_renews_idle_lease(fake_docker, logger, tmp_path):
+    container = fake_docker(idle_timeout=60)
+    container.ensure_running(logger)
+    last_used = tmp_path / "markers" / "last-used"
+    assert wait_for(last_used.exists, 5)
+    os.utime(last_used, (time.time() - 3600, time.time() - 3600))
+
+    container.ensure_running(logger)
+
+    assert time.time() - last_used.stat().st_mtime < 60
+
+
+def test_kill_exec_stops_the_tool(fake_docker, logger, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_ENTRYPOINT", '["sleep"]')
+    container = fake_docker()
+    container.ensure_running(logger)
+    process = subprocess.Popen(container.exec_command("30", "flash"))
+    assert wait_for(lambda: os.path.exists(os.path.join(container.marker_dir, "busy.flash")), 5)
+
+    container.kill_exec("flash")
+
+    assert process.wait(timeout=5) != 0
+    assert not os.path.exists(os.path.join(container.marker_dir, "busy.flash"))
+
+
+def test_from_env_requires_run_args(monkeypatch):
+    from utils.warm_container import warm_container_from_env
+
+    monkeypatch.setenv("DOCKER_IMAGE", "dhu-flash:latest")
+    monkeypatch.delenv("SWEN_TOOLS_DHU_DOCKER_ARGS", raising=False)
+    assert warm_container_from_env() is None
+
+    monkeypatch.setenv("SWEN_TOOLS_DHU_DOCKER_ARGS", "--privileged -v /dev:/dev")
+    assert warm_container_from_env().run_args == ["--privileged", "-v", "/dev:/dev"]
+
@@ -0,0 +1,216 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from logging import Logger
+from typing import IO
+
+from utils.paths import atomic_write, cache_dir
+
+# Size cap of the store in GB, 0 disables the cache
+DEFAULT_MAX_SIZE_GB = 40
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def max_cache_bytes() -> int:
+    return int(float(os.getenv("SWEN_TOOLS_ARTIFACT_CACHE_SIZE", DEFAULT_MAX_SIZE_GB)) * 1024**3)
+
+
+class ArtifactCache:
+    """
+    Local content-addressed store for software archives.
+
+    Each archive is copied once, hashed while it is copied, and kept under its
+    sha256 with its original file name. The index remembers which source
+    (path, size, mtime) produced which hash, so a repeat flash of the same
+    drop is answered from the store without touching the source share.
+    Blobs beyond max_bytes are evicted least recently used first, except
+    blobs that are checked out: a flash holds a shared lock on the lease
+    file of its blob, and the lease file's mtime is the blob's last use.
+    """
+
+    def __init__(self, root: str | None = None, max_bytes: int | None = None):
+        self.root = root or cache_dir("artifacts")
+        self.max_bytes = max_cache_bytes() if max_bytes is None else max_bytes
+        self.index_path = os.path.join(self.root, "index.json")
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("sources", {})
+        index.setdefault("blobs", {})
+        return index
+
+    @contextmanager
+    def _index(self, save: bool = True):
+        """Load, modify and save the index while holding the lock."""
+        with self._lock, open(f"{self.index_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self._load()
+            yield index
+            if save:
+                atomic_write(self.index_path, json.dumps(index, indent=2))
+
+    def _blob_path(self, digest: str, name: str) -> str:
+        return os.path.join(self.root, digest[:2], digest, name)
+
+    def _lease_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.lease")
+
+    def _pin(self, digest: str) -> IO:
+        """
+        Take a shared lock on the lease of a blob and mark it as used now.
+        Called with the index locked, so eviction cannot remove the blob first.
+        """
+        lease = open(self._lease_path(digest), "a")
+        try:
+            fcntl.flock(lease, fcntl.LOCK_SH)
+            os.utime(lease.fileno())
+        except OSError:
+            lease.close()
+            raise
+        return lease
+
+    def _last_used(self, digest: str, blob: dict) -> float:
+        try:
+            return max(blob.get("last_used", 0), os.path.getmtime(self._lease_path(digest)))
+        except OSError:
+            return blob.get("last_used", 0)
+
+    @staticmethod
+    def _source_key(path: str) -> tuple[str, dict]:
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        return path, {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def lookup(self, path: str) -> tuple[str, IO] | None:
+        """
+        Cached copy of path if this exact file was imported before, without
+        reading it. Returns the copy and its lease, close the lease when done.
+        """
+        source, identity = self._source_key(path)
+        # Only reads the index, the last use is recorded on the lease file
+        with self._index(save=False) as index:
+            entry = index["sources"].get(source)
+            if entry is None or {key: entry[key] for key in identity} != identity:
+                return None
+            cached = self._blob_path(entry["digest"], entry["name"])
+            if entry["digest"] not in index["blobs"] or not os.path.isfile(cached):
+                return None
+            return cached, self._pin(entry["digest"])
+
+    def _copy_hashing(self, source: str, destination: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(source, "rb") as reader, open(destination, "wb") as writer:
+            while chunk := reader.read(CHUNK_SIZE):
+                sha256.update(chunk)
+                writer.write(chunk)
+        return sha256.hexdigest()
+
+    def import_file(self, path: str, logger: Logger) -> tuple[str, IO]:
+        """
+        Copy path into the store (one read of the source). Returns the cached
+        copy and its lease, close the lease when done.
+        """
+        source, identity = self._source_key(path)
+        name = os.path.basename(source)
+        tmp_path = os.path.join(self.root, f".import.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        logger.info(f"Importing {source} into the artifact cache...")
+        start_time = time.time()
+        try:
+            digest = self._copy_hashing(source, tmp_path)
+            cached = self._blob_path(digest, name)
+            blob_dir = os.path.dirname(cached)
+            os.makedirs(blob_dir, exist_ok=True)
+            existing = [entry for entry in os.listdir(blob_dir) if entry != name]
+            if existing and not os.path.exists(cached):
+                # Same content stored under another name, link it instead of keeping a second copy
+                os.link(os.path.join(blob_dir, existing[0]), cached)
+            else:
+                os.replace(tmp_path, cached)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"Imported {identity['size'] / 1024**2:.0f} MB in {time.time() - start_time:.1f} s ({digest[:12]})")
+
+        with self._index() as index:
+            index["sources"][source] = {**identity, "digest": digest, "name": name}
+            blob = index["blobs"].setdefault(digest, {"size": identity["size"], "names": []})
+            if name not in blob["names"]:
+                blob["names"].append(name)
+            blob["last_used"] = time.time()
+            lease = self._pin(digest)
+            self._evict(index, logger)
+        return cached, lease
+
+    def _evict(self, index: dict, logger: Logger):
+        """Remove least recently used blobs until the store fits, skipping leased ones."""
+        total = sum(blob["size"] for blob in index["blobs"].values())
+        by_last_use = sorted(index["blobs"].items(), key=lambda item: self._last_used(*item))
+        for digest, blob in by_last_use:
+            if total <= self.max_bytes:
+                break
+            lease_path = self._lease_path(digest)
+            with open(lease_path, "a") as lease:
+                try:
+                    fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.debug(f"Not evicting {digest[:12]}, a flash is using it")
+                    continue
+                shutil.rmtree(os.path.join(self.root, digest[:2], digest), ignore_errors=True)
+                os.remove(lease_path)
+            del index["blobs"][digest]
+            total -= blob["size"]
+            index["sources"] = {source: entry for source, entry in index["sources"].items() if entry["digest"] != digest}
+            logger.debug(f"Evicted {digest[:12]} from the artifact cache")
+
+    def get(self, path: str, logger: Logger) -> tuple[str, IO]:
+        """
+        Local copy of the archive at path, importing it on first use. The copy
+        is not evicted until the returned lease is closed.
+        """
+        found = self.lookup(path)
+        if found:
+            logger.info(f"Using cached {os.path.basename(path)} ({found[0]})")
+            return found
+        return self.import_file(path, logger)
+
+
+def cached_sha256(path: str) -> str | None:
+    """The sha256 of a path inside the store, known from its location without rehashing."""
+    digest = os.path.basename(os.path.dirname(path))
+    if re.fullmatch(r"[0-9a-f]{64}", digest) and os.path.dirname(os.path.dirname(os.path.dirname(path))) == cache_dir("artifacts"):
+        return digest
+    return None
+
+
+@contextmanager
+def cached_artifact(path: str, logger: Logger):
+    """
+    Local cached copy of a software archive, kept from eviction until the block exits.
+
+    Falls back to the original path when caching is disabled, the path is not
+    a regular file or the cache cannot be written (e.g. the disk is full).
+    """
+    if max_cache_bytes() <= 0 or not os.path.isfile(path):
+        yield path
+        return
+    try:
+        cached, lease = ArtifactCache().get(path, logger)
+    except OSError as e:
+        logger.warning(f"Artifact cache unavailable, using {path} directly: {e}")
+        yield path
+        return
+    with lease:
+        yield cached
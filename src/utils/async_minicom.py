@@ -0,0 +1,273 @@
+import asyncio
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from logging import Logger
+from typing import Callable
+
+import serial
+
+from utils.flash_history import record_serial_read
+from utils.pacing import PacingProfile, PacingStore
+from utils.prompt_matcher import Pattern, PromptMatcher
+from utils.serial_reader import ReaderStats
+from utils.tracing import span
+
+READ_CHUNK_SIZE = 4096
+
+
+class AsyncSerialPort:
+    """
+    Non-blocking access to an open serial port from an asyncio event loop.
+
+    The port's file descriptor is only registered with the loop while a read
+    or write is pending, so many ports can share one loop and bytes that
+    arrive between commands stay in the OS buffer, as with the blocking API.
+    """
+
+    def __init__(self, ser: serial.Serial, stats: ReaderStats | None = None):
+        self.ser = ser
+        # pyserial already opens the port with O_NONBLOCK
+        self.fd = ser.fileno()
+        self.stats = stats or ReaderStats()
+
+    async def read(self, timeout: float) -> bytes:
+        """Return the bytes that arrive within timeout seconds, b"" if none did."""
+        if timeout <= 0:
+            return b""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_readable():
+            if future.done():
+                return
+            try:
+                data = os.read(self.fd, READ_CHUNK_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                future.set_exception(serial.SerialException(f"Read failed on {self.ser.port}: {e}"))
+                return
+            if not data:
+                # Readable but nothing to read: the device went away, e.g. the USB adapter was unplugged
+                future.set_exception(serial.SerialException(f"{self.ser.port} disconnected"))
+                return
+            future.set_result(data)
+
+        loop.add_reader(self.fd, on_readable)
+        try:
+            data = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            data = b""
+        finally:
+            loop.remove_reader(self.fd)
+
+        self.stats.wakeups += 1
+        self.stats.bytes_read += len(data)
+        return data
+
+    async def write(self, data: bytes):
+        """Write all of data, waiting for the port to become writable when its buffer is full."""
+        loop = asyncio.get_running_loop()
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.fd, view)
+                view = view[written:]
+                continue
+            except BlockingIOError:
+                pass
+
+            writable = loop.create_future()
+            loop.add_writer(self.fd, lambda: writable.done() or writable.set_result(None))
+            try:
+                await writable
+            finally:
+                loop.remove_writer(self.fd)
+
+
+class AsyncSerialCommandStrategy(ABC):
+    """Abstract base class for serial command strategies driven by an event loop."""
+
+    def __init__(self):
+        self.last_stats: ReaderStats | None = None
+        # Called with every chunk read, see SerialCommandStrategy.listeners
+        self.listeners: list[Callable[[bytes], None]] = []
+
+    def _notify(self, data: bytes):
+        if data:
+            for listener in self.listeners:
+                listener(data)
+
+    @abstractmethod
+    async def execute(
+        self,
+        port: AsyncSerialPort,
+        command: bytes,
+        expected_response: Pattern | list[Pattern],
+        timeout: float,
+        logger: Logger,
+    ) -> tuple[bool, str]:
+        pass
+
+    async def _read_until(
+        self,
+        port: AsyncSerialPort,
+        expected_response: Pattern | list[Pattern],
+        timeout: float,
+        logger: Logger,
+        received: bytes = b"",
+    ) -> tuple[bool, str]:
+        """Wait until expected_response arrives, see SerialCommandStrategy._read_until."""
+        matcher = PromptMatcher(expected_response)
+        deadline = time.monotonic() + timeout
+        self.last_stats = port.stats
+
+        self._notify(received)
+        matched = received and matcher.feed(received) is not None
+        while not matched:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.debug(f"Timeout reached! Expected: {matcher.describe()}, Received: {matcher.text}")
+                logger.debug(f"Serial read stats: {port.stats}")
+                return False, matcher.text
+            data = await port.read(remaining)
+            self._notify(data)
+            matched = data and matcher.feed(data) is not None
+
+        port.stats.match_latency = port.stats.elapsed
+        logger.debug(f"Expected response received after command: {matcher.text}")
+        logger.debug(f"Serial read stats: {port.stats}")
+        return True, matcher.text
+
+
+class AsyncBasicSerialCommand(AsyncSerialCommandStrategy):
+    """Writes the whole command at once, like BasicSerialCommand."""
+
+    async def execute(self, port, command, expected_response, timeout, logger):
+        await port.write(command + b"\r")
+        logger.debug(f"Executed command over serial: '{command}'")
+        return await self._read_until(port, expected_response, timeout, logger)
+
+
+class AsyncCharacterByCharacterSerialCommand(AsyncSerialCommandStrategy):
+    """Types the command with a fixed delay per character, like CharacterByCharacterSerialCommand."""
+
+    def __init__(self, delay: float = 0.2):
+        super().__init__()
+        self.delay = delay
+
+    async def execute(self, port, command, expected_response, timeout, logger):
+        for c in command:
+            await port.write(bytes([c]))
+            await asyncio.sleep(self.delay)
+        await port.write(b"\r")
+        logger.debug(f"Executed command over serial: '{command}'")
+        return await self._read_until(port, expected_response, timeout, logger)
+
+
+class AsyncEchoPacedSerialCommand(AsyncSerialCommandStrategy):
+    """Types the command paced by its echo, like EchoPacedSerialCommand."""
+
+    def __init__(self, pacing_store: PacingStore | None = None):
+        super().__init__()
+        self.pacing_store = pacing_store or PacingStore()
+
+    async def _type(self, port: AsyncSerialPort, profile: PacingProfile, char: bytes) -> bytes:
+        received = b""
+        await port.write(char)
+        sent_at = time.monotonic()
+        deadline = sent_at + profile.echo_wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                profile.record_miss()
+                return received
+            received += await port.read(remaining)
+            if char in received:
+                profile.record_echo(time.monotonic() - sent_at)
+                return received
+
+    async def execute(self, port, command, expected_response, timeout, logger):
+        profile = self.pacing_store.get(port.ser.port or "")
+        received = b""
+        for c in command:
+            received += await self._type(port, profile, bytes([c]))
+        await port.write(b"\r")
+        self.pacing_store.save()
+        logger.debug(f"Executed command over serial: '{command}'")
+        return await self._read_until(port, expected_response, timeout, logger, received)
+
+
+class AsyncSerialCommandExecutor:
+    """Executes serial commands on one open port using an async strategy."""
+
+    def __init__(self, strategy: AsyncSerialCommandStrategy, ser: serial.Serial, logger: Logger):
+        self.strategy = strategy
+        self.ser = ser
+        self.logger = logger
+        self.port = AsyncSerialPort(ser)
+
+    async def execute(self, command: bytes, expected_response: Pattern | list[Pattern], timeout: float):
+        assert self.ser.is_open
+        self.port.stats = ReaderStats()
+        return await self.strategy.execute(self.port, command, expected_response, timeout, self.logger)
+
+
+class SerialEventLoop:
+    """An asyncio event loop on a background thread, shared by all consoles."""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="serial-event-loop", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def shared(cls) -> "SerialEventLoop":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def run(self, coroutine):
+        """Run a coroutine on the loop and block the calling thread until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class BlockingAsyncSerialCommandExecutor:
+    """
+    Drop-in replacement for SerialCommandExecutor backed by the shared event loop.
+
+    Handlers keep their blocking execute(ser, command, expected_response,
+    timeout, logger) calls, while the actual I/O of every console runs on a
+    single event loop thread.
+    """
+
+    def __init__(self, strategy: AsyncSerialCommandStrategy, event_loop: SerialEventLoop | None = None):
+        self.strategy = strategy
+        self.event_loop = event_loop or SerialEventLoop.shared()
+
+    def execute(
+        self,
+        ser: serial.Serial,
+        command: bytes,
+        expected_response: Pattern | list[Pattern],
+        timeout: float,
+        logger: Logger,
+    ):
+        executor = AsyncSerialCommandExecutor(self.strategy, ser, logger)
+        with span("serial.execute", "serial", command=command, port=ser.port):
+            response = self.event_loop.run(executor.execute(command, expected_response, timeout))
+        # Counted on the calling thread, where the run of this handler is active
+        record_serial_read(executor.port.stats.bytes_read, not response[0])
+        return response
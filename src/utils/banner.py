@@ -0,0 +1,57 @@
+import hashlib
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+
+from utils.paths import atomic_write, cache_dir
+
+_enabled = os.getenv("SWEN_TOOLS_NO_BANNER", "") in ("", "0")
+
+
+def set_enabled(enabled: bool):
+    """Turn banners and phase messages on or off, --no-banner turns them off."""
+    global _enabled
+    _enabled = enabled
+
+
+def _pipeline(text: str, boxed: bool) -> str:
+    # lolcat -f forces colour into the captured output, the animation (-d) cannot be cached
+    box = " | boxes -d unicornsay" if boxed else ""
+    return f"figlet -f slant {shlex.quote(text)}{box} | lolcat -f"
+
+
+def render(text: str, boxed: bool = False) -> str:
+    """
+    ASCII art for text, rendered by figlet/boxes/lolcat once and then served from the cache.
+
+    Falls back to the plain text when the tools are not installed.
+    """
+    command = _pipeline(text, boxed)
+    path = os.path.join(cache_dir("banners"), hashlib.sha1(command.encode()).hexdigest() + ".txt")
+    try:
+        with open(path, "r") as file:
+            return file.read()
+    except OSError:
+        pass
+
+    tools = ["figlet", "lolcat"] + (["boxes"] if boxed else [])
+    if not all(shutil.which(tool) for tool in tools):
+        return f"=== {text} ===\n"
+    result = subprocess.run(command, shell=True, capture_output=True, text=True)
+    if result.returncode != 0 or not result.stdout:
+        return f"=== {text} ===\n"
+    try:
+        atomic_write(path, result.stdout)
+    except OSError:
+        pass
+    return result.stdout
+
+
+def show(text: str, boxed: bool = False):
+    """Print a banner unless banners are disabled."""
+    if not _enabled:
+        return
+    sys.stdout.write(render(text, boxed))
+    sys.stdout.flush()
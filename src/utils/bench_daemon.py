@@ -0,0 +1,499 @@
+import itertools
+import json
+import os
+import pwd
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from logging import Logger
+from typing import Callable
+
+from utils.process_runner import ProcessRunner
+
+DEFAULT_SOCKET = "/tmp/swen-tools-bench.sock"
+DEFAULT_WORKERS = 4
+# Finished jobs kept for `queue` and late `follow` requests
+FINISHED_JOBS_KEPT = 50
+# Output lines kept per job for clients that attach late
+OUTPUT_LINES_KEPT = 2000
+# Engineers in the daemon user's group may connect, see BenchDaemon for who may submit
+SOCKET_MODE = 0o660
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+# Settings a job takes from the submitting client's environment (and .env), never from the daemon's.
+# Executables, docker options and the bench wiring (HPA_FLASH_FILEPATH, SWEN_TOOLS_DOCKER,
+# DOCKER_IMAGE, SWEN_TOOLS_DHU_DOCKER_ARGS, SWEN_TOOLS_TTY_PREFIX) always come from the daemon.
+CLIENT_ENV = (
+    "SUDO_PASSWORD",
+    "SWEN_TOOLS_BENCH",
+    "SWEN_TOOLS_HISTORY_DB",
+    "SWEN_TOOLS_TEXTFILE_DIR",
+    "SWEN_TOOLS_DHU_IDLE_TIMEOUT",
+    "SWEN_TOOLS_ARTIFACT_CACHE_SIZE",
+    "SWEN_TOOLS_NO_BANNER",
+)
+
+
+def socket_path() -> str:
+    """SWEN_TOOLS_DAEMON_SOCKET overrides the socket shared by everyone on the host."""
+    return os.getenv("SWEN_TOOLS_DAEMON_SOCKET", DEFAULT_SOCKET)
+
+
+def client_environment(environ=os.environ) -> dict[str, str]:
+    """The CLIENT_ENV settings of this process, sent along with a job."""
+    return {name: environ[name] for name in CLIENT_ENV if name in environ}
+
+
+def job_environment(client_env: dict[str, str], environ=os.environ) -> dict[str, str]:
+    """
+    Environment of a job: the daemon's, with every CLIENT_ENV setting
+    replaced by the client's. A setting the client did not have is removed,
+    so a job never flashes with the daemon user's password or bench.
+    Everything else, e.g. the flash script and docker, stays the daemon's.
+    """
+    env = {name: value for name, value in environ.items() if name not in CLIENT_ENV}
+    env.update({name: str(value) for name, value in client_env.items() if name in CLIENT_ENV})
+    # Unbuffered, so print() output reaches the clients as it happens
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+def peer_credentials(sock: socket.socket) -> tuple[int, int, int]:
+    """(pid, uid, gid) of the process at the other end of a Unix socket, as the kernel reports it."""
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)
+
+
+def user_name(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
+
+
+def job_resources(ecus: list[str], commit: bool = True) -> list[str]:
+    """
+    Bench resources a job needs exclusively.
+
+    Every ECU is one resource: its serial console, USB device or, for HIX,
+    the VirtualBox VM. Committing DHUM talks to the SGA, so it holds the SGA
+    as well.
+    """
+    resources = set(ecus)
+    if commit and "DHUM" in resources:
+        resources.add("SGA")
+    return sorted(resources)
+
+
+class Job:
+    """A queued or running CLI invocation and the output it produced so far."""
+
+    def __init__(
+        self,
+        job_id: int,
+        argv: list[str],
+        cwd: str,
+        uid: int,
+        priority: int,
+        resources: list[str],
+        env: dict[str, str] | None = None,
+    ):
+        self.id = job_id
+        self.argv = argv
+        self.cwd = cwd
+        self.uid = uid
+        self.user = user_name(uid)
+        # CLIENT_ENV settings of the submitter, not part of to_dict since it holds the sudo password
+        self.env = env or {}
+        self.priority = priority
+        self.resources = set(resources)
+        self.state = "queued"  # "running", "done", "failed" or "cancelled"
+        self.returncode: int | None = None
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.runner: ProcessRunner | None = None
+        self.lines: deque[str] = deque(maxlen=OUTPUT_LINES_KEPT)
+        self.line_count = 0
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def add_line(self, line: str):
+        with self.changed:
+            self.lines.append(line)
+            self.line_count += 1
+            self.changed.notify_all()
+
+    def set_state(self, state: str, returncode: int | None = None):
+        with self.changed:
+            self.state = state
+            self.returncode = returncode
+            if state == "running":
+                self.started_at = time.time()
+            elif self.finished:
+                self.finished_at = time.time()
+            self.changed.notify_all()
+
+    def follow(self, start: int = 0):
+        """Yield ("output", line) for every line from index start, then ("finished", None)."""
+        position = start
+        while True:
+            with self.changed:
+                while position >= self.line_count and not self.finished:
+                    self.changed.wait()
+                first = self.line_count - len(self.lines)
+                # Lines that fell out of the buffer are skipped
+                position = max(position, first)
+                lines = list(self.lines)[position - first:]
+                position = self.line_count
+                finished = self.finished
+            for line in lines:
+                yield "output", line
+            if finished:
+                yield "finished", None
+                return
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "argv": self.argv,
+            "user": self.user,
+            "priority": self.priority,
+            "resources": sorted(self.resources),
+            "state": self.state,
+            "returncode": self.returncode,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BenchDaemon:
+    """
+    Runs flash jobs for everyone on the host, one bench resource at a time.
+
+    Jobs wait in a priority queue (higher priority first, then submission
+    order) and a pool of workers starts each one as soon as all of its
+    resources are free. A waiting job reserves its resources, so jobs
+    behind it cannot take a console it is waiting for. Every job runs as
+    `main.py --local` in its own process group.
+
+    The submitter is the uid the kernel reports for the connection, never
+    what the client claims. A daemon running as root runs each job as its
+    submitter, any other daemon only accepts jobs from its own user.
+    Jobs may only be cancelled by their submitter or the daemon's user.
+
+    Args:
+        path (str): Unix socket the clients connect to.
+        logger (Logger): Receives job start and finish messages.
+        workers (int): Jobs running at the same time at most.
+        extra_args (list, optional): Global options added to every job, e.g. --warm-container.
+    """
+
+    def __init__(self, path: str, logger: Logger, workers: int = DEFAULT_WORKERS, extra_args: list[str] | None = None):
+        self.path = path
+        self.logger = logger
+        self.workers = workers
+        self.extra_args = extra_args or []
+        self.uid = os.geteuid()
+        self._ids = itertools.count(1)
+        self._jobs: dict[int, Job] = {}
+        self._busy: set[str] = set()
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._server: socketserver.ThreadingUnixStreamServer | None = None
+
+    def submit(
+        self, argv: list[str], cwd: str, uid: int, priority: int, resources: list[str], env: dict[str, str] | None = None
+    ) -> Job:
+        """Queue a job of uid, PermissionError when this daemon cannot run jobs as uid."""
+        if uid != self.uid and self.uid != 0:
+            raise PermissionError(
+                f"This bench daemon runs as {user_name(self.uid)} and only accepts their jobs, "
+                "ask them to run it as root or use --local"
+            )
+        with self._condition:
+            job = Job(next(self._ids), argv, cwd, uid, priority, resources, env)
+            self._jobs[job.id] = job
+            self._condition.notify_all()
+        self.logger.info(f"Job {job.id} queued for {job.user}: {' '.join(argv)}")
+        return job
+
+    def job(self, job_id: int) -> Job | None:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        with self._condition:
+            return list(self._jobs.values())
+
+    def position(self, job: Job) -> int:
+        """Jobs that start before job, if resources allow."""
+        with self._condition:
+            return self._waiting().index(job) if job.state == "queued" else 0
+
+    def cancel(self, job_id: int, uid: int | None = None) -> bool:
+        """Cancel a job on behalf of uid, None for the daemon itself."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            if uid is not None and uid not in (job.uid, self.uid):
+                raise PermissionError(f"Job {job_id} belongs to {job.user}")
+            if job.state == "queued":
+                job.set_state("cancelled")
+                self._condition.notify_all()
+                return True
+            runner = job.runner
+        self.logger.info(f"Cancelling job {job_id}")
+        job.set_state("cancelled")
+        if runner is not None:
+            runner.terminate()
+        return True
+
+    def _waiting(self) -> list[Job]:
+        waiting = [job for job in self._jobs.values() if job.state == "queued"]
+        return sorted(waiting, key=lambda job: (-job.priority, job.id))
+
+    def _next_job(self) -> Job | None:
+        """The first waiting job whose resources are neither busy nor reserved by a job before it."""
+        reserved = set(self._busy)
+        for job in self._waiting():
+            if not job.resources & reserved:
+                return job
+            reserved |= job.resources
+        return None
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:-FINISHED_JOBS_KEPT]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                job = None
+                while not self._stopping and (job := self._next_job()) is None:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                self._busy |= job.resources
+                job.set_state("running")
+            try:
+                self._run(job)
+            finally:
+                with self._condition:
+                    self._busy -= job.resources
+                    self._forget_finished()
+                    self._condition.notify_all()
+
+    def _run(self, job: Job):
+        self.logger.info(f"Job {job.id} started, holding {', '.join(sorted(job.resources)) or 'nothing'}")
+        command = [sys.executable, MAIN_PATH, "--local", *self.extra_args, *job.argv]
+        env = job_environment(job.env)
+        try:
+            runner = ProcessRunner(
+                command, on_stdout=job.add_line, on_stderr=job.add_line, cwd=job.cwd, env=env, start_new_session=True,
+                **self._identity(job, env),
+            )
+            with self._condition:
+                # Cancelled between being picked and starting
+                if job.state == "cancelled":
+                    return
+                job.runner = runner.start()
+            returncode = runner.wait().returncode
+        except OSError as e:
+            job.add_line(f"Job could not be started: {e}")
+            returncode = -1
+        if job.state != "cancelled":
+            job.set_state("done" if returncode == 0 else "failed", returncode)
+        self.logger.info(f"Job {job.id} {job.state} after {time.time() - job.started_at:.1f} s")
+
+    def _identity(self, job: Job, env: dict[str, str]) -> dict:
+        """Popen options running job as its submitter, with their groups (dialout, docker) and home."""
+        if job.uid == self.uid:
+            return {}
+        account = pwd.getpwuid(job.uid)
+        env.update({"HOME": account.pw_dir, "USER": account.pw_name, "LOGNAME": account.pw_name})
+        return {
+            "user": job.uid,
+            "group": account.pw_gid,
+            "extra_groups": os.getgrouplist(account.pw_name, account.pw_gid),
+        }
+
+    def _bind(self) -> socketserver.ThreadingUnixStreamServer:
+        if os.path.exists(self.path):
+            if daemon_available(self.path):
+                raise RuntimeError(f"A bench daemon is already listening on {self.path}")
+            os.unlink(self.path)
+        server = socketserver.ThreadingUnixStreamServer(self.path, _make_handler(self))
+        server.daemon_threads = True
+        os.chmod(self.path, SOCKET_MODE)
+        return server
+
+    def serve_forever(self):
+        """Serve until interrupted, then cancel running jobs."""
+        self._server = self._bind()
+        for index in range(self.workers):
+            threading.Thread(target=self._worker, name=f"bench-worker-{index}", daemon=True).start()
+        self.logger.info(f"Bench daemon listening on {self.path} with {self.workers} workers")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            running = [job for job in self._jobs.values() if not job.finished]
+        for job in running:
+            self.cancel(job.id)
+        if self._server is not None:
+            self._server.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def _make_handler(daemon: BenchDaemon):
+    class Handler(socketserver.StreamRequestHandler):
+        def send(self, message: dict):
+            self.wfile.write((json.dumps(message) + "\n").encode())
+            self.wfile.flush()
+
+        def stream(self, job: Job):
+            for event, line in job.follow():
+                if event == "output":
+                    self.send({"event": "output", "line": line})
+                else:
+                    self.send({"event": "finished", "state": job.state, "returncode": job.returncode})
+
+        def handle(self):
+            line = self.rfile.readline()
+            # daemon_available() connects and closes without a request
+            if not line.strip():
+                return
+            _, uid, _ = peer_credentials(self.request)
+            try:
+                request = json.loads(line)
+                op = request.get("op")
+                if op == "submit":
+                    job = daemon.submit(
+                        request["argv"], request["cwd"], uid,
+                        int(request.get("priority", 0)), request.get("resources", []), request.get("env"),
+                    )
+                    self.send({"event": "queued", "job": job.id, "position": daemon.position(job)})
+                    if request.get("follow"):
+                        self.stream(job)
+                elif op == "follow":
+                    job = daemon.job(int(request["job"]))
+                    if job is None:
+                        self.send({"error": f"No job {request['job']}"})
+                    else:
+                        self.stream(job)
+                elif op == "status":
+                    self.send({"jobs": [job.to_dict() for job in daemon.jobs()]})
+                elif op == "cancel":
+                    self.send({"ok": daemon.cancel(int(request["job"]), uid)})
+                else:
+                    self.send({"error": f"Unknown request {op!r}"})
+            except (BrokenPipeError, ConnectionResetError):
+                # The client went away, its job keeps running
+                pass
+            except PermissionError as e:
+                self.send({"error": str(e)})
+            except (ValueError, KeyError) as e:
+                self.send({"error": f"Bad request: {e}"})
+
+    return Handler
+
+
+def _connect(path: str) -> socket.socket:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(path)
+    return client
+
+
+def daemon_available(path: str | None = None) -> bool:
+    """Whether a bench daemon accepts connections on path."""
+    try:
+        _connect(path or socket_path()).close()
+    except OSError:
+        return False
+    return True
+
+
+def _messages(request: dict, path: str | None = None):
+    """Send one request and yield the daemon's replies."""
+    with _connect(path or socket_path()) as client:
+        client.sendall((json.dumps(request) + "\n").encode())
+        with client.makefile("r") as replies:
+            for line in replies:
+                yield json.loads(line)
+
+
+def request(message: dict, path: str | None = None) -> dict:
+    """Send a request that has a single reply."""
+    return next(_messages(message, path))
+
+
+def submit(
+    argv: list[str],
+    resources: list[str],
+    priority: int = 0,
+    write: Callable[[str], None] = print,
+    path: str | None = None,
+) -> int:
+    """
+    Queue argv with the daemon and print its output until it finishes.
+
+    The job runs with this process's CLIENT_ENV settings, e.g.
+    SUDO_PASSWORD from .env.
+    Ctrl-C cancels the job. Returns the exit code of the job, 1 when it
+    failed to start or was cancelled.
+    """
+    message = {
+        "op": "submit", "argv": argv, "cwd": os.getcwd(),
+        "priority": priority, "resources": resources, "env": client_environment(), "follow": True,
+    }
+    job_id = None
+    try:
+        for reply in _messages(message, path):
+            event = reply.get("event")
+            if event == "queued":
+                job_id = reply["job"]
+                waiting = f", {reply['position']} job(s) ahead" if reply["position"] else ""
+                write(f"Queued as job {job_id} on the bench daemon{waiting}")
+            elif event == "output":
+                write(reply["line"])
+            elif event == "finished":
+                write(f"Job {job_id} {reply['state']}")
+                return reply["returncode"] if reply["returncode"] is not None else 1
+            elif "error" in reply:
+                write(reply["error"])
+                return 1
+    except KeyboardInterrupt:
+        if job_id is not None:
+            request({"op": "cancel", "job": job_id}, path)
+            write(f"Job {job_id} cancelled")
+    return 1
+
+
+def format_jobs(jobs: list[dict]) -> str:
+    if not jobs:
+        return "No jobs"
+    lines = [f"{'ID':>4}  {'STATE':10} {'PRIO':>4}  {'USER':12} {'RESOURCES':16} COMMAND"]
+    for job in jobs:
+        lines.append(
+            f"{job['id']:>4}  {job['state']:10} {job['priority']:>4}  {job['user']:12} "
+            f"{','.join(job['resources']):16} {' '.join(job['argv'])}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+
+from exceptions.exceptions import ConfigError
+from utils.paths import atomic_write, cache_dir
+
+# Bump when SCHEMA or the compiled layout changes, older cache files are ignored
+SCHEMA_VERSION = 1
+# Short forms accepted for --type
+TYPE_ALIASES = {"p": "polestar", "v": "volvo"}
+DHU_NODES = ("dhuh", "dhum")
+
+# Nested dicts are required keys, {str: ...} is a mapping with any names, [str] a list of strings
+SCHEMA = {
+    "handlers": {
+        "dhu_handler": {
+            "script_filepath": str,
+            "arguments": {node: [str] for node in DHU_NODES},
+            "software": {
+                "type_designation": {
+                    str: {f"{node}_sw_filepath": str for node in DHU_NODES},
+                },
+            },
+        },
+        "hix_handler": {
+            "script_filepath": str,
+            "virtual_machine": {"vm_name": str, "ip_address": str},
+        },
+        "hpa_handler": {"script_filepath": str},
+        "sga_handler": {"script_filepath": str},
+    },
+}
+
+
+def _validate(value, schema, path: str) -> list[str]:
+    """Every mismatch between value and schema, as "dotted.path: problem"."""
+    where = path or "top level"
+    if isinstance(schema, list):
+        if not isinstance(value, list):
+            return [f"{where}: expected a list, got {type(value).__name__}"]
+        return [error for index, item in enumerate(value) for error in _validate(item, schema[0], f"{path}[{index}]")]
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            return [f"{where}: expected a mapping, got {type(value).__name__}"]
+        errors = []
+        if str in schema:
+            if not value:
+                errors.append(f"{where}: must not be empty")
+            for key, item in value.items():
+                errors.extend(_validate(item, schema[str], f"{path}.{key}" if path else str(key)))
+            return errors
+        for key, item_schema in schema.items():
+            key_path = f"{path}.{key}" if path else key
+            if key not in value:
+                errors.append(f"{key_path}: missing")
+            else:
+                errors.extend(_validate(value[key], item_schema, key_path))
+        return errors
+    if not isinstance(value, schema):
+        return [f"{where}: expected {schema.__name__}, got {type(value).__name__}"]
+    return []
+
+
+class Configuration:
+    """
+    swen_tools_config.yaml after validation, in the shape the handlers use.
+
+    Secrets and per-host paths come from the environment (HPA_FLASH_FILEPATH,
+    SUDO_PASSWORD, also read from .env) and are applied on every load, they
+    are never written to the cache.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.hpa_flash_filepath: str | None = data["hpa_flash_filepath"] or None
+        self.sudo_password: str | None = None
+
+    @classmethod
+    def compile(cls, raw: dict) -> "Configuration":
+        errors = _validate(raw, SCHEMA, "")
+        if errors:
+            raise ConfigError("Invalid configuration:\n  " + "\n  ".join(errors))
+        handlers = raw["handlers"]
+        dhu = handlers["dhu_handler"]
+        return cls({
+            "dhu_script_filepath": dhu["script_filepath"],
+            # run.sh arguments as the handlers expect them, each followed by a space
+            "dhu_arguments": {node: "".join(arg + " " for arg in dhu["arguments"][node]) for node in DHU_NODES},
+            "dhu_software": {
+                type_designation: {node: paths[f"{node}_sw_filepath"] for node in DHU_NODES}
+                for type_designation, paths in dhu["software"]["type_designation"].items()
+            },
+            "hix": {"script_filepath": handlers["hix_handler"]["script_filepath"], **handlers["hix_handler"]["virtual_machine"]},
+            "hpa_flash_filepath": handlers["hpa_handler"]["script_filepath"],
+        })
+
+    def apply_environment(self, environ=os.environ) -> "Configuration":
+        self.hpa_flash_filepath = environ.get("HPA_FLASH_FILEPATH") or self.hpa_flash_filepath
+        self.sudo_password = environ.get("SUDO_PASSWORD")
+        return self
+
+    @property
+    def dhu_script_filepath(self) -> str:
+        return self.data["dhu_script_filepath"]
+
+    @property
+    def type_designations(self) -> list[str]:
+        return list(self.data["dhu_software"])
+
+    def dhu_arguments(self, node: str) -> str:
+        """Configured run.sh arguments for a DHU node ("dhuh" or "dhum")."""
+        return self.data["dhu_arguments"][node]
+
+    def resolve_type(self, type_designation: str) -> str:
+        """Full type designation for a name or short form, ConfigError if it is not configured."""
+        name = TYPE_ALIASES.get(type_designation.lower(), type_designation.lower())
+        if name not in self.data["dhu_software"]:
+            raise ConfigError(
+                f"Unknown type designation '{type_designation}', configured: {', '.join(self.type_designations)}"
+            )
+        return name
+
+    def dhu_software_filepath(self, type_designation: str, node: str) -> str:
+        """Configured software archive for a DHU node."""
+        return self.data["dhu_software"][self.resolve_type(type_designation)][node]
+
+
+def _cache_path(config_path: str) -> str:
+    name = hashlib.sha1(os.path.realpath(config_path).encode()).hexdigest()
+    return os.path.join(cache_dir("config"), f"{name}.json")
+
+
+def _read_cache(cache_path: str, key: dict) -> dict | None:
+    try:
+        with open(cache_path, "r") as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return cached["data"] if cached.get("key") == key else None
+
+
+def load_configuration(config_path: str) -> Configuration:
+    """
+    Validated configuration, compiled once per change of the file.
+
+    The compiled result is cached keyed on the file's mtime and size, so
+    later runs skip yaml entirely. Raises ConfigError for a missing or
+    invalid file.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    try:
+        stat = os.stat(config_path)
+    except OSError as e:
+        raise ConfigError(f"Cannot read configuration {config_path}: {e}") from e
+    key = {"version": SCHEMA_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    cache_path = _cache_path(config_path)
+
+    data = _read_cache(cache_path, key)
+    if data is not None:
+        return Configuration(data).apply_environment()
+
+    import yaml
+
+    try:
+        with open(config_path, "r") as file:
+            raw = yaml.safe_load(file)
+    except (OSError, yaml.YAMLError) as e:
+        raise ConfigError(f"Cannot parse configuration {config_path}: {e}") from e
+    configuration = Configuration.compile(raw)
+    try:
+        atomic_write(cache_path, json.dumps({"key": key, "data": configuration.data}))
+    except OSError:
+        pass
+    return configuration.apply_environment()
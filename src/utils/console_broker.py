@@ -0,0 +1,468 @@
+import base64
+import fcntl
+import json
+import os
+import queue
+import select
+import socket
+import socketserver
+import struct
+import termios
+import threading
+import time
+from collections import deque
+from logging import Logger
+
+import serial
+
+DEFAULT_SOCKET = "/tmp/swen-tools-consoles.sock"
+# Bytes of console output kept per port
+BUFFER_SIZE = 1024 * 1024
+# Retry opening a missing or unplugged port this often, seconds
+REOPEN_INTERVAL = 2.0
+# Chunks queued for a client that does not keep up before it is dropped
+CLIENT_QUEUE_SIZE = 4096
+SOCKET_MODE = 0o660
+# Socket reads of reply lines
+READ_SIZE = 65536
+
+
+def socket_path() -> str:
+    """SWEN_TOOLS_CONSOLE_SOCKET overrides the broker socket shared on the host."""
+    return os.getenv("SWEN_TOOLS_CONSOLE_SOCKET", DEFAULT_SOCKET)
+
+
+def configured_ports() -> list[str]:
+    """
+    Consoles the broker holds, from SWEN_TOOLS_CONSOLE_PORTS (separated by
+    spaces or commas). Only real consoles belong there: a held port is
+    busy for everything that opens it directly, e.g. the DHU UDS tty.
+    """
+    return os.getenv("SWEN_TOOLS_CONSOLE_PORTS", "").replace(",", " ").split()
+
+
+class ConsoleBuffer:
+    """Timestamped ring buffer of the output of one console, bounded in bytes."""
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self.size = size
+        self.chunks: deque[tuple[float, bytes]] = deque()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def append(self, data: bytes):
+        with self._lock:
+            self.chunks.append((time.time(), data))
+            self.bytes += len(data)
+            while self.bytes > self.size:
+                _, dropped = self.chunks.popleft()
+                self.bytes -= len(dropped)
+
+    def since(self, start: float = 0.0, max_bytes: int | None = None) -> list[tuple[float, bytes]]:
+        """Chunks from start on, only the newest max_bytes of them when given."""
+        with self._lock:
+            chunks = [(timestamp, data) for timestamp, data in self.chunks if timestamp >= start]
+        if max_bytes is None:
+            return chunks
+        tail = []
+        for timestamp, data in reversed(chunks):
+            if max_bytes <= 0:
+                break
+            tail.append((timestamp, data[-max_bytes:]))
+            max_bytes -= len(data)
+        return tail[::-1]
+
+
+class _Client:
+    """An attached socket, fed from a queue so a slow reader never stalls the console."""
+
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.queue: queue.Queue[bytes | None] = queue.Queue(CLIENT_QUEUE_SIZE)
+        self.closed = threading.Event()
+
+    def send(self, data: bytes):
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.close()
+
+    def pump(self):
+        while not self.closed.is_set():
+            data = self.queue.get()
+            if data is None:
+                break
+            try:
+                self.connection.sendall(data)
+            except OSError:
+                break
+        self.close()
+
+    def close(self):
+        if not self.closed.is_set():
+            self.closed.set()
+            try:
+                self.queue.put_nowait(None)
+            except queue.Full:
+                pass
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class ConsolePort:
+    """
+    Keeps one serial console open and records everything it prints.
+
+    A reader thread appends each chunk to the ring buffer and forwards it to
+    the attached clients. When the port is missing or goes away (USB
+    replug) it is reopened every REOPEN_INTERVAL seconds.
+    """
+
+    def __init__(self, port: str, serial_config: dict, logger: Logger, buffer_size: int = BUFFER_SIZE):
+        self.port = port
+        self.serial_config = dict(serial_config, timeout=0.2)
+        self.logger = logger
+        self.buffer = ConsoleBuffer(buffer_size)
+        self.ser: serial.Serial | None = None
+        self._clients: list[_Client] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.ser is not None
+
+    def start(self) -> "ConsolePort":
+        self._thread = threading.Thread(target=self._loop, name=f"console-{os.path.basename(self.port)}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.ser = serial.Serial(self.port, **self.serial_config)
+            except serial.SerialException:
+                self._stop_event.wait(REOPEN_INTERVAL)
+                continue
+            self.logger.info(f"Capturing {self.port}")
+            try:
+                while not self._stop_event.is_set():
+                    data = self.ser.read(self.ser.in_waiting or 1)
+                    if data:
+                        self._publish(data)
+            except (serial.SerialException, OSError) as e:
+                self.logger.warning(f"Lost {self.port}: {e}")
+            finally:
+                ser, self.ser = self.ser, None
+                ser.close()
+
+    def _publish(self, data: bytes):
+        self.buffer.append(data)
+        with self._lock:
+            self._clients = [client for client in self._clients if not client.closed.is_set()]
+            clients = list(self._clients)
+        for client in clients:
+            client.send(data)
+
+    def write(self, data: bytes):
+        ser = self.ser
+        if ser is None:
+            raise serial.SerialException(f"{self.port} is not open")
+        with self._write_lock:
+            ser.write(data)
+            ser.flush()
+
+    def attach(self, connection: socket.socket, reply: bytes = b""):
+        """
+        Stream live output to connection and write what it sends to the console, until it closes.
+
+        reply is sent first. It is queued before the client is registered, so no
+        output printed after the client got it is missed.
+        """
+        client = _Client(connection)
+        if reply:
+            client.send(reply)
+        with self._lock:
+            self._clients.append(client)
+        threading.Thread(target=client.pump, name=f"console-client-{os.path.basename(self.port)}", daemon=True).start()
+        try:
+            while not client.closed.is_set():
+                data = connection.recv(4096)
+                if not data:
+                    break
+                self.write(data)
+        except (OSError, serial.SerialException):
+            pass
+        finally:
+            client.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+
+
+class ConsoleBroker:
+    """
+    Holds every bench console open and serves them over a Unix socket.
+
+    Each console is captured continuously into a ring buffer, whether or not
+    a client is attached. Clients attach to a console to read its live
+    output and send input, several at a time, or ask for its history.
+
+    Args:
+        ports (list): Console device paths.
+        serial_config (dict): pyserial settings used for every port.
+        logger (Logger): Receives port state changes.
+        path (str): Unix socket the clients connect to.
+    """
+
+    def __init__(self, ports: list[str], serial_config: dict, logger: Logger, path: str | None = None, buffer_size: int = BUFFER_SIZE):
+        self.path = path or socket_path()
+        self.logger = logger
+        self.consoles = {port: ConsolePort(port, serial_config, logger, buffer_size) for port in ports}
+        self._server: socketserver.ThreadingUnixStreamServer | None = None
+
+    def console(self, port: str | None) -> ConsolePort | None:
+        """The console for port, also when it is named through a symlink such as /dev/serial/by-path."""
+        if port is None:
+            return None
+        if port in self.consoles:
+            return self.consoles[port]
+        real_path = os.path.realpath(port)
+        for console in self.consoles.values():
+            if os.path.realpath(console.port) == real_path:
+                return console
+        return None
+
+    def handle(self, connection: socket.socket, request: dict):
+        op = request.get("op")
+        console = self.console(request.get("port"))
+        if op == "ports":
+            reply = {
+                "ports": [
+                    {"port": port, "open": item.is_open, "buffered": item.buffer.bytes}
+                    for port, item in self.consoles.items()
+                ]
+            }
+        elif console is None:
+            reply = {"ok": False, "error": f"Port {request.get('port')} is not held by the broker"}
+        elif op == "history":
+            start = time.time() - request["seconds"] if request.get("seconds") else 0.0
+            chunks = console.buffer.since(start, request.get("max_bytes"))
+            chunks = [[timestamp, base64.b64encode(data).decode()] for timestamp, data in chunks]
+            reply = {"ok": True, "chunks": chunks}
+        elif op == "attach":
+            if not console.is_open:
+                reply = {"ok": False, "error": f"{console.port} is not open"}
+            else:
+                console.attach(connection, b'{"ok": true}\n')
+                return
+        else:
+            reply = {"ok": False, "error": f"Unknown request {op!r}"}
+        connection.sendall((json.dumps(reply) + "\n").encode())
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            if broker_available(self.path):
+                raise RuntimeError(f"A console broker is already listening on {self.path}")
+            os.unlink(self.path)
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with self.request.makefile("rb") as stream:
+                    line = stream.readline()
+                if not line.strip():
+                    return
+                try:
+                    broker.handle(self.request, json.loads(line))
+                except (ValueError, KeyError) as e:
+                    self.request.sendall((json.dumps({"ok": False, "error": f"Bad request: {e}"}) + "\n").encode())
+                except OSError:
+                    pass
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+        os.chmod(self.path, SOCKET_MODE)
+        for console in self.consoles.values():
+            console.start()
+        self.logger.info(f"Console broker listening on {self.path} for {', '.join(self.consoles)}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for console in self.consoles.values():
+            console.stop()
+        if self._server is not None:
+            self._server.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def broker_available(path: str | None = None) -> bool:
+    """Whether a console broker accepts connections on path."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path or socket_path())
+    except OSError:
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+def _request(message: dict, path: str | None = None) -> tuple[socket.socket, dict]:
+    """Send one request, return the connection and the first reply line."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path or socket_path())
+        connection.sendall((json.dumps(message) + "\n").encode())
+        # Only take the reply line off the socket, console output after it stays
+        # there for the caller, which may read the descriptor directly
+        line = b""
+        while not line.endswith(b"\n"):
+            pending = connection.recv(READ_SIZE, socket.MSG_PEEK)
+            if not pending:
+                raise ConnectionError("Console broker closed the connection")
+            end = pending.find(b"\n")
+            line += connection.recv(end + 1 if end >= 0 else len(pending))
+    except OSError:
+        connection.close()
+        raise
+    return connection, json.loads(line)
+
+
+def history(
+    port: str, seconds: float | None = None, path: str | None = None, max_bytes: int | None = None
+) -> list[tuple[float, bytes]]:
+    """
+    Timestamped output of port from the last seconds (all buffered output
+    when None), only its newest max_bytes when given.
+    """
+    connection, reply = _request({"op": "history", "port": port, "seconds": seconds, "max_bytes": max_bytes}, path)
+    connection.close()
+    if not reply.get("ok"):
+        raise serial.SerialException(reply.get("error", "history failed"))
+    return [(timestamp, base64.b64decode(data)) for timestamp, data in reply["chunks"]]
+
+
+def ports(path: str | None = None) -> list[dict]:
+    connection, reply = _request({"op": "ports"}, path)
+    connection.close()
+    return reply["ports"]
+
+
+class BrokerConsole:
+    """
+    A console attached through the broker, usable where a serial.Serial is expected.
+
+    Supports what the serial layer uses: read, write, flush, in_waiting,
+    timeout, fileno (for selectors and the asyncio executor) and use as a
+    context manager. Reads see output from the moment of attaching, older
+    output is available from history().
+    """
+
+    def __init__(self, port: str, connection: socket.socket, timeout: float | None = None, path: str | None = None):
+        self.port = port
+        self.timeout = timeout
+        self._connection = connection
+        self._path = path
+
+    @property
+    def is_open(self) -> bool:
+        return self._connection is not None
+
+    def fileno(self) -> int:
+        return self._connection.fileno()
+
+    @property
+    def in_waiting(self) -> int:
+        buffer = fcntl.ioctl(self.fileno(), termios.FIONREAD, struct.pack("i", 0))
+        return struct.unpack("i", buffer)[0]
+
+    def read(self, size: int = 1) -> bytes:
+        """Up to size bytes, waiting at most timeout seconds like pyserial."""
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        data = b""
+        while len(data) < size:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._connection], [], [], remaining)
+            if not ready:
+                break
+            chunk = self._connection.recv(size - len(data))
+            if not chunk:
+                raise serial.SerialException(f"Console broker detached {self.port}")
+            data += chunk
+        return data
+
+    def write(self, data: bytes) -> int:
+        self._connection.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        while self.in_waiting:
+            self._connection.recv(self.in_waiting)
+
+    def history(self, seconds: float | None = None, max_bytes: int | None = None) -> bytes:
+        """Output the console printed before (and since) attaching."""
+        return b"".join(data for _, data in history(self.port, seconds, self._path, max_bytes))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(port: str, timeout: float | None = None, path: str | None = None) -> BrokerConsole | None:
+    """Attach to port through the broker, None when no broker holds it open."""
+    try:
+        connection, reply = _request({"op": "attach", "port": port}, path)
+    except (OSError, ValueError):
+        return None
+    if not reply.get("ok"):
+        connection.close()
+        return None
+    return BrokerConsole(port, connection, timeout, path)
+
+
+def open_console(port: str, **serial_config):
+    """
+    The console on port: attached through the broker when it holds the port,
+    otherwise opened directly with serial_config.
+    """
+    console = attach(port, serial_config.get("timeout"))
+    return console if console is not None else serial.Serial(port, **serial_config)
+
+
+def recent_output(ser, max_bytes: int = 4096, seconds: float | None = None) -> str:
+    """
+    The last max_bytes the console printed, only from the last seconds when
+    given. "" for ports without a broker.
+    """
+    if not isinstance(ser, BrokerConsole):
+        return ""
+    try:
+        return ser.history(seconds, max_bytes).decode("utf-8", errors="replace")
+    except (OSError, ValueError, serial.SerialException):
+        return ""
@@ -0,0 +1,272 @@
+import contextvars
+import os
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.paths import cache_dir
+from utils.tracing import span
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ecu TEXT NOT NULL,
+    software_path TEXT,
+    outcome TEXT NOT NULL,
+    host TEXT NOT NULL,
+    bench TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_ecu_started ON runs(ecu, started_at);
+CREATE INDEX IF NOT EXISTS phases_run ON phases(run_id);
+"""
+
+_current_run: contextvars.ContextVar["FlashRun | None"] = contextvars.ContextVar("current_flash_run", default=None)
+
+
+class FlashRun:
+    """A bootburn being recorded. Phases are timed with `phase`."""
+
+    def __init__(self, ecu: str, software_path: str | None = None):
+        self.ecu = ecu
+        self.software_path = software_path
+        self.outcome = "failed"
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.phases: list[tuple[str, float, float]] = []
+        self.failure: str | None = None
+        self.serial_bytes = 0
+        self.serial_timeouts = 0
+
+    def succeed(self):
+        self.outcome = "success"
+
+    def fail(self, error: BaseException | str):
+        """Remember why the run failed, the first failure recorded wins."""
+        if self.failure is not None:
+            return
+        if isinstance(error, (TimeoutError, subprocess.TimeoutExpired)):
+            self.failure = "timeout"
+        else:
+            self.failure = error if isinstance(error, str) else type(error).__name__
+
+    @property
+    def failure_class(self) -> str:
+        if self.failure:
+            return self.failure
+        # Handlers report most serial problems as a response that never arrived
+        return "timeout" if self.serial_timeouts else "unknown"
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start, time.time() - start))
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a phase of the run active in this context. Phases always show up as
+    trace spans, they are only stored when a run is being recorded.
+    """
+    run = _current_run.get()
+    with span(name, "phase"):
+        if run is None:
+            yield
+            return
+        with run.phase(name):
+            yield
+
+
+def record_failure(error: BaseException | str):
+    """Record the failure class of the run active in this context, if any."""
+    run = _current_run.get()
+    if run is not None:
+        run.fail(error)
+
+
+def record_serial_read(bytes_read: int, timed_out: bool):
+    """Count serial traffic of one command for the run active in this context."""
+    run = _current_run.get()
+    if run is not None:
+        run.serial_bytes += bytes_read
+        run.serial_timeouts += timed_out
+
+
+class FlashHistory:
+    """
+    Local SQLite store of every bootburn with its per-phase durations.
+
+    Aggregations run inside SQLite (window functions) so statistics over
+    thousands of runs never load the rows into Python.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.getenv("SWEN_TOOLS_HISTORY_DB") or os.path.join(cache_dir(), "history.sqlite")
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    def save(self, run: FlashRun):
+        with self._lock, self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (ecu, software_path, outcome, host, bench, started_at, duration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run.ecu,
+                    run.software_path,
+                    run.outcome,
+                    platform.node(),
+                    os.getenv("SWEN_TOOLS_BENCH") or platform.node(),
+                    run.started_at,
+                    run.duration,
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO phases (run_id, name, started_at, duration) VALUES (?, ?, ?, ?)",
+                [(cursor.lastrowid, name, started_at, duration) for name, started_at, duration in run.phases],
+            )
+
+    @contextmanager
+    def record(self, ecu: str, software_path: str | None = None):
+        """
+        Record a run. The outcome is "failed" unless run.succeed() was called,
+        or "interrupted" when the run was aborted with Ctrl+C.
+        """
+        run = FlashRun(ecu, software_path)
+        token = _current_run.set(run)
+        try:
+            yield run
+        except KeyboardInterrupt:
+            run.outcome = "interrupted"
+            raise
+        except BaseException as e:
+            run.fail(e)
+            raise
+        finally:
+            _current_run.reset(token)
+            run.duration = time.time() - run.started_at
+            try:
+                self.save(run)
+            except sqlite3.Error:
+                pass  # History is best effort, never fail a flash over it
+
+    def _percentile_query(self, source: str, group_column: str, where: str) -> str:
+        # Nearest-rank percentiles computed per group with window functions
+        return f"""
+            WITH ranked AS (
+                SELECT {group_column} AS grp, duration,
+                       ROW_NUMBER() OVER (PARTITION BY {group_column} ORDER BY duration) AS rank,
+                       COUNT(*) OVER (PARTITION BY {group_column}) AS total
+                FROM {source}
+                WHERE {where}
+            )
+            SELECT grp, MAX(total) AS runs,
+                   MIN(CASE WHEN rank >= 0.50 * total THEN duration END) AS p50,
+                   MIN(CASE WHEN rank >= 0.90 * total THEN duration END) AS p90,
+                   MIN(CASE WHEN rank >= 0.95 * total THEN duration END) AS p95,
+                   MAX(duration) AS max
+            FROM ranked GROUP BY grp ORDER BY grp
+        """
+
+    def run_percentiles(self, group_by: str = "ecu", ecu: str | None = None, since: float | None = None) -> list[tuple]:
+        """p50/p90/p95/max duration of successful runs per ecu, software_path, host or bench."""
+        if group_by not in ("ecu", "software_path", "host", "bench"):
+            raise ValueError(f"Cannot group by {group_by}")
+        where, params = self._filters("runs", ecu, since)
+        query = self._percentile_query("runs", group_by, where)
+        with self._connect() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def phase_percentiles(self, ecu: str | None = None, since: float | None = None) -> list[tuple]:
+        """p50/p90/p95/max duration per phase of successful runs."""
+        where, params = self._filters("runs", ecu, since)
+        source = "(SELECT phases.name AS name, phases.duration AS duration, runs.ecu AS ecu, runs.outcome AS outcome, runs.started_at AS started_at FROM phases JOIN runs ON runs.id = phases.run_id) AS runs"
+        query = self._percentile_query(source, "ecu || ' ' || name", where)
+        with self._connect() as connection:
+            return connection.execute(query, params).fetchall()
+
+    def outcomes(self, ecu: str | None = None, since: float | None = None) -> list[tuple]:
+        """Run count per ECU and outcome."""
+        where, params = self._filters("runs", ecu, since, successful_only=False)
+        with self._connect() as connection:
+            return connection.execute(
+                f"SELECT ecu, outcome, COUNT(*) FROM runs WHERE {where} GROUP BY ecu, outcome ORDER BY ecu, outcome", params
+            ).fetchall()
+
+    def weekly_trend(self, ecu: str | None = None, since: float | None = None) -> list[tuple]:
+        """Median duration of successful runs per ECU and week."""
+        where, params = self._filters("runs", ecu, since)
+        query = self._percentile_query(
+            "runs", "ecu || ' ' || strftime('%Y-W%W', started_at, 'unixepoch')", where
+        )
+        with self._connect() as connection:
+            return [(grp, runs, p50) for grp, runs, p50, *_ in connection.execute(query, params).fetchall()]
+
+    @staticmethod
+    def _filters(table: str, ecu: str | None, since: float | None, successful_only: bool = True) -> tuple[str, list]:
+        clauses, params = ["1 = 1"], []
+        if successful_only:
+            clauses.append(f"{table}.outcome = 'success'")
+        if ecu:
+            clauses.append(f"{table}.ecu = ?")
+            params.append(ecu.upper())
+        if since:
+            clauses.append(f"{table}.started_at >= ?")
+            params.append(since)
+        return " AND ".join(clauses), params
+
+
+def _format_seconds(seconds) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    return time.strftime("%H:%M:%S", time.gmtime(seconds))
+
+
+def format_stats(history: FlashHistory, group_by: str = "ecu", ecu: str | None = None, days: int | None = None) -> str:
+    """Render the `stats` subcommand report."""
+    since = time.time() - days * 24 * 3600 if days else None
+    sections = []
+
+    def table(title, header, rows):
+        rows = [header] + [tuple(str(cell) for cell in row) for row in rows]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+        lines.insert(1, "-" * max(len(line) for line in lines))
+        sections.append(f"{title}\n" + "\n".join(lines))
+
+    def durations(rows):
+        return [(grp, runs, *(_format_seconds(value) for value in values)) for grp, runs, *values in rows]
+
+    table(
+        f"Successful runs by {group_by}",
+        (group_by.upper(), "RUNS", "P50", "P90", "P95", "MAX"),
+        durations(history.run_percentiles(group_by, ecu, since)),
+    )
+    table("Phases", ("PHASE", "RUNS", "P50", "P90", "P95", "MAX"), durations(history.phase_percentiles(ecu, since)))
+    table("Outcomes", ("ECU", "OUTCOME", "RUNS"), history.outcomes(ecu, since))
+    table(
+        "Weekly median",
+        ("WEEK", "RUNS", "P50"),
+        [(grp, runs, _format_seconds(p50)) for grp, runs, p50 in history.weekly_trend(ecu, since)],
+    )
+    return "\n\n".join(sections)
@@ -0,0 +1,154 @@
+import hashlib
+import mmap
+import os
+import re
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import Logger
+from typing import Callable
+
+from exceptions.exceptions import ArtifactIntegrityError
+
+# hashlib releases the GIL for large buffers, so files hash in parallel on threads
+CHUNK_SIZE = 16 * 1024 * 1024
+MANIFEST_NAMES = ("SHA256SUMS", "sha256sums.txt", "checksums.sha256")
+SHA256_PATTERN = re.compile(r"^([0-9a-fA-F]{64})\s+\*?(.+)$")
+
+
+def expected_sha256(path: str) -> str | None:
+    """
+    Look up the published checksum of an artifact.
+
+    Uses the sidecar <file>.sha256 first, then a sha256sum style manifest in
+    the same directory. Returns None when the drop has no checksum.
+    """
+    name = os.path.basename(path)
+    candidates = [(f"{path}.sha256", None)]
+    candidates += [(os.path.join(os.path.dirname(path), manifest), name) for manifest in MANIFEST_NAMES]
+    for candidate, wanted_name in candidates:
+        try:
+            with open(candidate, "r") as file:
+                lines = file.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            match = SHA256_PATTERN.match(line.strip())
+            # A sidecar may hold a bare hash or "hash  name"
+            if match and (wanted_name is None or os.path.basename(match.group(2)) == wanted_name):
+                return match.group(1).lower()
+            if wanted_name is None and re.fullmatch(r"[0-9a-fA-F]{64}", line.strip()):
+                return line.strip().lower()
+    return None
+
+
+def sha256_file(path: str) -> str:
+    """Hash a file through a memory map in CHUNK_SIZE slices."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return sha256.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(mapped), CHUNK_SIZE):
+                    sha256.update(view[offset:offset + CHUNK_SIZE])
+            finally:
+                view.release()
+    return sha256.hexdigest()
+
+
+def verify_artifact(path: str, checksum_source: str | None = None, known_sha256: str | None = None) -> str:
+    """
+    Check one artifact, raise ArtifactIntegrityError on a mismatch.
+
+    Args:
+        path (str): File that will be flashed.
+        checksum_source (str, optional): Where the published checksum lives,
+            defaults to path. Differs when path is a cached copy.
+        known_sha256 (str, optional): Hash already computed for path, skips rehashing.
+
+    Returns:
+        str: What was verified, for the log.
+    """
+    expected = expected_sha256(checksum_source or path)
+    if expected is None:
+        # Without a checksum at least catch truncation, a zip without its central directory does not open
+        if zipfile.is_zipfile(path):
+            return f"{os.path.basename(path)}: no checksum published, zip structure ok"
+        if path.endswith(".zip"):
+            raise ArtifactIntegrityError(f"{path} is not a valid zip archive (truncated?)")
+        return f"{os.path.basename(path)}: no checksum published"
+
+    actual = known_sha256 or sha256_file(path)
+    if actual != expected:
+        raise ArtifactIntegrityError(f"{path}: sha256 {actual} does not match the published {expected}")
+    return f"{os.path.basename(path)}: sha256 ok"
+
+
+class ArtifactVerifier:
+    """
+    Verifies artifacts on a worker pool while the flash is already starting.
+
+    Call start() before launching the flash and abort_on_mismatch(runner)
+    once it runs; a mismatch then terminates the process instead of being
+    found minutes into the flash. On the happy path verification overlaps
+    container startup and adds no wall time. When every hash is already
+    known there is nothing to overlap, start() then checks synchronously
+    and raises before anything is launched.
+    """
+
+    def __init__(self, artifacts: list[tuple[str, str | None, str | None]], logger: Logger, max_workers: int | None = None):
+        """artifacts: (path, checksum_source, known_sha256) per artifact."""
+        self.artifacts = artifacts
+        self.logger = logger
+        self.max_workers = max_workers or min(4, max(1, len(artifacts)))
+        self.future: Future | None = None
+        self._pool: ThreadPoolExecutor | None = None
+
+    def _verify_all(self) -> list[str]:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="verify") as pool:
+            futures = [pool.submit(verify_artifact, *artifact) for artifact in self.artifacts]
+            return [future.result() for future in futures]
+
+    def start(self) -> "ArtifactVerifier":
+        if all(known_sha256 for _, _, known_sha256 in self.artifacts):
+            self.future = Future()
+            try:
+                self.future.set_result([verify_artifact(*artifact) for artifact in self.artifacts])
+            except ArtifactIntegrityError as e:
+                self.future.set_exception(e)
+                raise
+            return self
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="verifier")
+        self.future = self._pool.submit(self._verify_all)
+        self._pool.shutdown(wait=False)
+        return self
+
+    @property
+    def pending(self) -> bool:
+        """Verification still runs in the background, after start()."""
+        return self.future is not None and not self.future.done()
+
+    def abort_on_mismatch(self, runner, stop: Callable[[], None] | None = None):
+        """
+        Terminate runner (a ProcessRunner) as soon as verification fails.
+
+        stop is called first, for work runner cannot signal itself, e.g. a
+        tool started through docker exec.
+        """
+        def on_done(future: Future):
+            error = future.exception()
+            if error is not None:
+                self.logger.error(f"Artifact verification failed, aborting flash: {error}")
+                if stop:
+                    stop()
+                runner.terminate()
+        self.future.add_done_callback(on_done)
+
+    def result(self) -> list[str]:
+        """Wait for verification, raises ArtifactIntegrityError on a mismatch."""
+        results = self.future.result()
+        for line in results:
+            self.logger.debug(f"Verified {line}")
+        return results
@@ -0,0 +1,160 @@
+import fcntl
+import getpass
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from logging import Logger
+
+from utils.paths import atomic_write, cache_dir
+
+# Where node_exporter looks for *.prom files when started with its default collector directory
+DEFAULT_TEXTFILE_DIR = "/var/lib/node_exporter/textfile_collector"
+TEXTFILE_NAME = "swen_tools_{user}.prom"
+
+FLASH_DURATION_BUCKETS = (60, 120, 300, 600, 900, 1200, 1800, 2700, 3600)
+PORT_DISCOVERY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+HELP = {
+    "swen_tools_flash_duration_seconds": ("histogram", "Duration of successful bootburns."),
+    "swen_tools_port_discovery_seconds": ("histogram", "Time spent finding the serial port of an ECU."),
+    "swen_tools_flash_runs_total": ("counter", "Bootburns by outcome."),
+    "swen_tools_flash_failures_total": ("counter", "Failed bootburns by failure class."),
+    "swen_tools_serial_bytes_read_total": ("counter", "Bytes read from the serial consoles."),
+    "swen_tools_last_run_timestamp_seconds": ("gauge", "Unix time the last bootburn of an ECU finished."),
+}
+
+
+def textfile_dir() -> str | None:
+    """SWEN_TOOLS_TEXTFILE_DIR, else the node_exporter default when it exists. None disables export."""
+    path = os.getenv("SWEN_TOOLS_TEXTFILE_DIR")
+    if path:
+        return path
+    if os.path.isdir(DEFAULT_TEXTFILE_DIR) and os.access(DEFAULT_TEXTFILE_DIR, os.W_OK):
+        return DEFAULT_TEXTFILE_DIR
+    return None
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _series_key(name: str, labels: dict) -> str:
+    return name + _labels(dict(sorted(labels.items())))
+
+
+class MetricsStore:
+    """
+    Cumulative bench metrics kept between runs.
+
+    Every swen-tools invocation is a short-lived process, so counters and
+    histogram buckets are persisted in the cache and the whole set is
+    rendered to the Prometheus text format after each run. A file lock keeps
+    concurrent invocations on the same bench from losing updates.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(cache_dir(), "metrics.json")
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def update(self):
+        """Load, modify and save the series while holding the lock."""
+        with self._lock, open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            series = self._load()
+            yield series
+            atomic_write(self.path, json.dumps(series, indent=2))
+
+    @staticmethod
+    def inc(series: dict, name: str, labels: dict, value: float = 1):
+        entry = series.setdefault(_series_key(name, labels), {"name": name, "labels": labels, "value": 0})
+        entry["value"] += value
+
+    @staticmethod
+    def set(series: dict, name: str, labels: dict, value: float):
+        series[_series_key(name, labels)] = {"name": name, "labels": labels, "value": value}
+
+    @staticmethod
+    def observe(series: dict, name: str, labels: dict, value: float, buckets: tuple):
+        entry = series.setdefault(
+            _series_key(name, labels),
+            {"name": name, "labels": labels, "buckets": {str(bound): 0 for bound in buckets}, "count": 0, "sum": 0.0},
+        )
+        for bound in entry["buckets"]:
+            if value <= float(bound):
+                entry["buckets"][bound] += 1
+        entry["count"] += 1
+        entry["sum"] += value
+
+    def render(self, series: dict | None = None, common_labels: dict | None = None) -> str:
+        """Render all series in the Prometheus text exposition format, common_labels go on every sample."""
+        series = self._load() if series is None else series
+        common_labels = common_labels or {}
+        by_name: dict[str, list[dict]] = {}
+        for key in sorted(series):
+            by_name.setdefault(series[key]["name"], []).append(series[key])
+
+        lines = []
+        for name, entries in by_name.items():
+            metric_type, help_text = HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for entry in entries:
+                labels = {**common_labels, **entry["labels"]}
+                if "buckets" not in entry:
+                    lines.append(f"{name}{_labels(labels)} {entry['value']}")
+                    continue
+                # Every bucket counts all observations up to its bound, as Prometheus expects
+                for bound, count in sorted(entry["buckets"].items(), key=lambda item: float(item[0])):
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {count}")
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {entry['count']}")
+                lines.append(f"{name}_sum{_labels(labels)} {entry['sum']}")
+                lines.append(f"{name}_count{_labels(labels)} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def export_run(run, logger: Logger, store: MetricsStore | None = None, directory: str | None = None, user: str | None = None):
+    """
+    Add a finished FlashRun to the metrics and rewrite the textfile.
+
+    The counters live in the cache of the user, so every user writes their
+    own textfile with a user label. Sharing one file would make the counters
+    of different users replace each other, which Prometheus sees as resets.
+
+    Export is best effort, a broken metrics directory never fails a flash.
+    """
+    directory = directory or textfile_dir()
+    if directory is None:
+        return
+    store = store or MetricsStore()
+    user = user or getpass.getuser()
+    labels = {"ecu": run.ecu}
+    try:
+        with store.update() as series:
+            store.inc(series, "swen_tools_flash_runs_total", {**labels, "outcome": run.outcome})
+            if run.outcome == "success":
+                store.observe(series, "swen_tools_flash_duration_seconds", labels, run.duration, FLASH_DURATION_BUCKETS)
+            elif run.outcome == "failed":
+                store.inc(series, "swen_tools_flash_failures_total", {**labels, "class": run.failure_class})
+            for name, _, duration in run.phases:
+                if name == "port_discovery":
+                    store.observe(series, "swen_tools_port_discovery_seconds", labels, duration, PORT_DISCOVERY_BUCKETS)
+            store.inc(series, "swen_tools_serial_bytes_read_total", labels, run.serial_bytes)
+            store.set(series, "swen_tools_last_run_timestamp_seconds", labels, round(time.time(), 3))
+            text = store.render(series, {"user": user})
+        os.makedirs(directory, exist_ok=True)
+        atomic_write(os.path.join(directory, TEXTFILE_NAME.format(user=user)), text)
+    except OSError as e:
+        logger.warning(f"Could not export metrics to {directory}: {e}")
@@ -1,5 +1,8 @@
+import os
 import serial
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from exceptions.exceptions import (
     CommandFailedError,
     FlashScriptError,
@@ -7,6 +10,13 @@ from exceptions.exceptions import (
 )
 from logging import Logger
 from abc import ABC, abstractmethod
+from typing import Callable
+from utils.console_broker import open_console
+from utils.flash_history import record_serial_read
+from utils.pacing import PacingProfile, PacingStore
+from utils.prompt_matcher import Pattern, PromptMatcher
+from utils.serial_reader import ReaderStats, SerialReader
+from utils.tracing import span, traced
 
 # Serial configuration
 SERIAL_CONFIG = {
@@ -19,57 +29,109 @@ SERIAL_CONFIG = {
     "xonxoff": False,
 }
 
+# Candidate console ports are <prefix>0..N, point this at simulated consoles to run without hardware
+TTY_PORT_PREFIX = os.getenv("SWEN_TOOLS_TTY_PREFIX", "/dev/ttyUSB")
+
+# Longest a probe thread waits before checking whether another port already matched
+PROBE_CANCEL_INTERVAL = 0.05
+
 
 class SerialCommandStrategy(ABC):
     """Abstract base class for different serial command execution strategies."""
 
+    # Whether every received chunk is logged at debug level
+    log_chunks = False
+
+    def __init__(self):
+        self.last_stats: ReaderStats | None = None
+        # Called with every chunk read, e.g. to feed a ProgressTracker
+        self.listeners: list[Callable[[bytes], None]] = []
+
     @abstractmethod
     def execute(
         self,
         ser: serial.Serial,
         command: bytes,
-        expected_response: bytes,
+        expected_response: Pattern | list[Pattern],
         timeout: int,
         logger: Logger,
     ) -> tuple[bool, str]:
         pass
 
+    def _notify(self, data: bytes):
+        if data:
+            for listener in self.listeners:
+                listener(data)
+
+    def _read_until(
+        self,
+        ser: serial.Serial,
+        expected_response: Pattern | list[Pattern],
+        timeout: float,
+        logger: Logger,
+        stats: ReaderStats | None = None,
+        received: bytes = b"",
+    ) -> tuple[bool, str]:
+        """
+        Wait until expected_response arrives, waking up only when bytes are received.
+
+        expected_response may be a byte string, a compiled bytes regex or a list
+        of them, the first one that matches ends the wait. received holds bytes
+        the strategy already read (e.g. echoes) that belong to the response.
+        """
+        matcher = PromptMatcher(expected_response)
+        deadline = time.monotonic() + timeout
+
+        with SerialReader(ser, stats) as reader:
+            self.last_stats = reader.stats
+            self._notify(received)
+            if received and matcher.feed(received) is not None:
+                reader.mark_match()
+                logger.debug(f"Expected response received after command: {matcher.text}")
+                return True, matcher.text
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                data = reader.read(remaining)
+                if not data:
+                    continue
+                self._notify(data)
+                if self.log_chunks:
+                    logger.debug(data.decode("utf-8", errors="replace").strip())
+                if matcher.feed(data) is not None:
+                    reader.mark_match()
+                    decoded_response = matcher.text
+                    logger.debug(f"Expected response received after command: {decoded_response}")
+                    logger.debug(f"Serial read stats: {reader.stats}")
+                    return True, decoded_response
+
+        logger.debug(f"Timeout reached! Expected: {matcher.describe()}, Received: {matcher.text}")
+        logger.debug(f"Serial read stats: {self.last_stats}")
+        return False, matcher.text
+
 
 class BasicSerialCommand(SerialCommandStrategy):
     """Simple serial command execution strategy."""
 
+    log_chunks = True
+
     def execute(
         self,
         ser: serial.Serial,
         command: bytes,
-        expected_response: bytes,
+        expected_response: Pattern | list[Pattern],
         timeout: int,
         logger: Logger,
     ):
         assert ser.is_open
-     
+
+        stats = ReaderStats()
         ser.write(command + b"\r")
         ser.flush()
         logger.debug(f"Executed command over serial: '{command}'")
 
-        response = b""
-        
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-           # data = ser.read(ser.in_waiting or 1)  # Read available bytes (or 1 byte)
-            data = ser.read_all()
-            if data:
-                response += data
-                decoded_response = response.decode("utf-8", errors="replace").strip()
-                logger.debug(decoded_response)
-                if expected_response in response:
-                    logger.debug(f"Expected response received after command: {decoded_response}")
-                    return True, decoded_response
-
-            time.sleep(0.1)  # Short delay to prevent CPU overuse
-
-        logger.debug(f"Timeout reached! Expected: {expected_response.decode()}, Received: {response.decode('utf-8', errors='replace').strip()}")
-        return False, response.decode("utf-8", errors="replace").strip()
+        return self._read_until(ser, expected_response, timeout, logger, stats)
 
 
 class CharacterByCharacterSerialCommand(SerialCommandStrategy):
@@ -79,7 +141,7 @@ class CharacterByCharacterSerialCommand(SerialCommandStrategy):
         self,
         ser: serial.Serial,
         command: bytes,
-        expected_response: bytes,
+        expected_response: Pattern | list[Pattern],
         timeout: int,
         logger: Logger,
     ):
@@ -89,30 +151,71 @@ class CharacterByCharacterSerialCommand(SerialCommandStrategy):
             ser.write(bytes([c]))  # Send one character at a time
             time.sleep(0.2)
 
+        stats = ReaderStats()
         ser.write(b"\r")
         time.sleep(0.2)
         ser.flush()
-        
+
         logger.debug(f"Executed command over serial: '{command}'")
 
-        response = b""
+        return self._read_until(ser, expected_response, timeout, logger, stats)
+
+
+class EchoPacedSerialCommand(SerialCommandStrategy):
+    """
+    Types a command character by character, sending the next character as
+    soon as the previous one has been echoed back.
+
+    The echo wait adapts to a per-port profile learned from earlier echoes.
+    When a port does not echo, each character falls back to the fixed delay
+    used by CharacterByCharacterSerialCommand.
+    """
+
+    def __init__(self, pacing_store: PacingStore | None = None):
+        super().__init__()
+        self.pacing_store = pacing_store or PacingStore()
+
+    def _type(self, ser: serial.Serial, reader: SerialReader, profile: PacingProfile, char: bytes) -> bytes:
+        """Send one character and wait for its echo, return everything read meanwhile."""
+        received = b""
+        ser.write(char)
+        sent_at = time.monotonic()
+        deadline = sent_at + profile.echo_wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                profile.record_miss()
+                return received
+            received += reader.read(remaining)
+            if char in received:
+                profile.record_echo(time.monotonic() - sent_at)
+                return received
+
+    def execute(
+        self,
+        ser: serial.Serial,
+        command: bytes,
+        expected_response: Pattern | list[Pattern],
+        timeout: int,
+        logger: Logger,
+    ):
+        assert ser.is_open
 
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-           # data = ser.read(ser.in_waiting or 1)  # Read available bytes (or 1 byte)
-            data = ser.read_all()
-            if data:
-                response += data
-                decoded_response = response.decode("utf-8", errors="replace").strip()
+        profile = self.pacing_store.get(ser.port or "")
+        received = b""
+        typing_start = time.monotonic()
+        with SerialReader(ser) as reader:
+            for c in command:
+                received += self._type(ser, reader, profile, bytes([c]))
 
-                if expected_response in response:
-                    logger.debug(f"Expected response received after command: {decoded_response}")
-                    return True, decoded_response
+        stats = ReaderStats()
+        ser.write(b"\r")
+        ser.flush()
+        self.pacing_store.save()
 
-            time.sleep(0.05)  # Short delay to prevent CPU overuse
+        logger.debug(f"Executed command over serial: '{command}' (typed in {(time.monotonic() - typing_start) * 1000:.0f} ms, echo wait {profile.echo_wait * 1000:.0f} ms)")
 
-        logger.debug(f"Timeout reached! Expected: {expected_response.decode()}, Received: {response.decode('utf-8', errors='replace').strip()}")
-        return False, response.decode("utf-8", errors="replace").strip()
+        return self._read_until(ser, expected_response, timeout, logger, stats, received)
 
 
 class SerialCommandExecutor:
@@ -125,51 +228,114 @@ class SerialCommandExecutor:
         self,
         ser: serial.Serial,
         command: bytes ,
-        expected_response: bytes,
+        expected_response: Pattern | list[Pattern],
         timeout: int,
         logger: Logger,
     ):
-        return self.strategy.execute(ser, command, expected_response, timeout, logger)
-
-def __check_ttyUSB_port(ser: serial.Serial, serial_executor: SerialCommandExecutor, prompt: str, timeout: int, logger: Logger):
+        with span("serial.execute", "serial", command=command, port=ser.port):
+            response = self.strategy.execute(ser, command, expected_response, timeout, logger)
+        stats = self.strategy.last_stats
+        record_serial_read(stats.bytes_read if stats else 0, not response[0])
+        return response
+
+def probe_ttyUSB_port(port: str, prompts: list[str], timeout: float, logger: Logger, stop_event: threading.Event | None = None) -> str | None:
+    """
+    Open a port once and match every prompt against the same read stream.
+
+    Returns:
+        str: The prompt that was found, None if no prompt showed up before the timeout.
+    """
+    matcher = PromptMatcher([bytes(prompt, "utf-8") for prompt in prompts])
     try:
-        
-        success, received_data = serial_executor.execute(ser=ser, command= b"", expected_response=bytes(prompt, "utf-8"), timeout=timeout, logger=logger)
-
-        if success:
-            logger.debug(f"Prompt found: {received_data}")
-            return True
+        with open_console(port, **SERIAL_CONFIG) as ser, SerialReader(ser) as reader:
+            ser.write(b"\r")
+            ser.flush()
+
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+                    return None
+                # Wake up regularly so a match on another port cancels this probe
+                data = reader.read(min(remaining, PROBE_CANCEL_INTERVAL))
+                if data and matcher.feed(data) is not None:
+                    logger.debug(f"Prompt found on {port}: {matcher.text}")
+                    return matcher.matched.decode("utf-8")
+    except serial.SerialException as e:
+        # A missing ttyUSB is a gap on the bench, a port that exists but
+        # cannot be opened (busy, permissions) is worth a warning
+        if os.path.exists(port):
+            logger.warning(f"Could not probe {port}: {e}")
         else:
-            return False
+            logger.debug(f"Could not probe {port}: {e}")
+    return None
 
-    except serial.SerialException as e:
-        logger.error(f"Something unexpected happened while finding port: {e}")
-        return False
 
+def discover_ttyUSB_ports(num_of_ports: int, prompts: str | list[str], timeout: float, logger: Logger, first_match: bool = False) -> dict[str, str]:
+    """
+    Probe all candidate ports at the same time.
 
+    Every port is opened once and all prompts are matched against its output,
+    so discovery takes about one timeout regardless of the number of ports
+    and prompts. Ports that cannot be opened are logged and skipped.
 
-def search_correct_ttyUSB_port(num_of_ports: int, serial_executor: SerialCommandExecutor, prompts: str | list[str], timeout: int, logger: Logger):
+    Args:
+        num_of_ports (int): Number of /dev/ttyUSB* ports to probe.
+        prompts (str | list): Prompt(s) identifying the wanted device.
+        timeout (float): Time to wait for a prompt on each port.
+        first_match (bool): Only find the lowest-numbered port that answers.
+            A match cancels the probes of higher-numbered ports, lower ones
+            keep probing since they would win.
 
+    Returns:
+        dict: Port -> matched prompt for every port that answered, in port order.
+    """
     if isinstance(prompts, str):
         prompts = [prompts]
 
+    ports = [f"{TTY_PORT_PREFIX}{port_num}" for port_num in range(num_of_ports)]
+    logger.info(f"Probing ports: {', '.join(ports)}")
+
+    found: dict[str, str] = {}
+    stop_events = [threading.Event() for _ in ports]
+    with ThreadPoolExecutor(max_workers=max(1, len(ports))) as pool:
+        futures = {
+            pool.submit(probe_ttyUSB_port, port, prompts, timeout, logger, stop_events[index]): index
+            for index, port in enumerate(ports)
+        }
+        for future in as_completed(futures):
+            prompt = future.result()
+            if prompt is None:
+                continue
+            index = futures[future]
+            found[ports[index]] = prompt
+            if first_match:
+                for stop_event in stop_events[index + 1:]:
+                    stop_event.set()
+
+    # Keep the port order stable regardless of which probe answered first
+    found = {port: found[port] for port in ports if port in found}
+    if first_match:
+        return dict(list(found.items())[:1])
+    return found
+
+
+@traced("search_correct_ttyUSB_port", "serial")
+def search_correct_ttyUSB_port(num_of_ports: int, prompts: str | list[str], timeout: int, logger: Logger):
+    """
+    Return the lowest-numbered /dev/ttyUSB* port that answers with one of the prompts.
+
+    Unlike the former one-port-at-a-time search, a port that cannot be
+    opened does not abort the search: all ports are probed at once, and a
+    busy or missing ttyUSB must not hide the console on another port. Such
+    ports are logged, PortNotFoundError is raised when no port answered.
+    """
+    found = discover_ttyUSB_ports(num_of_ports, prompts, timeout, logger, first_match=True)
+    if found:
+        port = next(iter(found))
+        logger.success(f"Found active port: {port}")
+        return port
 
-    for port_num in range(num_of_ports):
-        port = f"/dev/ttyUSB{port_num}"
-        logger.info(f"Trying port: {port}")
-        for prompt in prompts:
-            try:
-                with serial.Serial(port, **SERIAL_CONFIG) as ser:
-                    if __check_ttyUSB_port(ser, serial_executor, prompt, timeout, logger):
-                        logger.success(f"Found active port: {port_num}")
-                        ser.close()
-                        return port
-            except serial.SerialException as e:
-                message = f"Something went wrong when trying searching correct ttyUSB port: {e} "
-                logger.warning(message)
-                raise serial.SerialException(message)
-            finally:
-                ser.close()
     message = "No active port found."
     logger.warning(message)
     raise PortNotFoundError(message)
\ No newline at end of file
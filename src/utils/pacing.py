@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+
+from utils.paths import atomic_write, cache_dir
+
+# Worst case delay per character, what CharacterByCharacterSerialCommand always waits
+FALLBACK_DELAY = 0.2
+# Never wait less than this for an echo, covers scheduler and USB latency jitter
+MIN_ECHO_WAIT = 0.01
+# Echo wait is this many times the learned average echo latency
+ECHO_WAIT_FACTOR = 3
+# Weight of the newest sample in the moving average
+SMOOTHING = 0.2
+# After this many characters without an echo the port is treated as non-echoing
+MAX_MISSES = 3
+
+
+class PacingProfile:
+    """Learned typing pace of one serial port."""
+
+    def __init__(self, echo_latency: float | None = None, echoes: bool = True, samples: int = 0):
+        self.echo_latency = echo_latency
+        self.echoes = echoes
+        self.samples = samples
+        self.misses = 0
+
+    @property
+    def echo_wait(self) -> float:
+        """How long to wait for the echo of a character before sending the next one."""
+        if not self.echoes:
+            return FALLBACK_DELAY
+        if self.echo_latency is None:
+            return FALLBACK_DELAY
+        return min(FALLBACK_DELAY, max(MIN_ECHO_WAIT, self.echo_latency * ECHO_WAIT_FACTOR))
+
+    def record_echo(self, latency: float):
+        self.misses = 0
+        self.echoes = True
+        self.samples += 1
+        if self.echo_latency is None:
+            self.echo_latency = latency
+        else:
+            self.echo_latency += SMOOTHING * (latency - self.echo_latency)
+
+    def record_miss(self):
+        self.misses += 1
+        if self.misses >= MAX_MISSES:
+            self.echoes = False
+
+    def to_dict(self) -> dict:
+        return {"echo_latency": self.echo_latency, "echoes": self.echoes, "samples": self.samples}
+
+
+class PacingStore:
+    """Per-port pacing profiles, persisted so the next run starts from what was learned."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(cache_dir(), "pacing.json")
+        self._profiles: dict[str, PacingProfile] | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, PacingProfile]:
+        if self._profiles is None:
+            try:
+                with open(self.path, "r") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                data = {}
+            self._profiles = {port: PacingProfile(**values) for port, values in data.items()}
+        return self._profiles
+
+    def get(self, port: str) -> PacingProfile:
+        with self._lock:
+            return self._load().setdefault(port, PacingProfile())
+
+    def save(self):
+        with self._lock:
+            profiles = self._load()
+            data = {port: profile.to_dict() for port, profile in profiles.items()}
+            try:
+                atomic_write(self.path, json.dumps(data, indent=2))
+            except OSError:
+                pass  # Pacing is an optimisation, never fail a flash over it
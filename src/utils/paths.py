@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+
+def cache_dir(*parts: str) -> str:
+    """
+    Return (and create) a directory below the swen-tools cache.
+
+    Honours SWEN_TOOLS_CACHE_DIR, then XDG_CACHE_HOME, then ~/.cache.
+    """
+    base = os.getenv("SWEN_TOOLS_CACHE_DIR") or os.path.join(
+        os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "swen-tools"
+    )
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def atomic_write(path: str, data: str | bytes):
+    """Write a file through a temporary file and rename, so readers never see half a file."""
+    # A unique name per call, threads of one process may write the same path
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        # mkstemp creates the file 0600, readers such as node_exporter need the usual mode
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
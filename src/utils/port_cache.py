@@ -0,0 +1,176 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from logging import Logger
+
+from serial.tools import list_ports
+
+from utils.minicom import discover_ttyUSB_ports, probe_ttyUSB_port, search_correct_ttyUSB_port
+from utils.paths import atomic_write, cache_dir
+
+BY_PATH_DIR = "/dev/serial/by-path"
+
+
+def _by_path_links() -> dict[str, str]:
+    """Map resolved device paths to their /dev/serial/by-path symlink."""
+    links = {}
+    if not os.path.isdir(BY_PATH_DIR):
+        return links
+    for name in os.listdir(BY_PATH_DIR):
+        link = os.path.join(BY_PATH_DIR, name)
+        links[os.path.realpath(link)] = link
+    return links
+
+
+def describe_port(port: str) -> dict:
+    """Collect the stable USB attributes of a port."""
+    identity = {"port": port, "by_path": _by_path_links().get(os.path.realpath(port))}
+    for info in list_ports.comports():
+        if info.device == port:
+            identity["serial_number"] = info.serial_number
+            identity["location"] = info.location
+            break
+    return identity
+
+
+def resolve_identity(identity: dict) -> str | None:
+    """Find the device node that currently belongs to a cached identity."""
+    by_path = identity.get("by_path")
+    if by_path and os.path.exists(by_path):
+        return os.path.realpath(by_path)
+
+    serial_number = identity.get("serial_number")
+    if not serial_number:
+        # No USB attributes (e.g. a pty), the prompt check decides if the old node is still right
+        return identity.get("port") if os.path.exists(identity.get("port", "")) else None
+
+    # Multi-channel adapters share one serial number, the USB location tells them apart
+    candidates = [info for info in list_ports.comports() if info.serial_number == serial_number]
+    for info in candidates:
+        if info.location == identity.get("location"):
+            return info.device
+    if len(candidates) == 1:
+        return candidates[0].device
+    return None
+
+
+class PortCache:
+    """Persistent ECU -> serial port bindings keyed by stable USB attributes."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(cache_dir(), "ports.json")
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, ecu: str) -> dict | None:
+        return self._load().get(ecu)
+
+    @contextmanager
+    def _update(self):
+        """
+        Load, modify and save the bindings while holding the file lock.
+
+        flock locks belong to the open file, so the lock also separates
+        threads of one process, e.g. HPA and SGA in flash-all.
+        """
+        with open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._load()
+            before = dict(entries)
+            yield entries
+            if entries != before:
+                atomic_write(self.path, json.dumps(entries, indent=2))
+
+    def store(self, ecu: str, port: str):
+        identity = describe_port(port)
+        with self._update() as entries:
+            entries[ecu] = identity
+
+    def invalidate(self, ecu: str):
+        with self._update() as entries:
+            entries.pop(ecu, None)
+
+
+def find_ttyUSB_port(
+    ecu: str,
+    num_of_ports: int,
+    prompts: str | list[str],
+    timeout: float,
+    logger: Logger,
+    cache: PortCache | None = None,
+) -> str:
+    """
+    Find the console of an ECU, trying the cached binding before a full scan.
+
+    The cached port is validated with a single prompt probe. When the probe
+    fails the binding is dropped and search_correct_ttyUSB_port is used.
+    """
+    if isinstance(prompts, str):
+        prompts = [prompts]
+    cache = cache or PortCache()
+
+    identity = cache.lookup(ecu)
+    if identity:
+        port = resolve_identity(identity)
+        if port and probe_ttyUSB_port(port, prompts, timeout, logger):
+            logger.success(f"Using cached port for {ecu}: {port}")
+            return port
+        logger.info(f"Cached port for {ecu} did not answer, rescanning...")
+        cache.invalidate(ecu)
+
+    port = search_correct_ttyUSB_port(num_of_ports, prompts, timeout, logger)
+    cache.store(ecu, port)
+    return port
+
+
+def find_ecu_ports(
+    ecus: dict[str, list[str]],
+    num_of_ports: int,
+    timeout: float,
+    logger: Logger,
+    cache: PortCache | None = None,
+) -> dict[str, str]:
+    """
+    Find the consoles of several ECUs with a single scan.
+
+    Probing writes to every candidate port, so ECUs that are flashed at the
+    same time must not discover their ports while another one is already
+    talking to its console. Cached bindings are validated first, the
+    remaining ECUs share one probe of all ports.
+
+    Args:
+        ecus (dict): ECU -> prompts identifying its console.
+
+    Returns:
+        dict: ECU -> port for every ECU whose console answered.
+    """
+    cache = cache or PortCache()
+    ports = {}
+    for ecu, prompts in ecus.items():
+        identity = cache.lookup(ecu)
+        if not identity:
+            continue
+        port = resolve_identity(identity)
+        if port and probe_ttyUSB_port(port, prompts, timeout, logger):
+            logger.success(f"Using cached port for {ecu}: {port}")
+            ports[ecu] = port
+        else:
+            logger.info(f"Cached port for {ecu} did not answer, rescanning...")
+            cache.invalidate(ecu)
+
+    missing = {ecu: prompts for ecu, prompts in ecus.items() if ecu not in ports}
+    if missing:
+        all_prompts = [prompt for prompts in missing.values() for prompt in prompts]
+        for port, prompt in discover_ttyUSB_ports(num_of_ports, all_prompts, timeout, logger).items():
+            for ecu, prompts in missing.items():
+                if prompt in prompts and ecu not in ports:
+                    logger.success(f"Found {ecu} on {port}")
+                    ports[ecu] = port
+                    cache.store(ecu, port)
+    return ports
@@ -0,0 +1,209 @@
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from logging import Logger
+from typing import Callable
+
+# Lines kept from the end of each stream for error reports
+DEFAULT_TAIL_LINES = 200
+
+
+class StreamCapture:
+    """Tail, byte count and line count of one output stream."""
+
+    def __init__(self, name: str, tail_lines: int = DEFAULT_TAIL_LINES):
+        self.name = name
+        self.tail: deque[tuple[float, str]] = deque(maxlen=tail_lines)
+        self.bytes = 0
+        self.lines = 0
+
+    def add(self, line: str):
+        self.tail.append((time.time(), line))
+        self.bytes += len(line.encode("utf-8", errors="replace"))
+        self.lines += 1
+
+    def tail_text(self, lines: int | None = None) -> str:
+        entries = list(self.tail)[-lines:] if lines else self.tail
+        return "\n".join(line.rstrip("\n") for _, line in entries)
+
+
+class ProcessResult:
+    """Outcome of a finished process."""
+
+    def __init__(self, command: list[str], returncode: int, stdout: StreamCapture, stderr: StreamCapture, duration: float):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+class ProcessRunner:
+    """
+    Runs a process and pumps stdout and stderr concurrently.
+
+    Each stream is drained by its own thread, so a process that fills one
+    pipe while the other is being read can never stall. Every line is
+    timestamped into a bounded tail buffer and handed to the callback of its
+    stream.
+
+    Args:
+        command (list): Command and arguments.
+        on_stdout, on_stderr (callable, optional): Called with each line (without newline).
+        stdin_data (str, optional): Written to stdin, which is then closed.
+        tail_lines (int): Lines kept per stream in the result.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        on_stdout: Callable[[str], None] | None = None,
+        on_stderr: Callable[[str], None] | None = None,
+        stdin_data: str | None = None,
+        tail_lines: int = DEFAULT_TAIL_LINES,
+        **popen_kwargs,
+    ):
+        self.command = command
+        self.on_stdout = on_stdout
+        self.on_stderr = on_stderr
+        self.stdin_data = stdin_data
+        self.popen_kwargs = popen_kwargs
+        self.stdout = StreamCapture("stdout", tail_lines)
+        self.stderr = StreamCapture("stderr", tail_lines)
+        self.process: subprocess.Popen | None = None
+        self._threads: list[threading.Thread] = []
+        self._start_time = None
+
+    def start(self) -> "ProcessRunner":
+        self._start_time = time.time()
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE if self.stdin_data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            **self.popen_kwargs,
+        )
+
+        for pipe, capture, callback in (
+            (self.process.stdout, self.stdout, self.on_stdout),
+            (self.process.stderr, self.stderr, self.on_stderr),
+        ):
+            thread = threading.Thread(target=self._pump, args=(pipe, capture, callback), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        if self.stdin_data is not None:
+            try:
+                self.process.stdin.write(self.stdin_data)
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                pass
+            finally:
+                self.process.stdin.close()
+        return self
+
+    @staticmethod
+    def _pump(pipe, capture: StreamCapture, callback):
+        with pipe:
+            for line in iter(pipe.readline, ""):
+                capture.add(line)
+                if callback:
+                    callback(line.rstrip("\n"))
+
+    def wait(self, timeout: float | None = None) -> ProcessResult:
+        """Wait for the process and both pumps to finish."""
+        self.process.wait(timeout=timeout)
+        for thread in self._threads:
+            thread.join()
+        return ProcessResult(self.command, self.process.returncode, self.stdout, self.stderr, time.time() - self._start_time)
+
+    def _signal(self, signum: int):
+        # With start_new_session the whole process group is signalled, so
+        # children of a wrapper script cannot keep the pipes open
+        if self.popen_kwargs.get("start_new_session"):
+            try:
+                os.killpg(self.process.pid, signum)
+            except ProcessLookupError:
+                pass
+        else:
+            self.process.send_signal(signum)
+
+    def terminate(self, grace_period: float = 5, signum: int = signal.SIGTERM):
+        """Stop the process with signum, killing it if it does not exit within grace_period seconds."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self._signal(signum)
+        try:
+            self.process.wait(timeout=grace_period)
+        except subprocess.TimeoutExpired:
+            self._signal(signal.SIGKILL)
+
+
+def run_process(
+    command: list[str],
+    logger: Logger,
+    stdout_level: int = logging.INFO,
+    stderr_level: int = logging.WARNING,
+    stdin_data: str | None = None,
+    on_line: Callable[[str, str], None] | None = None,
+    on_start: Callable[[ProcessRunner], None] | None = None,
+    **popen_kwargs,
+) -> ProcessResult:
+    """
+    Run a process to completion, logging both streams live.
+
+    Args:
+        command (list): Command and arguments.
+        logger (Logger): Receives every line at stdout_level / stderr_level.
+        stdin_data (str, optional): Written to stdin, which is then closed.
+        on_line (callable, optional): Also called with (stream_name, line) for every line.
+        on_start (callable, optional): Called with the ProcessRunner once the
+            process runs, e.g. to terminate it from another thread.
+        start_new_session (bool, optional): Popen option, lets terminate()
+            stop the whole process group. Ctrl+C is then forwarded as SIGINT.
+
+    Returns:
+        ProcessResult: Exit code, stream tails and byte counters.
+    """
+    def make_callback(stream_name, level):
+        def callback(line):
+            logger.log(level, line.strip())
+            if on_line:
+                on_line(stream_name, line)
+        return callback
+
+    runner = ProcessRunner(
+        command,
+        on_stdout=make_callback("stdout", stdout_level),
+        on_stderr=make_callback("stderr", stderr_level),
+        stdin_data=stdin_data,
+        **popen_kwargs,
+    )
+    runner.start()
+    try:
+        if on_start:
+            on_start(runner)
+        result = runner.wait()
+    except KeyboardInterrupt:
+        # In its own session the process did not get the Ctrl+C of the terminal, pass it on
+        runner.terminate(signum=signal.SIGINT if popen_kwargs.get("start_new_session") else signal.SIGTERM)
+        raise
+    except BaseException:
+        runner.terminate()
+        raise
+    logger.debug(
+        f"{command[0]} exited with {result.returncode} after {result.duration:.1f} s "
+        f"(stdout: {result.stdout.bytes} bytes, stderr: {result.stderr.bytes} bytes)"
+    )
+    return result
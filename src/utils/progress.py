@@ -0,0 +1,200 @@
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from utils.paths import atomic_write, cache_dir
+
+# Parsed progress never reports done before the tool exits
+MAX_RUNNING_PERCENT = 99.0
+# Time based estimates stop here, the tool may just be slower than usual
+MAX_ESTIMATED_PERCENT = 95.0
+# Durations kept per task for the median
+HISTORY_SIZE = 20
+
+
+class ProgressParser(ABC):
+    """Turns tool output lines into percent complete."""
+
+    @abstractmethod
+    def parse(self, line: str) -> float | None:
+        """Percent complete reported by line, None when it reports nothing."""
+        pass
+
+
+class PercentParser(ProgressParser):
+    """Picks up explicit percentages from lines matching a regex with one percent group."""
+
+    def __init__(self, pattern: str = r"(\d{1,3}(?:\.\d+)?)\s*%"):
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+
+    def parse(self, line):
+        match = self.pattern.search(line)
+        if match:
+            return min(float(match.group(1)), 100.0)
+        return None
+
+
+class StageParser(ProgressParser):
+    """Maps known stage messages, in order, to the percentage reached when they appear."""
+
+    def __init__(self, stages: list[tuple[str, float]]):
+        self.stages = [(re.compile(pattern, re.IGNORECASE), percent) for pattern, percent in stages]
+
+    def parse(self, line):
+        for pattern, percent in self.stages:
+            if pattern.search(line):
+                return percent
+        return None
+
+
+class StepParser(ProgressParser):
+    """Picks up "[n/m]", "(n/m)" or "n of m" step counters."""
+
+    # Bare n/m is not accepted, it would match dates and paths
+    pattern = re.compile(r"[\[(]\s*(\d+)\s*/\s*(\d+)\s*[\])]|\b(\d+) of (\d+)\b")
+
+    def parse(self, line):
+        match = self.pattern.search(line)
+        if match:
+            groups = [group for group in match.groups() if group is not None]
+            done, total = int(groups[0]), int(groups[1])
+            if 0 < total and done <= total:
+                return done * 100.0 / total
+        return None
+
+
+class CombinedParser(ProgressParser):
+    """Uses the first parser that understands a line."""
+
+    def __init__(self, *parsers: ProgressParser):
+        self.parsers = parsers
+
+    def parse(self, line):
+        for parser in self.parsers:
+            percent = parser.parse(line)
+            if percent is not None:
+                return percent
+        return None
+
+
+def tegra_flash_parser() -> ProgressParser:
+    """Stages printed by the NVIDIA tegra flash.sh used for the HPA."""
+    return StageParser([
+        (r"Generating RCM messages", 5),
+        (r"Sending BCTs", 10),
+        (r"Sending bootloader", 15),
+        (r"Writing partition secondary_gpt", 20),
+        (r"Writing partition APP", 30),
+        (r"Writing partition kernel", 85),
+        (r"Writing partition recovery", 90),
+        (r"Flashing completed|flashed successfully", 100),
+    ])
+
+
+def swupdate_parser() -> ProgressParser:
+    """U-Boot script / SWUpdate progress on the SGA console."""
+    return CombinedParser(
+        PercentParser(r"(?:swupdate|progress)\D*?(\d{1,3})\s*%"),
+        StageParser([
+            (r"Executing script at", 1),
+            (r"Software Update started", 2),
+            (r"SWUPDATE successful", 100),
+        ]),
+    )
+
+
+def dhu_docker_parser() -> ProgressParser:
+    """Log lines of the DHU flashing container (dhuh_update / moose_update)."""
+    return CombinedParser(PercentParser(), StepParser())
+
+
+class DurationHistory:
+    """Recent durations per task, the median is used when a tool emits nothing parseable."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(cache_dir(), "durations.json")
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def median(self, name: str) -> float | None:
+        durations = self._load().get(name)
+        return statistics.median(durations) if durations else None
+
+    def record(self, name: str, duration: float):
+        with self._lock:
+            data = self._load()
+            data[name] = (data.get(name, []) + [duration])[-HISTORY_SIZE:]
+            try:
+                atomic_write(self.path, json.dumps(data, indent=2))
+            except OSError:
+                pass
+
+
+class ProgressTracker:
+    """
+    Real percent complete and ETA for a running tool.
+
+    Lines of tool output are fed through a parser. Until the parser has
+    recognised something, progress is estimated from the median duration of
+    earlier runs (or fallback_duration when there is no history yet).
+    """
+
+    def __init__(self, name: str, parser: ProgressParser, fallback_duration: float, history: DurationHistory | None = None):
+        self.name = name
+        self.parser = parser
+        self.history = history or DurationHistory()
+        self.expected_duration = self.history.median(name) or fallback_duration
+        self.start_time = time.time()
+        self.parsed_percent: float | None = None
+        self.parsed_at = None
+        self._partial = ""
+
+    def feed(self, line: str):
+        percent = self.parser.parse(line)
+        if percent is not None and (self.parsed_percent is None or percent >= self.parsed_percent):
+            self.parsed_percent = percent
+            self.parsed_at = time.time()
+
+    def feed_bytes(self, data: bytes):
+        """Feed raw console output, lines may be split across calls."""
+        text = self._partial + data.decode("utf-8", errors="replace")
+        *lines, self._partial = re.split(r"[\r\n]", text)
+        for line in lines:
+            if line:
+                self.feed(line)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    def percent(self) -> float:
+        if self.parsed_percent is not None:
+            return min(self.parsed_percent, MAX_RUNNING_PERCENT)
+        return min(self.elapsed / self.expected_duration * 100, MAX_ESTIMATED_PERCENT)
+
+    def eta(self) -> float | None:
+        """Seconds left, None when it cannot be estimated."""
+        if self.parsed_percent:
+            # Extrapolate the pace of the parsed progress
+            elapsed_at_parse = self.parsed_at - self.start_time
+            total = elapsed_at_parse * 100 / self.parsed_percent
+            return max(total - self.elapsed, 0)
+        remaining = self.expected_duration - self.elapsed
+        return remaining if remaining > 0 else None
+
+    def finish(self, success: bool = True) -> float:
+        """Record the duration of a successful run for future estimates."""
+        duration = self.elapsed
+        if success:
+            self.history.record(self.name, duration)
+        return duration
@@ -3,6 +3,14 @@ import time
 import threading
 import subprocess
 
+_enabled = True
+
+
+def set_enabled(enabled: bool):
+    """Turn drawing on or off, flash-all turns it off while ECUs flash concurrently."""
+    global _enabled
+    _enabled = enabled
+
 
 class ProgressBar:
     def __init__(self, total=100, start_bracket="[", end_bracket="]", empty_bar="-", filled_bar="█"):
@@ -14,14 +22,18 @@ class ProgressBar:
         self.running = False
         self.thread = None  # Thread for the progress bar
 
-    def _progress_bar(self, progress):
+    def _progress_bar(self, progress, eta=None):
         """Prints the progress bar based on the given progress value."""
+        if not _enabled:
+            return
         percent = f"{(progress / self.total) * 100:.1f}"
         filled_length = int(50 * progress // self.total)
         empty_length = 50 - filled_length
 
         bar = f"{self.start_bracket}{self.filled_bar * filled_length}{self.empty_bar * empty_length}{self.end_bracket} {percent}%"
-        sys.stdout.write(f"\r{bar}")
+        if eta is not None:
+            bar += f" ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}"
+        sys.stdout.write(f"\r{bar}\033[K")
         sys.stdout.flush()
 
     def _run(self, duration):
@@ -40,20 +52,34 @@ class ProgressBar:
 
 
 
+    def _run_tracker(self, tracker):
+        """Redraws the progress bar from a ProgressTracker until stopped."""
+        while self.running:
+            progress = tracker.percent() * self.total / 100
+            self._progress_bar(progress, tracker.eta())
+            time.sleep(0.2)
+
     def start(self, duration):
         """Starts the progress bar in a separate thread."""
         self.running = True
         self.thread = threading.Thread(target=self._run, args=(duration,))
         self.thread.start()
 
+    def start_tracking(self, tracker):
+        """Starts the progress bar fed by a ProgressTracker instead of a fixed duration."""
+        self.running = True
+        self.thread = threading.Thread(target=self._run_tracker, args=(tracker,))
+        self.thread.start()
+
     def stop(self, done = True):
         """Stops the progress bar thread."""
-        if done:
-            self._progress_bar(100)
-            print()
         self.running = False
         if self.thread:
             self.thread.join()
+            self.thread = None
+        if done and _enabled:
+            self._progress_bar(self.total)
+            print()
 
 if __name__ == "__main__":
     bar = ProgressBar()
@@ -0,0 +1,84 @@
+import re
+
+# Bytes kept from earlier chunks when searching with a regex, so matches split
+# across chunks are still found. Literal patterns use their own length instead.
+DEFAULT_REGEX_OVERLAP = 256
+DEFAULT_MAX_BUFFER = 64 * 1024
+
+Pattern = bytes | re.Pattern
+
+
+class PromptMatcher:
+    """
+    Streaming matcher for one or more expected responses.
+
+    Only newly fed bytes are scanned, plus a small overlap window so a prompt
+    split across two reads is still detected. The received data is kept in a
+    bytearray capped at max_buffer bytes, older output is discarded.
+
+    Args:
+        patterns (bytes | re.Pattern | list): Literal byte strings and/or compiled
+            bytes regexes. The first pattern that matches wins.
+        max_buffer (int): Maximum number of bytes kept.
+        regex_overlap (int): Bytes of earlier data rescanned for regex patterns.
+    """
+
+    def __init__(self, patterns: Pattern | list[Pattern], max_buffer: int = DEFAULT_MAX_BUFFER, regex_overlap: int = DEFAULT_REGEX_OVERLAP):
+        if isinstance(patterns, (bytes, re.Pattern)):
+            patterns = [patterns]
+        self.patterns = list(patterns)
+        self.max_buffer = max_buffer
+        self.buffer = bytearray()
+        self.matched: Pattern | None = None
+        self.match_end = None
+        self.total_bytes = 0
+
+        self._overlaps = []
+        for pattern in self.patterns:
+            if isinstance(pattern, re.Pattern):
+                self._overlaps.append(regex_overlap)
+            else:
+                self._overlaps.append(max(len(pattern) - 1, 0))
+
+    def feed(self, data: bytes) -> Pattern | None:
+        """Add received bytes and return the pattern that matched, if any."""
+        scan_from = len(self.buffer)
+        self.buffer += data
+        self.total_bytes += len(data)
+
+        for pattern, overlap in zip(self.patterns, self._overlaps):
+            start = max(scan_from - overlap, 0)
+            if isinstance(pattern, re.Pattern):
+                match = pattern.search(self.buffer, start)
+                end = match.end() if match else None
+            else:
+                index = self.buffer.find(pattern, start)
+                end = index + len(pattern) if index != -1 else None
+            if end is not None:
+                self.matched = pattern
+                self.match_end = end
+                break
+
+        self._trim()
+        return self.matched
+
+    def _trim(self):
+        excess = len(self.buffer) - self.max_buffer
+        if excess > 0:
+            del self.buffer[:excess]
+            if self.match_end is not None:
+                self.match_end = max(self.match_end - excess, 0)
+
+    @property
+    def text(self) -> str:
+        return self.buffer.decode("utf-8", errors="replace").strip()
+
+    def describe(self) -> str:
+        """Human readable list of the expected patterns, for log messages."""
+        descriptions = []
+        for pattern in self.patterns:
+            if isinstance(pattern, re.Pattern):
+                descriptions.append(f"/{pattern.pattern.decode('utf-8', errors='replace')}/")
+            else:
+                descriptions.append(pattern.decode("utf-8", errors="replace"))
+        return " | ".join(descriptions)
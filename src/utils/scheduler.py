@@ -0,0 +1,143 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import Logger
+from typing import Any, Callable
+
+from utils.tracing import span
+
+
+class FlashTask:
+    """A single bootburn step and the tasks that must succeed before it may start."""
+
+    def __init__(self, name: str, func: Callable[[], Any], depends_on: list[str] | None = None):
+        self.name = name
+        self.func = func
+        self.depends_on = depends_on or []
+
+
+class TaskResult:
+    """Outcome of a scheduled task."""
+
+    def __init__(self, name: str, status: str, duration: float = 0.0, error: str = ""):
+        self.name = name
+        self.status = status  # "ok", "failed" or "skipped"
+        self.duration = duration
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+def _check_graph(tasks: dict[str, FlashTask]):
+    """Raise ValueError on unknown dependencies or dependency cycles."""
+    for task in tasks.values():
+        for dependency in task.depends_on:
+            if dependency not in tasks:
+                raise ValueError(f"Task '{task.name}' depends on unknown task '{dependency}'")
+
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle detected at task '{name}'")
+        visiting.add(name)
+        for dependency in tasks[name].depends_on:
+            visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in tasks:
+        visit(name)
+
+
+def _timed_call(task: FlashTask):
+    start_time = time.time()
+    try:
+        with span(task.name, "ecu"):
+            task.func()
+    except BaseException as e:
+        return time.time() - start_time, e
+    return time.time() - start_time, None
+
+
+def run_flash_dag(tasks: list[FlashTask], logger: Logger, max_workers: int | None = None) -> dict[str, TaskResult]:
+    """
+    Run tasks on a thread pool, starting each one as soon as its dependencies succeeded.
+
+    A task fails when its function raises. Tasks that depend on a failed or
+    skipped task are skipped. Wall-clock time is therefore the critical path
+    of the graph rather than the sum of all tasks.
+
+    Args:
+        tasks (list): The tasks to run.
+        logger (Logger): Logger for progress messages.
+        max_workers (int, optional): Pool size, defaults to one worker per task.
+
+    Returns:
+        dict: TaskResult per task name, in the order the tasks were given.
+    """
+    by_name = {task.name: task for task in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Task names must be unique")
+    _check_graph(by_name)
+
+    results: dict[str, TaskResult] = {}
+    pending = dict(by_name)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(tasks))) as pool:
+        while pending or running:
+            for name, task in list(pending.items()):
+                dependency_results = [results.get(dependency) for dependency in task.depends_on]
+                if any(result is not None and not result.ok for result in dependency_results):
+                    failed = [result.name for result in dependency_results if result is not None and not result.ok]
+                    logger.warning(f"Skipping {name}, dependency failed: {', '.join(failed)}")
+                    results[name] = TaskResult(name, "skipped", error=f"dependency failed: {', '.join(failed)}")
+                    del pending[name]
+                elif all(result is not None for result in dependency_results):
+                    logger.info(f"Starting {name}")
+                    running[pool.submit(_timed_call, task)] = name
+                    del pending[name]
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                duration, error = future.result()
+                if error is None:
+                    logger.success(f"{name} finished in {_format_duration(duration)}")
+                    results[name] = TaskResult(name, "ok", duration)
+                else:
+                    logger.error(f"{name} failed after {_format_duration(duration)}: {error}")
+                    results[name] = TaskResult(name, "failed", duration, str(error) or type(error).__name__)
+
+    return {task.name: results[task.name] for task in tasks}
+
+
+def _format_duration(seconds: float) -> str:
+    return time.strftime("%H:%M:%S", time.gmtime(seconds))
+
+
+def format_result_table(results: dict[str, TaskResult], wall_time: float | None = None) -> str:
+    """Render the per-task results as a plain text table."""
+    rows = [("ECU", "STATUS", "TIME", "DETAILS")]
+    for result in results.values():
+        rows.append((result.name, result.status.upper(), _format_duration(result.duration), result.error))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(3)]
+    lines = []
+    for row in rows:
+        lines.append("  ".join(cell.ljust(width) for cell, width in zip(row[:3], widths)) + "  " + row[3])
+
+    separator = "-" * max(len(line) for line in lines)
+    lines.insert(1, separator)
+    if wall_time is not None:
+        total = sum(result.duration for result in results.values())
+        lines.append(separator)
+        lines.append(f"Wall time: {_format_duration(wall_time)} (sequential would be {_format_duration(total)})")
+    return "\n".join(line.rstrip() for line in lines)
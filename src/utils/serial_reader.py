@@ -0,0 +1,83 @@
+import selectors
+import time
+
+import serial
+
+
+class ReaderStats:
+    """Counters collected while waiting for a response."""
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.wakeups = 0
+        self.bytes_read = 0
+        self.match_latency = None  # Seconds from start until the expected response arrived
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def __str__(self):
+        latency = f"{self.match_latency * 1000:.1f} ms" if self.match_latency is not None else "no match"
+        return f"latency: {latency}, wakeups: {self.wakeups}, bytes: {self.bytes_read}"
+
+
+class SerialReader:
+    """
+    Event-driven reads from a serial port.
+
+    Waits on the port's file descriptor with a selector, so the caller only
+    wakes up when bytes arrive or the deadline expires. Ports without a file
+    descriptor fall back to a blocking read with the remaining time as timeout.
+    """
+
+    def __init__(self, ser: serial.Serial, stats: ReaderStats | None = None):
+        self.ser = ser
+        self.stats = stats or ReaderStats()
+        self._selector = None
+        try:
+            fileno = ser.fileno()
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            fileno = None
+        if fileno is not None:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(fileno, selectors.EVENT_READ)
+
+    def read(self, timeout: float) -> bytes:
+        """Return the bytes that arrive within timeout seconds, b"" if none did."""
+        if timeout <= 0:
+            return b""
+
+        if self._selector is not None:
+            ready = self._selector.select(timeout)
+            self.stats.wakeups += 1
+            if not ready:
+                return b""
+            data = self.ser.read(self.ser.in_waiting or 1)
+        else:
+            original_timeout = self.ser.timeout
+            self.ser.timeout = timeout
+            try:
+                data = self.ser.read(1)
+                self.stats.wakeups += 1
+                if data and self.ser.in_waiting:
+                    data += self.ser.read(self.ser.in_waiting)
+            finally:
+                self.ser.timeout = original_timeout
+
+        self.stats.bytes_read += len(data)
+        return data
+
+    def mark_match(self):
+        self.stats.match_latency = self.stats.elapsed
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
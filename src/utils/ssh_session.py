@@ -0,0 +1,144 @@
+import os
+import subprocess
+import threading
+from typing import Callable
+
+from utils.paths import cache_dir
+from utils.process_runner import ProcessRunner
+
+# Keep the master connection this long after the last command, seconds
+CONTROL_PERSIST = 600
+
+
+def ssh_binary() -> str:
+    """SWEN_TOOLS_SSH allows a stand-in for the ssh client in tests."""
+    return os.getenv("SWEN_TOOLS_SSH", "ssh")
+
+
+class SshSession:
+    """
+    Multiplexed SSH connection to a host.
+
+    The first command opens a master connection (OpenSSH ControlMaster),
+    every later command runs as a new channel on it, without another TCP
+    connection, key exchange or password authentication.
+    """
+
+    def __init__(self, user: str, host: str, password: str | None = None, control_dir: str | None = None):
+        self.user = user
+        self.host = host
+        self.password = password
+        # %C is a hash of the connection, keeps the socket path short enough for sun_path
+        self.control_path = os.path.join(control_dir or cache_dir("ssh"), "%C")
+
+    def _options(self) -> list[str]:
+        return [
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.control_path}",
+            "-o", f"ControlPersist={CONTROL_PERSIST}",
+        ]
+
+    def command(self, remote_command: str) -> list[str]:
+        """Full command line running remote_command on the host."""
+        command = [ssh_binary(), *self._options(), f"{self.user}@{self.host}", remote_command]
+        if self.password:
+            command = ["sshpass", "-p", self.password] + command
+        return command
+
+    def run(self, remote_command: str, timeout: float | None = None) -> subprocess.CompletedProcess:
+        return subprocess.run(self.command(remote_command), capture_output=True, text=True, timeout=timeout)
+
+    def check_output(self, remote_command: str, timeout: float | None = None) -> str:
+        """Run remote_command, raises CalledProcessError when it fails."""
+        return subprocess.check_output(self.command(remote_command), text=True, timeout=timeout)
+
+    def close(self):
+        """Stop the master connection."""
+        subprocess.run(
+            [ssh_binary(), *self._options(), "-O", "exit", f"{self.user}@{self.host}"],
+            capture_output=True,
+        )
+
+
+class LogFollower:
+    """
+    Streams new lines of the newest log file in a remote directory.
+
+    The newest file is followed from its current end, so only lines written
+    after start() show up. When a newer file appears (the flash tool opened
+    a new log) the follower switches to it and streams it from the start.
+    Commands default to PowerShell for the Windows HIX VM.
+    """
+
+    LATEST_COMMAND = (
+        "powershell -NoProfile -Command \"(Get-ChildItem -Path '{directory}' -Filter *.txt | "
+        "Sort-Object LastWriteTime -Descending | Select-Object -First 1).Name\""
+    )
+    # -Tail 0 skips what was there before, a new file is read from its first line
+    FOLLOW_COMMAND = "powershell -NoProfile -Command \"Get-Content -LiteralPath '{path}' -Wait -Tail 0\""
+    FOLLOW_FROM_START_COMMAND = "powershell -NoProfile -Command \"Get-Content -LiteralPath '{path}' -Wait\""
+    PATH_SEPARATOR = "\\"
+
+    def __init__(self, session: SshSession, directory: str, on_line: Callable[[str], None], poll_interval: float = 2.0):
+        self.session = session
+        self.directory = directory
+        self.on_line = on_line
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._runner: ProcessRunner | None = None
+        self._thread: threading.Thread | None = None
+
+    def latest(self) -> str | None:
+        result = self.session.run(self.LATEST_COMMAND.format(directory=self.directory), timeout=30)
+        name = result.stdout.strip()
+        return name if result.returncode == 0 and name else None
+
+    def _follow(self, name: str, from_start: bool):
+        path = f"{self.directory}{self.PATH_SEPARATOR}{name}"
+        template = self.FOLLOW_FROM_START_COMMAND if from_start else self.FOLLOW_COMMAND
+        command = self.session.command(template.format(path=path))
+        self._runner = ProcessRunner(command, on_stdout=self.on_line).start()
+
+    def _stop_runner(self):
+        if self._runner is not None:
+            self._runner.terminate(grace_period=1)
+            self._runner = None
+
+    def _loop(self):
+        try:
+            self._watch()
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Stopped following logs in {self.directory}: {e}")
+
+    def _watch(self):
+        current = self.latest()
+        if current:
+            self._follow(current, from_start=False)
+        while not self._stop_event.wait(self.poll_interval):
+            latest = self.latest()
+            if latest and latest != current:
+                self._stop_runner()
+                current = latest
+                self._follow(current, from_start=True)
+
+    def start(self) -> "LogFollower":
+        self._thread = threading.Thread(target=self._loop, name="log-follower", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush_time: float = 1.5):
+        """
+        Stop following. A running tail gets up to flush_time seconds for the
+        last lines to arrive, less when it ends by itself; without one there
+        is nothing to wait for.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._runner is not None:
+            try:
+                # Also waits for the pumps, so lines of a tail that ended are all delivered
+                self._runner.wait(timeout=flush_time)
+            except subprocess.TimeoutExpired:
+                pass
+        self._stop_runner()
@@ -0,0 +1,87 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+    """
+    Collects spans in Chrome trace event format.
+
+    Disabled by default, spans then cost one attribute check. The written
+    file opens in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._thread_names: dict[int, str] = {}
+
+    def enable(self):
+        self.enabled = True
+
+    @staticmethod
+    def _now_us() -> float:
+        return time.perf_counter_ns() / 1000
+
+    def _add(self, event: dict):
+        thread = threading.current_thread()
+        event.setdefault("pid", os.getpid())
+        event.setdefault("tid", thread.ident)
+        with self._lock:
+            self._thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str = "swen-tools", **args):
+        if not self.enabled:
+            yield
+            return
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            event = {"name": name, "cat": category, "ph": "X", "ts": start, "dur": self._now_us() - start}
+            if args:
+                event["args"] = {key: str(value) for key, value in args.items()}
+            self._add(event)
+
+    def instant(self, name: str, category: str = "swen-tools", **args):
+        if self.enabled:
+            self._add({"name": name, "cat": category, "ph": "i", "s": "t", "ts": self._now_us(), "args": {key: str(value) for key, value in args.items()}})
+
+    def write(self, path: str):
+        with self._lock:
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self._thread_names.items()
+            ]
+            trace = {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+        with open(path, "w") as file:
+            json.dump(trace, file)
+
+
+tracer = Tracer()
+
+
+def span(name: str, category: str = "swen-tools", **args):
+    """Time a block as a span of the global tracer."""
+    return tracer.span(name, category, **args)
+
+
+def traced(name: str | None = None, category: str = "swen-tools"):
+    """Decorator recording every call of a function as a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
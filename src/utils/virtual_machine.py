@@ -1,20 +1,118 @@
 import subprocess
 import time
 import sys
+from utils.process_runner import ProcessRunner
+from utils.ssh_session import LogFollower, SshSession
+from utils.tracing import traced
+
+# Readiness polling backoff, seconds
+READY_POLL_INITIAL = 0.5
+READY_POLL_MAX = 5
+# Where Main.exe writes its AutoIt logs on the guest
+HIX_LOG_DIR = r"C:\hix-auto-flash\src\logs"
+# Set by the guest additions once they run, guestcontrol is not usable before
+GUEST_ADDITIONS_PROPERTY = "/VirtualBox/GuestAdd/Version"
  
+class UsbFilter:
+    """A USB device filter of the VM, index is what `VBoxManage usbfilter` expects."""
+
+    def __init__(self, index, name, vendor_id=None, product_id=None, active=True):
+        self.index = index
+        self.name = name
+        self.vendor_id = vendor_id
+        self.product_id = product_id
+        self.active = active
+
+
+class VMInfo:
+    """VM state parsed from `VBoxManage showvminfo --machinereadable`."""
+
+    def __init__(self, values):
+        self.values = values
+        self.state = values.get("VMState")
+        self.usb_filters = self._parse_usb_filters(values)
+        self.nics = self._parse_nics(values)
+
+    @classmethod
+    def parse(cls, output):
+        values = {}
+        for line in output.splitlines():
+            key, separator, value = line.partition("=")
+            if separator:
+                values[key.strip().strip('"')] = value.strip().strip('"')
+        return cls(values)
+
+    @staticmethod
+    def _parse_usb_filters(values):
+        filters = []
+        number = 1
+        # Machine readable filters are numbered from 1, usbfilter indices start at 0
+        while f"USBFilterName{number}" in values:
+            filters.append(UsbFilter(
+                index=number - 1,
+                name=values[f"USBFilterName{number}"],
+                vendor_id=values.get(f"USBFilterVendorId{number}"),
+                product_id=values.get(f"USBFilterProductId{number}"),
+                active=values.get(f"USBFilterActive{number}") == "on",
+            ))
+            number += 1
+        return filters
+
+    @staticmethod
+    def _parse_nics(values):
+        nics = {}
+        for key, value in values.items():
+            if key.startswith("nic") and key[3:].isdigit() and value != "none":
+                number = key[3:]
+                nics[int(number)] = {
+                    "type": value,
+                    "mac": values.get(f"macaddress{number}"),
+                    "cable_connected": values.get(f"cableconnected{number}") == "on",
+                    "hostonly_adapter": values.get(f"hostonlyadapter{number}"),
+                }
+        return nics
+
+    def usb_filter(self, name):
+        for usb_filter in self.usb_filters:
+            if usb_filter.name == name:
+                return usb_filter
+        return None
+
+
 class VirtualMachine:
     def __init__(self, vm_name, os_user, os_password, ip_address):
         self.name = vm_name
         self.os_user = os_user
         self.os_password = os_password
         self.ip_address = ip_address
+        self._info = None
+        # Every guest command shares one multiplexed SSH connection
+        self.ssh = SshSession(os_user, ip_address, os_password)
+
+    @traced("VirtualMachine.start", "vm")
+    def start(self, timeout=180, snapshot=None):
+        """
+        Start the VM using VirtualBox and wait until the guest accepts commands.
 
-    def start(self, timeout=20):
-        """Start the VM using VirtualBox."""
+        :param timeout: Seconds to wait for the guest to become ready.
+        :param snapshot: Restore this snapshot first. A snapshot taken while
+            the VM was running resumes in seconds instead of booting Windows.
+        :return: True when the guest is ready.
+        """
         try:
+            if self.is_vm_running():
+                print(f"VM '{self.name}' is already running.")
+                return self.wait_until_ready(timeout)
+
+            if snapshot and self.has_snapshot(snapshot):
+                print(f"Restoring snapshot '{snapshot}'...")
+                self.invalidate()
+                subprocess.run(["VBoxManage", "snapshot", self.name, "restore", snapshot], check=True)
+
             # Run the VBoxManage command to start the VM
+            self.invalidate()
             subprocess.run(["VBoxManage", "startvm", self.name, "--type", "headless"], check=True)
-            time.sleep(timeout)  # Wait for VM to boot; adjust timing as needed
+            return self.wait_until_ready(timeout)
         except subprocess.CalledProcessError as e:
             # Check the error output for the locked session issue
             if "VBOX_E_INVALID_OBJECT_STATE" in str(e):
@@ -25,7 +123,67 @@ class VirtualMachine:
         except Exception as e:
             # Handle any other unexpected errors
             print(f"An unexpected error occurred: {e}")
+        return False
+
+    def _guest_additions_running(self):
+        result = subprocess.run(
+            ["VBoxManage", "guestproperty", "get", self.name, GUEST_ADDITIONS_PROPERTY],
+            capture_output=True, text=True,
+        )
+        return result.returncode == 0 and result.stdout.startswith("Value:")
+
+    def _guestcontrol_ready(self, timeout):
+        try:
+            result = subprocess.run([
+                "VBoxManage", "guestcontrol", self.name, "run",
+                "--exe", "cmd.exe",
+                "--username", self.os_user,
+                "--password", self.os_password,
+                "--", "cmd.exe", "/c", "exit 0"
+            ], capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        return result.returncode == 0
+
+    def wait_until_ready(self, timeout=180):
+        """
+        Poll until guestcontrol can run commands, with exponential backoff.
+
+        The cheap guest property check runs until the guest additions are up,
+        only then is a guestcontrol command attempted.
+        """
+        start_time = time.time()
+        delay = READY_POLL_INITIAL
+        while True:
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0:
+                print(f"VM '{self.name}' not ready after {timeout} s.")
+                return False
+            if self._guest_additions_running() and self._guestcontrol_ready(min(remaining, 30)):
+                print(f"VM '{self.name}' ready after {time.time() - start_time:.1f} s.")
+                return True
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, READY_POLL_MAX)
+
+    def has_snapshot(self, snapshot):
+        """Check if the VM has a snapshot with this name."""
+        result = subprocess.run(
+            ["VBoxManage", "snapshot", self.name, "list", "--machinereadable"],
+            capture_output=True, text=True,
+        )
+        return result.returncode == 0 and f'="{snapshot}"' in result.stdout
+
+    def take_snapshot(self, snapshot):
+        """Take a live snapshot of the running VM, restoring it skips the Windows boot."""
+        print(f"Taking snapshot '{snapshot}' of VM '{self.name}'...")
+        try:
+            subprocess.run(["VBoxManage", "snapshot", self.name, "take", snapshot, "--live"], check=True)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"Error taking snapshot: {e}")
+            return False
 
+    @traced("VirtualMachine.login", "vm")
     def login(self):
         """Log in to the VM if it's Windows, using VBoxManage guest control."""
         print("Logging in to Windows...")
@@ -42,66 +200,66 @@ class VirtualMachine:
             print(f"Something went wrong when logging in: {e}")
 
 
+    def info(self, refresh=False):
+        """
+        The parsed `showvminfo --machinereadable` of the VM.
+
+        Cached until a command that changes the VM invalidates it, so state
+        and USB filter checks cost one VBoxManage call per session.
+        """
+        if self._info is None or refresh:
+            output = subprocess.check_output(
+                ["VBoxManage", "showvminfo", self.name, "--machinereadable"], text=True
+            )
+            self._info = VMInfo.parse(output)
+        return self._info
+
+    def invalidate(self):
+        """Drop the cached VM info, the next query reads it again."""
+        self._info = None
+
     def add_usb_filter(self, filter_name, usb_vendor_id, usb_product_id):
         """Add a USB filter by name, ensuring it does not already exist."""
         print(f"Checking if USB filter '{filter_name}' exists...")
 
         try:
-            # Get VM info and split it into lines
-            vm_info = subprocess.check_output(
-                ["VBoxManage", "showvminfo", self.name], text=True
-            ).splitlines()
-
-            # Iterate over VM info to find USB filters
-            for i, line in enumerate(vm_info):
-                # Normalize spaces and check for the filter name
-                line_clean = " ".join(line.split())
-                if line_clean.startswith(f"Name: {filter_name}"):
-                    
-                    print(f"USB filter '{filter_name}' already exists. Skipping addition.")
-                    return  # Exit the function early as the filter already exists
+            if self.info().usb_filter(filter_name) is not None:
+                print(f"USB filter '{filter_name}' already exists. Skipping addition.")
+                return  # Exit the function early as the filter already exists
 
             # If no matching filter is found, add a new one
             print(f"Adding USB filter '{filter_name}'...")
-            subprocess.run(
-                [
-                    "VBoxManage", "usbfilter", "add", "0",
-                    "--target", self.name,
-                    "--name", filter_name,
-                    "--vendorid", usb_vendor_id,
-                    "--productid", usb_product_id
-                ],
-                check=True
-            )
+            try:
+                subprocess.run(
+                    [
+                        "VBoxManage", "usbfilter", "add", "0",
+                        "--target", self.name,
+                        "--name", filter_name,
+                        "--vendorid", usb_vendor_id,
+                        "--productid", usb_product_id
+                    ],
+                    check=True
+                )
+            finally:
+                self.invalidate()
             print(f"USB filter '{filter_name}' added successfully.")
 
         except subprocess.CalledProcessError as e:
             print(f"Error checking or adding USB filter: {e}")
 
-
-
-
-
     def remove_usb_filter(self, filter_name):
         """Remove a USB filter by name."""
         print(f"Removing USB filter '{filter_name}'...")
         
         try:
-            # Retrieve VM info and search for USB filters
-            vm_info = subprocess.check_output(["VBoxManage", "showvminfo", self.name], text=True)
-            filters = vm_info.splitlines()
-            
-            # Find the filter index for the specified filter name
-            filter_index = None
-            for line in filters:
-                if f"Name: {filter_name}" in line:
-                    # Extract the index number from the preceding line or specific part of the line
-                    filter_index = line.split()[0].split(":")[-1].strip()
-                    break
-
-            if filter_index is not None:
-                # Run the remove command with the located index
-                subprocess.run(["VBoxManage", "usbfilter", "remove", filter_index, "--target", self.name], check=True)
+            usb_filter = self.info().usb_filter(filter_name)
+            if usb_filter is not None:
+                try:
+                    subprocess.run(
+                        ["VBoxManage", "usbfilter", "remove", str(usb_filter.index), "--target", self.name], check=True
+                    )
+                finally:
+                    self.invalidate()
                 print(f"USB filter '{filter_name}' removed.")
             else:
                 print(f"USB filter '{filter_name}' not found in VM '{self.name}'.")
@@ -115,10 +273,7 @@ class VirtualMachine:
         try:
             if not quiet:
                 print(f"Executing SSH command: {command}")
-            result = subprocess.check_output([
-                "sshpass", "-p", self.os_password, "ssh",
-                f"{self.os_user}@{self.ip_address}", command
-            ], text=True)
+            result = self.ssh.check_output(command)
             if not quiet:
                 print(f"Command output:\n{result}")
             return result
@@ -127,9 +282,11 @@ class VirtualMachine:
             return None
 
 
-    def _flash_ecu_vbox(self, ecu, autoit_exe_path="C:\\hix-auto-flash\\src\\Main.exe", flags=None):
+    @traced("VirtualMachine._flash_ecu_vbox", "vm")
+    def _flash_ecu_vbox(self, ecu, autoit_exe_path="C:\\hix-auto-flash\\src\\Main.exe", flags=None, follow_log=True):
         if flags is None:
             flags = []
+        follower = None
 
         try:
             command = [
@@ -145,32 +302,33 @@ class VirtualMachine:
                 if value is not None:
                     command.append(value)
 
-            # Run the command and stream output
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True       
-            )
-
-            for line in iter(process.stdout.readline, ''):
-                print(line, end='')
+            # guestcontrol reports the guest process exit code on stderr
+            guest_exit_code = None
 
-            process.wait()
-
-            exit_code = process.returncode
-            for line in process.stderr:
+            def parse_exit_code(line):
+                nonlocal guest_exit_code
                 if "Exit code:" in line:
                     try:
-                        exit_code = int(line.strip().split(":")[1].strip())
+                        guest_exit_code = int(line.strip().split(":")[1].strip())
                     except (ValueError, IndexError):
                         print(f"Warning: Unable to parse exit code from line: {line}")
 
+            # Stream the AutoIt log while the flash runs instead of reading it afterwards
+            if follow_log:
+                follower = LogFollower(self.ssh, HIX_LOG_DIR, lambda line: print(f"[{ecu} log] {line}")).start()
+
+            # Run the command and stream output, stdout and stderr are pumped concurrently
+            result = ProcessRunner(command, on_stdout=print, on_stderr=parse_exit_code).start().wait()
+
+            exit_code = guest_exit_code if guest_exit_code is not None else result.returncode
             return exit_code if exit_code is not None else -1
 
         except Exception as e:
             print(f"Error during {ecu} flashing process: {e}")
             return -1
+        finally:
+            if follower:
+                follower.stop()
         
 
     def flash_hia_vbox(self, flags=None):
@@ -189,57 +347,37 @@ class VirtualMachine:
 
         :param flags: A list of flags to pass to the executable.
         """
-        print("Starting HIA flashing process...")
+        print("Starting HIB flashing process...")
         return self._flash_ecu_vbox(ecu="hib", flags=flags)
 
 
     
     def get_latest_log(self):
         """Retrieve the latest log file from a given log directory on the VM over SSH."""
-        log_dir_path = r"C:\hix-auto-flash\src\logs"  # Use raw string for Windows paths
-
-        # Command to list files sorted by last modified date
-        log_files_output = self.ssh_command(f"cmd /c \"dir {log_dir_path}\\*.txt /b /o-d\"", quiet=True)
-        if not log_files_output or "File Not Found" in log_files_output:
-            print(f"No log files found in '{log_dir_path}' on VM.")
-            return None
-
-        log_files = log_files_output.strip().splitlines()
-        if not log_files:
-            print(f"No log files found in '{log_dir_path}' on VM.")
-            return None
-
-        # The first file in the sorted list is the latest
-        latest_log_file = log_files[0]
-
-        # Read the contents of the latest log file
-        log_content = self.ssh_command(f"cmd /c \"type {log_dir_path}\\{latest_log_file}\"", quiet=True)
+        # One round trip: find the newest log and print it
+        log_content = self.ssh_command(
+            "powershell -NoProfile -Command \"Get-ChildItem -Path '" + HIX_LOG_DIR + "' -Filter *.txt | "
+            "Sort-Object LastWriteTime -Descending | Select-Object -First 1 | Get-Content\"",
+            quiet=True,
+        )
         if log_content:
-            print(f"Latest log from '{log_dir_path}' on VM:\n{log_content}")
+            print(f"Latest log from '{HIX_LOG_DIR}' on VM:\n{log_content}")
         else:
-            print(f"Could not read log file '{latest_log_file}' from '{log_dir_path}'.")
+            print(f"No log files found in '{HIX_LOG_DIR}' on VM.")
         return log_content
 
     def poweroff(self):
         """Power off the VM."""
         print(f"Powering off VM '{self.name}'...")
         subprocess.run(["VBoxManage", "controlvm", self.name, "poweroff", "--type", "headless"])
+        self.invalidate()
+        self.ssh.close()
 
 
-    def is_vm_running(self):
+    def is_vm_running(self, refresh=False):
         """Check if the VM is already running."""
         try:
-            # Query the VM's information
-            result = subprocess.run(
-                ["VBoxManage", "showvminfo", self.name, "--machinereadable"],
-                capture_output=True, text=True, check=True
-            )
-            # Parse the state from the output
-            for line in result.stdout.splitlines():
-                if line.startswith("VMState="):
-                    vm_state = line.split("=")[1].strip('"')
-                    return vm_state == "running"
-            return False
+            return self.info(refresh).state == "running"
         except subprocess.CalledProcessError as e:
             print(f"Error checking VM state: {e}")
             return False
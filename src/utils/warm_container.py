@@ -0,0 +1,186 @@
+import getpass
+import json
+import os
+import shlex
+import subprocess
+import threading
+import time
+from logging import Logger
+
+from utils.paths import cache_dir
+
+# Stop the container after this many seconds without a flash
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+# Options of run.sh itself, not of the tools inside the image
+RUN_SH_OPTIONS = {"--multiuser"}
+STARTUP_TIMEOUT = 120
+# Seconds between the idle loop's checks
+IDLE_POLL_INTERVAL = 5
+
+MARKER_DIR = "/tmp/swen-tools"
+# The DHU tools flash over USB, the health check fails when the devices are gone from the container
+DEVICE_DIR = "/dev/bus/usb"
+# Main process of the container: exit once no flash ran for the idle timeout ($0), checked every $1 seconds
+IDLE_LOOP = (
+    "mkdir -p {markers}; touch {markers}/last-used; "
+    "while ls {markers}/busy.* >/dev/null 2>&1 || "
+    "[ $(( $(date +%s) - $(stat -c %Y {markers}/last-used) )) -lt $0 ]; do sleep $1; done"
+)
+# Wraps every exec so the idle loop sees running flashes. The busy marker,
+# named after the exec id in $0, holds the tool's pid for kill_exec
+EXEC_WRAPPER = (
+    "mkdir -p {markers}; touch {markers}/last-used; "
+    "\"$@\" & echo $! > {markers}/busy.$0; wait $!; rc=$?; "
+    "touch {markers}/last-used; rm -f {markers}/busy.$0; exit $rc"
+)
+
+
+def docker_binary() -> str:
+    """SWEN_TOOLS_DOCKER allows a shim such as simulators/fake_docker.py."""
+    return os.getenv("SWEN_TOOLS_DOCKER", "docker")
+
+
+class WarmContainer:
+    """
+    A long-lived container of the DHU flashing image.
+
+    Instead of a fresh `run.sh` container per flash, the image is started
+    once with the artifact cache mounted and dhuh_update / moose_update run
+    inside it through `docker exec`. The container exits by itself after
+    idle_timeout seconds without a flash, and is replaced when its health
+    check (the tool and the USB devices are visible) reports it unhealthy.
+
+    run_args are the `docker run` options run.sh uses for the image
+    (devices, network, privileges). They differ between image versions and
+    are not guessed, see warm_container_from_env.
+    """
+
+    def __init__(
+        self,
+        image: str,
+        run_args: str,
+        name: str | None = None,
+        idle_timeout: int | None = None,
+        mounts: list[str] | None = None,
+        marker_dir: str = MARKER_DIR,
+        device_dir: str = DEVICE_DIR,
+        poll_interval: float = IDLE_POLL_INTERVAL,
+    ):
+        self.image = image
+        self.run_args = shlex.split(run_args)
+        self.name = name or f"swen-tools-dhu-{getpass.getuser()}"
+        self.idle_timeout = idle_timeout or int(os.getenv("SWEN_TOOLS_DHU_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT))
+        self.mounts = mounts if mounts is not None else [cache_dir("artifacts")]
+        self.marker_dir = marker_dir
+        self.device_dir = device_dir
+        self.poll_interval = poll_interval
+        self.docker = docker_binary()
+        self._entrypoint: list[str] | None = None
+        # DHUH and DHUM may ask for the container at the same time in flash-all
+        self._lock = threading.Lock()
+
+    def _docker(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        return subprocess.run([self.docker, *args], capture_output=True, text=True, check=check)
+
+    def state(self) -> tuple[str | None, str | None]:
+        """(status, health) of the container, (None, None) when it does not exist."""
+        result = self._docker(
+            "container", "inspect", "--format",
+            "{{.State.Status}} {{if .State.Health}}{{.State.Health.Status}}{{end}}",
+            self.name, check=False,
+        )
+        if result.returncode != 0:
+            return None, None
+        status, _, health = result.stdout.strip().partition(" ")
+        return status, health or None
+
+    def entrypoint(self) -> list[str]:
+        if self._entrypoint is None:
+            result = self._docker("image", "inspect", "--format", "{{json .Config.Entrypoint}}", self.image)
+            self._entrypoint = json.loads(result.stdout.strip() or "null") or []
+        return self._entrypoint
+
+    def health_command(self) -> str:
+        """Healthy while the tool can be started and the USB devices are visible."""
+        checks = [f"test -d {shlex.quote(self.device_dir)}"]
+        entrypoint = self.entrypoint()
+        if entrypoint:
+            checks.insert(0, f"command -v {shlex.quote(entrypoint[0])} >/dev/null")
+        return " && ".join(checks)
+
+    def _start(self, logger: Logger):
+        logger.info(f"Starting warm container {self.name} from {self.image}...")
+        start_time = time.time()
+        self._docker("rm", "-f", self.name, check=False)
+        volumes = [argument for mount in self.mounts for argument in ("-v", f"{mount}:{mount}")]
+        self._docker(
+            "run", "-d", "--rm", "--name", self.name,
+            "--health-cmd", self.health_command(),
+            "--health-interval", "30s", "--health-start-period", "10s",
+            *self.run_args, *volumes,
+            "--entrypoint", "sh", self.image,
+            "-c", IDLE_LOOP.format(markers=self.marker_dir), str(self.idle_timeout), str(self.poll_interval),
+        )
+        while self.state()[0] != "running":
+            if time.time() - start_time > STARTUP_TIMEOUT:
+                raise RuntimeError(f"Container {self.name} did not start within {STARTUP_TIMEOUT} s")
+            time.sleep(0.5)
+        logger.info(f"Warm container started in {time.time() - start_time:.1f} s")
+
+    def ensure_running(self, logger: Logger):
+        """Start the container unless a healthy one is already running."""
+        with self._lock:
+            status, health = self.state()
+            if status == "running" and health != "unhealthy":
+                # The idle loop may be about to exit, renew its lease before the flash is started
+                if self._touch():
+                    logger.debug(f"Reusing warm container {self.name}")
+                    return
+                logger.info(f"Warm container {self.name} expired, restarting it")
+            elif health == "unhealthy":
+                logger.warning(f"Container {self.name} is unhealthy, replacing it")
+            self._start(logger)
+
+    def _touch(self) -> bool:
+        """Mark the container as used now, False when it is gone or stopping."""
+        result = self._docker("exec", self.name, "touch", f"{self.marker_dir}/last-used", check=False)
+        return result.returncode == 0
+
+    def can_serve(self, path: str) -> bool:
+        """Whether path is visible inside the container."""
+        path = os.path.realpath(path)
+        return any(path.startswith(os.path.realpath(mount) + os.sep) for mount in self.mounts)
+
+    def exec_command(self, script_args: str, exec_id: str) -> list[str]:
+        """
+        docker exec command line running the tool the given run.sh arguments select.
+
+        exec_id names the run for kill_exec, it must be unique among the
+        execs running in the container.
+        """
+        args = [argument for argument in shlex.split(script_args) if argument not in RUN_SH_OPTIONS]
+        wrapper = EXEC_WRAPPER.format(markers=self.marker_dir)
+        return [self.docker, "exec", self.name, "sh", "-c", wrapper, exec_id, *self.entrypoint(), *args]
+
+    def kill_exec(self, exec_id: str, signal_name: str = "TERM"):
+        """
+        Signal the tool of a running exec inside the container.
+
+        Killing the local `docker exec` client leaves the process in the
+        container running, and it would keep flashing.
+        """
+        marker = f"{self.marker_dir}/busy.{shlex.quote(exec_id)}"
+        self._docker("exec", self.name, "sh", "-c", f"[ -f {marker} ] && kill -{signal_name} $(cat {marker})", check=False)
+
+    def stop(self):
+        self._docker("rm", "-f", self.name, check=False)
+
+
+def warm_container_from_env() -> WarmContainer | None:
+    """
+    The warm container for DOCKER_IMAGE started with SWEN_TOOLS_DHU_DOCKER_ARGS,
+    the docker run options from run.sh. None unless both are configured.
+    """
+    image = os.getenv("DOCKER_IMAGE")
+    run_args = os.getenv("SWEN_TOOLS_DHU_DOCKER_ARGS")
+    return WarmContainer(image, run_args) if image and run_args else None